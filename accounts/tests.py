@@ -1,3 +1,55 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import Profile, Role
+from procure.testing import make_user
+
+
+class AccountTests(TestCase):
+    def test_register_creates_staff_profile(self):
+        response = APIClient().post('/api/accounts/register/', {
+            'username': 'new_user', 'email': 'new@example.com', 'password': 'password123',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['role'], Role.STAFF)
+
+    def test_admin_changes_role(self):
+        admin = make_user('admin_user', Role.ADMIN)
+        user = make_user('someone')
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.patch(f'/api/accounts/users/{user.id}/change-role/', {'role': Role.FINANCE}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        user.profile.refresh_from_db()
+        self.assertEqual(user.profile.role, Role.FINANCE)
+
+    def test_non_admin_cannot_change_role(self):
+        user = make_user('someone')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.patch(f'/api/accounts/users/{user.id}/change-role/', {'role': Role.ADMIN}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_create_profiles_fills_missing_profiles(self):
+        users = [User.objects.create_user(username=f'no_profile_{n}') for n in range(5)]
+        Profile.objects.filter(user__in=users).delete()
+        out = StringIO()
+        call_command('create_profiles', batch_size=2, stdout=out)
+        self.assertIn('Successfully created 5 profile(s)', out.getvalue())
+        self.assertEqual(Profile.objects.filter(user__in=users, role=Role.STAFF).count(), 5)
+
+        call_command('create_profiles', verify=True, stdout=StringIO())
 
-# Create your tests here.
+    def test_create_profiles_verify_reports_problems(self):
+        user = make_user('someone')
+        Profile.objects.filter(user=user).update(role='manager')
+        User.objects.create_user(username='no_profile').profile.delete()
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('create_profiles', verify=True, stdout=out)
+        self.assertIn('1 user(s) without a profile', out.getvalue())
+        self.assertIn('1 profile(s) with an unknown role', out.getvalue())
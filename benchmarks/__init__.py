@@ -0,0 +1,11 @@
+"""
+Load tests and micro-benchmarks for the procure API.
+
+    python manage.py seed_load --users 2000 --requests 1000000
+    python -m benchmarks load --base-url http://127.0.0.1:8000 --concurrency 16
+    python -m benchmarks micro
+
+`micro` runs on the offline test settings and a throwaway database. `load`
+talks HTTP to a running server (seeded with `seed_load`); start it with
+BENCHMARK_HEADERS=1 to also get queries per request and server RSS.
+"""
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import sys
+
+import django
+
+
+def _setup(default_settings):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
+    django.setup()
+
+
+def load(options):
+    _setup('procure_to_pay.settings')
+    from accounts.models import Role
+    from benchmarks import load as load_test
+    from procure.seeding import SEED_PASSWORD, seeded_username
+    from procure.testing import make_invoice_pdf
+
+    users = {role: seeded_username(role, 0, options.prefix) for role, _ in Role.choices}
+    for override in options.user:
+        role, _, username = override.partition('=')
+        users[role] = username
+    if options.receipt:
+        with open(options.receipt, 'rb') as receipt:
+            receipt_pdf = receipt.read()
+    else:
+        receipt_pdf = make_invoice_pdf()
+
+    rows = load_test.run(
+        options.base_url, options.scenario or load_test.SCENARIOS, options.requests, options.concurrency,
+        users, options.password or SEED_PASSWORD, receipt_pdf, timeout=options.timeout,
+    )
+    _output(rows, load_test.report, options.json)
+
+
+def micro(options):
+    _setup('procure_to_pay.settings_test')
+    from benchmarks import micro as micro_benchmarks
+
+    rows = micro_benchmarks.run(options.benchmark or micro_benchmarks.BENCHMARKS, options.runs, options.ocr_backend)
+    _output(rows, micro_benchmarks.report, options.json)
+
+
+def engines(options):
+    _setup('procure_to_pay.settings_test')
+    from django.test.utils import override_settings
+
+    from benchmarks import engines as engine_benchmark
+
+    with override_settings(OCR_BACKEND=options.ocr_backend):
+        rows = engine_benchmark.run(options.runs, options.engine or list(engine_benchmark.ENGINES), options.corpus)
+    _output(rows, engine_benchmark.report, options.json)
+
+
+def preprocess(options):
+    _setup('procure_to_pay.settings_test')
+    from benchmarks import preprocessing as preprocessing_benchmark
+
+    rows = preprocessing_benchmark.run(options.ocr_backend, options.target_dpi, options.samples)
+    _output(rows, preprocessing_benchmark.report, options.json)
+
+
+def boot(options):
+    # No django.setup() here: the measurement runs in a fresh interpreter
+    from benchmarks import boot as boot_benchmark
+
+    results = boot_benchmark.run(
+        options.settings, options.top, max_ms=options.max_ms, max_rss_mb=options.max_rss_mb,
+    )
+    _output(results, boot_benchmark.report, options.json)
+    if results['failures']:
+        sys.exit(1)
+
+
+def _output(rows, report, json_path):
+    print(report(rows))
+    if json_path:
+        with open(json_path, 'w') as out:
+            json.dump(rows, out, indent=2)
+
+
+def main(argv=None):
+    from benchmarks.load import SCENARIOS
+    from benchmarks.micro import BENCHMARKS
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Procure API benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load_parser = commands.add_parser('load', help='Drive API endpoints on a running server')
+    load_parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    load_parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='Repeatable; default: all')
+    load_parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    load_parser.add_argument('--concurrency', type=int, default=8)
+    load_parser.add_argument('--prefix', default='load', help='Username prefix used when seeding')
+    load_parser.add_argument('--user', action='append', default=[], metavar='ROLE=USERNAME',
+                             help='Log in as USERNAME for ROLE instead of the first seeded user')
+    load_parser.add_argument('--password', help='Password of the users (default: the seed password)')
+    load_parser.add_argument('--receipt', help='Receipt file for submit-receipt (default: generated invoice PDF)')
+    load_parser.add_argument('--timeout', type=float, default=60)
+    load_parser.add_argument('--json', help='Also write the results to this JSON file')
+    load_parser.set_defaults(func=load)
+
+    micro_parser = commands.add_parser('micro', help='Micro-benchmark OCR, PDF and serializer code paths')
+    micro_parser.add_argument('--benchmark', action='append', choices=BENCHMARKS, help='Repeatable; default: all')
+    micro_parser.add_argument('--runs', type=int, default=50)
+    micro_parser.add_argument('--ocr-backend', default='procure.ocr.image_to_string',
+                              help='OCR callable to time (the test settings stub OCR out)')
+    micro_parser.add_argument('--json', help='Also write the results to this JSON file')
+    micro_parser.set_defaults(func=micro)
+
+    engines_parser = commands.add_parser('engines', help='Compare PDF text engines on speed and fidelity')
+    engines_parser.add_argument('--engine', action='append', choices=('pdfminer', 'pdfium'),
+                                help='Repeatable; default: all')
+    engines_parser.add_argument('--runs', type=int, default=20, help='Extractions per document and engine')
+    engines_parser.add_argument('--corpus', help='Directory of extra *.pdf documents')
+    engines_parser.add_argument('--ocr-backend', default='procure.testing.stub_ocr',
+                                help='OCR callable for scanned pages (default: stub, no OCR cost)')
+    engines_parser.add_argument('--json', help='Also write the results to this JSON file')
+    engines_parser.set_defaults(func=engines)
+
+    preprocess_parser = commands.add_parser('preprocess', help='OCR latency and accuracy with and without preprocessing')
+    preprocess_parser.add_argument('--ocr-backend', default='procure.ocr.image_to_string')
+    preprocess_parser.add_argument('--target-dpi', type=int, default=300)
+    preprocess_parser.add_argument('--samples', help='Directory of extra images, each with a <name>.txt true text')
+    preprocess_parser.add_argument('--json', help='Also write the results to this JSON file')
+    preprocess_parser.set_defaults(func=preprocess)
+
+    boot_parser = commands.add_parser('boot', help='Import time and RSS of a worker loading the URLconf')
+    boot_parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'procure_to_pay.settings'))
+    boot_parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to list')
+    boot_parser.add_argument('--max-ms', type=float, help='Fail when booting takes longer than this')
+    boot_parser.add_argument('--max-rss-mb', type=float, help='Fail when RSS after boot exceeds this')
+    boot_parser.add_argument('--json', help='Also write the results to this JSON file')
+    boot_parser.set_defaults(func=boot)
+
+    options = parser.parse_args(argv)
+    options.func(options)
+
+
+if __name__ == '__main__':
+    main()
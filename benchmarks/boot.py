@@ -0,0 +1,99 @@
+"""
+Worker boot benchmark: import time and memory of loading the URLconf.
+
+Runs a fresh interpreter with `python -X importtime` that sets Django up
+and resolves the URL patterns (what a gunicorn worker does before serving
+its first request), then reports the boot time, resident memory, the
+slowest top-level imports and whether any of the lazily loaded document
+libraries were pulled in.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.stats import format_table
+
+# Only needed once a document is parsed, OCRed, rendered or sent to Gemini
+LAZY_MODULES = ('pdfplumber', 'pdfminer', 'pypdfium2', 'PIL', 'pytesseract', 'tesserocr', 'reportlab', 'google.genai')
+
+_BOOT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+boot_ms = (time.perf_counter() - started) * 1000
+from procure_to_pay.middleware import current_rss_kb
+print(json.dumps({'boot_ms': boot_ms, 'rss_kb': current_rss_kb(), 'modules': sorted(sys.modules)}))
+"""
+
+
+def _parse_importtime(stderr):
+    """(name, self_us, cumulative_us) of the top-level imports in `-X importtime` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue  # the header line
+        # Nested imports are indented by two spaces per level
+        if not name[1:].startswith(' '):
+            imports.append((name.strip(), self_us, cumulative_us))
+    return imports
+
+
+def probe(settings_module, python=sys.executable):
+    """Boot Django in a subprocess; returns the measurements as a dict."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+    completed = subprocess.run(
+        [python, '-X', 'importtime', '-c', _BOOT_SCRIPT],
+        capture_output=True, text=True, env=env, check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f'Boot failed:\n{completed.stderr[-2000:]}')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    imports = _parse_importtime(completed.stderr)
+    modules = result.pop('modules')
+    result['import_ms'] = sum(cumulative for _, _, cumulative in imports) / 1000
+    result['imports'] = sorted(imports, key=lambda entry: entry[2], reverse=True)
+    result['lazy_loaded'] = [
+        name for name in LAZY_MODULES
+        if any(module == name or module.startswith(name + '.') for module in modules)
+    ]
+    return result
+
+
+def run(settings_module, top, max_ms=None, max_rss_mb=None):
+    """Measurements plus a list of budget violations (empty when within budget)."""
+    result = probe(settings_module)
+    rss_mb = result['rss_kb'] / 1024
+    failures = [f'{name} imported at boot' for name in result['lazy_loaded']]
+    if max_ms is not None and result['boot_ms'] > max_ms:
+        failures.append(f'boot took {result["boot_ms"]:.0f} ms (budget {max_ms:.0f} ms)')
+    if max_rss_mb is not None and rss_mb > max_rss_mb:
+        failures.append(f'RSS {rss_mb:.1f} MB after boot (budget {max_rss_mb:.1f} MB)')
+    rows = [
+        {'module': name, 'cumulative_ms': cumulative / 1000, 'self_ms': self_us / 1000}
+        for name, self_us, cumulative in result['imports'][:top]
+    ]
+    summary = {
+        'settings': settings_module, 'boot_ms': result['boot_ms'], 'import_ms': result['import_ms'],
+        'rss_mb': rss_mb, 'lazy_loaded': ', '.join(result['lazy_loaded']) or 'none',
+    }
+    return {'summary': summary, 'imports': rows, 'failures': failures}
+
+
+def report(results):
+    sections = [
+        format_table([results['summary']], ('settings', 'boot_ms', 'import_ms', 'rss_mb', 'lazy_loaded')),
+        format_table(results['imports'], ('module', 'cumulative_ms', 'self_ms')),
+    ]
+    if results['failures']:
+        sections.append('\n'.join(f'FAIL: {failure}' for failure in results['failures']))
+    return '\n\n'.join(sections)
@@ -0,0 +1,155 @@
+"""
+PDF text engine comparison (procure.pdf_engines) on a document corpus.
+
+Every document goes through extract_document (text and fields) with each
+engine. Speed is the mean time per document. Fidelity is measured against
+PdfminerEngine, the reference: line-level text similarity and the share of
+structured fields that come out identical. `routes` counts how the pages
+were read (pdfium text, pdfminer layout, OCR).
+
+The built-in corpus is generated (no binary fixtures): a table invoice, a
+plain-text receipt, a long multi-page statement and a scanned page without
+a text layer. `--corpus DIR` adds every *.pdf in DIR.
+"""
+import time
+from collections import Counter
+from difflib import SequenceMatcher
+from io import BytesIO
+from pathlib import Path
+
+from django.test.utils import override_settings
+
+from benchmarks.stats import format_table
+
+ENGINES = {
+    'pdfminer': 'procure.pdf_engines.PdfminerEngine',
+    'pdfium': 'procure.pdf_engines.PdfiumEngine',
+}
+REFERENCE = 'pdfminer'
+
+
+def _text_pdf(pages):
+    """A PDF with one page per list of (font size, text) lines."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    for lines in pages:
+        y = 740
+        for size, text in lines:
+            pdf.setFont('Helvetica-Bold' if size > 12 else 'Helvetica', size)
+            pdf.drawString(50, y, text)
+            y -= size + 6
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _receipt_pdf():
+    return _text_pdf([[
+        (18, 'Corner Shop Ltd'), (10, 'Receipt No: R-20931'), (10, 'Date: 12/11/2025'),
+        (10, 'Printer paper 4 6.50 26.00'), (10, 'Stapler 1 12.00 12.00'), (10, 'Pens 10 0.80 8.00'),
+        (10, 'Subtotal 46.00'), (10, 'VAT 8.28'), (10, 'Total USD 54.28'),
+    ]])
+
+
+def _statement_pdf(pages=20):
+    body = [
+        (10, f'{day:02d}/11/2025 Transfer to supplier {day * 37 % 900:03d} reference TRX{day * 7919:07d} '
+             f'{day * 13.75:.2f}')
+        for day in range(1, 31)
+    ]
+    return _text_pdf([[(16, 'Bank of Kigali Statement'), (10, f'Page {number}')] + body
+                      for number in range(1, pages + 1)])
+
+
+def _scanned_pdf(source):
+    """`source` rendered to an image and embedded without a text layer."""
+    import pypdfium2
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    document = pypdfium2.PdfDocument(source)
+    try:
+        page = document[0]
+        image = page.render(scale=150 / 72).to_pil()
+        page.close()
+    finally:
+        document.close()
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    pdf.drawImage(ImageReader(image), 0, 0, *letter)
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def build_corpus(directory=None):
+    from procure.testing import make_invoice_pdf
+
+    invoice = make_invoice_pdf()
+    corpus = {
+        'invoice-table': invoice,
+        'receipt-text': _receipt_pdf(),
+        'statement-20p': _statement_pdf(),
+        'scanned-invoice': _scanned_pdf(invoice),
+    }
+    if directory:
+        for path in sorted(Path(directory).glob('*.pdf')):
+            corpus[path.name] = path.read_bytes()
+    return corpus
+
+
+def _extract(engine, data):
+    from procure.document_processing import extract_document, iter_document_pages
+
+    with override_settings(PDF_TEXT_ENGINE=ENGINES[engine]):
+        document = extract_document(BytesIO(data))
+        routes = Counter(page['engine'] for page in iter_document_pages(BytesIO(data), with_fields=True))
+    return document, routes
+
+
+def _timed(engine, data, runs):
+    from procure.document_processing import extract_document
+
+    with override_settings(PDF_TEXT_ENGINE=ENGINES[engine]):
+        extract_document(BytesIO(data))  # warm-up
+        started = time.perf_counter()
+        for _ in range(runs):
+            extract_document(BytesIO(data))
+    return (time.perf_counter() - started) * 1000 / runs
+
+
+def _text_similarity(reference, text):
+    return SequenceMatcher(None, reference.splitlines(), text.splitlines(), autojunk=False).ratio()
+
+
+def _field_agreement(reference, fields):
+    if not reference:
+        return None
+    keys = reference.keys() | (fields or {}).keys()
+    return sum(reference.get(key) == (fields or {}).get(key) for key in keys) / len(keys)
+
+
+def run(runs, engines, corpus_dir=None):
+    rows = []
+    for name, data in build_corpus(corpus_dir).items():
+        reference, _ = _extract(REFERENCE, data)
+        for engine in engines:
+            document, routes = _extract(engine, data)
+            agreement = _field_agreement(reference['fields'], document['fields'])
+            rows.append({
+                'document': name,
+                'engine': engine,
+                'mean_ms': _timed(engine, data, runs),
+                'text_match_pct': 100 * _text_similarity(reference['text'], document['text']),
+                'fields_match_pct': None if agreement is None else 100 * agreement,
+                'routes': ' '.join(f'{route}:{count}' for route, count in sorted(routes.items())),
+            })
+    return rows
+
+
+def report(rows):
+    return format_table(rows, ('document', 'engine', 'mean_ms', 'text_match_pct', 'fields_match_pct', 'routes'))
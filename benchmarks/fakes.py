@@ -0,0 +1,8 @@
+import os
+
+from procure.testing import FakeGenaiClient
+
+
+def slow_gemini_client(api_key=None):
+    """GEMINI_CLIENT for benchmarks: answers "valid" after BENCH_GEMINI_DELAY seconds (default 2)."""
+    return FakeGenaiClient(delay=float(os.getenv('BENCH_GEMINI_DELAY', '2')))
@@ -0,0 +1,216 @@
+"""
+HTTP load driver for the purchase request endpoints.
+
+Each scenario runs `requests` calls through a pool of `concurrency` worker
+threads against a running server and reports client-side latency
+percentiles, throughput and errors. When the server runs with
+BENCHMARK_HEADERS=1 it also reports queries per request, the share of
+requests that opened a new database connection, and server RSS.
+
+Scenarios:
+    list            GET /api/requests/ (random page) as the admin user
+    search          GET /api/requests/?search=<term> as the level-1 approver
+    approve         PATCH /api/requests/<id>/approve/ on pending requests (level-1 approver)
+    submit-receipt  POST /api/requests/<id>/submit-receipt/ on the staff user's approved requests
+
+`approve` and `submit-receipt` only pick requests they have not touched yet,
+so repeated runs eventually need a re-seed. submit-receipt calls Gemini from
+the server; run the server with benchmarks.settings to use a stand-in.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from benchmarks.stats import format_table, summarize
+
+SCENARIOS = ('list', 'search', 'approve', 'submit-receipt')
+SEARCH_TERMS = ('supplies', 'equipment', 'catering', 'printer', 'PENDING', 'APPROVED', 'example.com')
+
+
+class ApiClient:
+    """Minimal JSON/multipart client with per-user JWT tokens (re-login on 401)."""
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.credentials = {}
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def add_user(self, username, password):
+        self.credentials[username] = password
+
+    def _login(self, username):
+        status, body, _ = self._send('POST', '/api/accounts/login/', json_body={
+            'username': username, 'password': self.credentials[username],
+        })
+        if status != 200:
+            raise RuntimeError(f'Login failed for {username}: HTTP {status} {body[:200]!r}')
+        token = json.loads(body)['access']
+        with self.lock:
+            self.tokens[username] = token
+        return token
+
+    def _send(self, method, path, json_body=None, files=None, token=None):
+        headers = {'Accept': 'application/json'}
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif files:
+            boundary = uuid.uuid4().hex
+            data = _multipart(files, boundary)
+            headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        request = Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read(), response.headers
+        except HTTPError as exc:
+            return exc.code, exc.read(), exc.headers
+
+    def call(self, username, method, path, **kwargs):
+        """Returns (status, body, headers, seconds); login time is not included."""
+        token = self.tokens.get(username) or self._login(username)
+        started = time.perf_counter()
+        status, body, headers = self._send(method, path, token=token, **kwargs)
+        elapsed = time.perf_counter() - started
+        if status == 401:
+            token = self._login(username)
+            started = time.perf_counter()
+            status, body, headers = self._send(method, path, token=token, **kwargs)
+            elapsed = time.perf_counter() - started
+        return status, body, headers, elapsed
+
+    def get_json(self, username, path, **params):
+        query = f'?{urlencode(params)}' if params else ''
+        status, body, _, _ = self.call(username, 'GET', path + query)
+        if status != 200:
+            raise RuntimeError(f'GET {path} as {username}: HTTP {status}')
+        return json.loads(body)
+
+
+def _multipart(files, boundary):
+    parts = []
+    for field, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts)
+
+
+def _collect_ids(client, username, search, wanted, accept=lambda row: True):
+    """Ids of up to `wanted` requests visible to `username` with status `search`, filtered by `accept`."""
+    ids, page = [], 1
+    while len(ids) < wanted:
+        try:
+            data = client.get_json(username, '/api/requests/', search=search, page=page, page_size=100)
+        except RuntimeError:
+            break  # past the last page
+        ids += [
+            row['id'] for row in data['results']
+            if row['status'] == search and accept(row)
+        ]
+        if not data.get('next'):
+            break
+        page += 1
+    return ids[:wanted]
+
+
+def build_calls(scenario, client, users, count, receipt_pdf):
+    """A list of zero-argument callables, one per request the scenario makes."""
+    rng = random.Random(0)
+    if scenario == 'list':
+        pages = max(1, client.get_json(users['admin'], '/api/requests/')['count'] // 10)
+        return [
+            lambda page=rng.randint(1, min(pages, 1000)): client.call(users['admin'], 'GET', f'/api/requests/?page={page}')
+            for _ in range(count)
+        ]
+    if scenario == 'search':
+        return [
+            lambda term=rng.choice(SEARCH_TERMS): client.call(
+                users['approver_l1'], 'GET', f'/api/requests/?{urlencode({"search": term})}'
+            )
+            for _ in range(count)
+        ]
+    if scenario == 'approve':
+        ids = _collect_ids(client, users['approver_l1'], 'PENDING', count, accept=lambda row: not row['approvals'])
+        return [
+            lambda pk=pk: client.call(
+                users['approver_l1'], 'PATCH', f'/api/requests/{pk}/approve/', json_body={'comment': 'load test'}
+            )
+            for pk in ids
+        ]
+    if scenario == 'submit-receipt':
+        ids = _collect_ids(client, users['staff'], 'APPROVED', count, accept=lambda row: not row['receipt'])
+        files = {'receipt': ('receipt.pdf', receipt_pdf, 'application/pdf')}
+        return [
+            lambda pk=pk: client.call(users['staff'], 'POST', f'/api/requests/{pk}/submit-receipt/', files=files)
+            for pk in ids
+        ]
+    raise ValueError(f'Unknown scenario: {scenario}')
+
+
+def run_scenario(calls, concurrency):
+    latencies, queries, rss, opened = [], [], [], []
+    errors = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for status, _, headers, elapsed in pool.map(lambda call: call(), calls):
+            latencies.append(elapsed * 1000)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+            if headers.get('X-DB-Queries'):
+                queries.append(int(headers['X-DB-Queries']))
+            if headers.get('X-DB-Connections-Opened'):
+                opened.append(int(headers['X-DB-Connections-Opened']))
+            if headers.get('X-Process-RSS-KB'):
+                rss.append(int(headers['X-Process-RSS-KB']))
+    wall = time.perf_counter() - started
+
+    result = {'requests': len(calls), 'seconds': wall, 'rps': len(calls) / wall if wall else 0.0}
+    latency = summarize(latencies) or {}
+    result.update({f'{key}_ms': latency.get(key) for key in ('p50', 'p95', 'p99', 'max')})
+    result['queries_mean'] = sum(queries) / len(queries) if queries else None
+    result['queries_max'] = max(queries) if queries else None
+    # Connection churn: 100% means no connection was reused across requests
+    result['new_conn_pct'] = 100 * sum(1 for n in opened if n) / len(opened) if opened else None
+    result['server_rss_mb'] = max(rss) / 1024 if rss else None
+    result['errors'] = ', '.join(f'{code}x{n}' for code, n in sorted(errors.items())) or '0'
+    return result
+
+
+def run(base_url, scenarios, requests, concurrency, users, password, receipt_pdf, timeout=60):
+    client = ApiClient(base_url, timeout=timeout)
+    for username in users.values():
+        client.add_user(username, password)
+
+    rows = []
+    for scenario in scenarios:
+        calls = build_calls(scenario, client, users, requests, receipt_pdf)
+        if not calls:
+            rows.append({'scenario': scenario, 'requests': 0, 'errors': 'no matching requests'})
+            continue
+        row = run_scenario(calls, concurrency)
+        row['scenario'] = scenario
+        rows.append(row)
+    return rows
+
+
+COLUMNS = (
+    'scenario', 'requests', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+    'queries_mean', 'queries_max', 'new_conn_pct', 'server_rss_mb', 'errors',
+)
+
+
+def report(rows):
+    return format_table(rows, COLUMNS)
@@ -0,0 +1,121 @@
+"""
+Micro-benchmarks for document processing and serialization.
+
+Runs against a throwaway database (created and destroyed like the test
+suite's) seeded with a small data set, so it never touches real data.
+"""
+import time
+from io import BytesIO
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils.module_loading import import_string
+
+from benchmarks.stats import format_table, summarize
+
+BENCHMARKS = (
+    'serialize-page', 'list-page', 'render-json', 'render-orjson', 'parse-json', 'parse-orjson',
+    'render-po-pdf', 'extract-pdf', 'parse-fields', 'ocr',
+)
+# Rows on the pages the JSON renderers and parsers are timed on (the API's max page size)
+JSON_PAGE_ROWS = 100
+
+
+def _timed(func, runs, warmup=2):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def _benchmarks(ocr_backend):
+    from procure.document_processing import extract_document, render_po_pdf
+    from procure.invoice_fields import parse_invoice_fields
+    from procure.serializers import PurchaseRequestSerializer
+    from procure.seeding import seed_requests, seed_users
+    from procure.testing import make_invoice_pdf
+    from procure.views import PurchaseRequestViewSet
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from procure_to_pay import renderers
+
+    owners = seed_users(50, prefix='micro')
+    seed_requests(owners['staff'], 500, approver_ids={1: owners['approver_l1'], 2: owners['approver_l2']})
+    viewset_queryset = PurchaseRequestViewSet.queryset
+    page = list(viewset_queryset.order_by('-created_at')[:10])
+    pr = page[0]
+    invoice_pdf = make_invoice_pdf()
+    invoice_text = extract_document(BytesIO(invoice_pdf), with_fields=False)['text']
+
+    def serialize_page():
+        PurchaseRequestSerializer(page, many=True).data
+
+    def list_page():
+        PurchaseRequestSerializer(viewset_queryset.order_by('-created_at')[:10], many=True).data
+
+    json_page = {
+        'count': 500, 'next': None, 'previous': None,
+        'results': PurchaseRequestSerializer(
+            viewset_queryset.order_by('-created_at')[:JSON_PAGE_ROWS], many=True
+        ).data,
+    }
+    json_body = JSONRenderer().render(json_page)
+
+    benchmarks = {
+        'serialize-page': serialize_page,
+        'list-page': list_page,
+        'render-json': lambda: JSONRenderer().render(json_page),
+        'parse-json': lambda: JSONParser().parse(BytesIO(json_body)),
+        'render-po-pdf': lambda: render_po_pdf(pr, pr.vendor),
+        'extract-pdf': lambda: extract_document(BytesIO(invoice_pdf)),
+        'parse-fields': lambda: parse_invoice_fields(invoice_text),
+    }
+
+    if renderers.orjson is None:
+        benchmarks['render-orjson'] = benchmarks['parse-orjson'] = ImportError('orjson is not installed')
+    else:
+        benchmarks['render-orjson'] = lambda: renderers.FastJSONRenderer().render(json_page)
+        benchmarks['parse-orjson'] = lambda: renderers.FastJSONParser().parse(BytesIO(json_body))
+
+    try:
+        import pdfplumber
+
+        with pdfplumber.open(BytesIO(invoice_pdf)) as pdf:
+            image = pdf.pages[0].to_image(resolution=200).original.copy()
+        ocr = import_string(ocr_backend)
+        ocr(image)
+    except Exception as exc:  # OCR engine missing, etc.
+        benchmarks['ocr'] = exc
+    else:
+        benchmarks['ocr'] = lambda: ocr(image)
+    return benchmarks
+
+
+def run(selected, runs, ocr_backend):
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        benchmarks = _benchmarks(ocr_backend)
+        rows = []
+        for name in selected:
+            func = benchmarks[name]
+            if isinstance(func, Exception):
+                rows.append({'benchmark': name, 'note': f'skipped: {func}'})
+                continue
+            stats = _timed(func, runs if name != 'ocr' else max(1, runs // 10))
+            rows.append({
+                'benchmark': name, 'runs': stats['count'], 'mean_ms': stats['mean'],
+                'p50_ms': stats['p50'], 'p95_ms': stats['p95'], 'p99_ms': stats['p99'],
+            })
+        return rows
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def report(rows):
+    return format_table(rows, ('benchmark', 'runs', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'note'))
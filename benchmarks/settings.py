@@ -0,0 +1,15 @@
+"""
+Server settings for benchmarking worker configurations without external
+services: local file storage instead of Cloudinary and a Gemini stand-in with
+a fixed latency (benchmarks.fakes). Database settings are the regular ones.
+
+    DJANGO_SETTINGS_MODULE=benchmarks.settings BENCH_GEMINI_DELAY=2 gunicorn ...
+"""
+import tempfile
+
+from procure_to_pay.settings import *  # noqa: F401,F403
+
+MEDIA_ROOT = os.getenv('BENCH_MEDIA_ROOT') or tempfile.mkdtemp(prefix='ptp-bench-media-')
+DEFAULT_FILE_STORAGE = 'procure.testing.LocalDocumentStorage'
+RAW_DOCUMENT_STORAGE = 'procure.testing.LocalDocumentStorage'
+GEMINI_CLIENT = 'benchmarks.fakes.slow_gemini_client'
@@ -0,0 +1,35 @@
+import math
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """p50/p95/p99/mean/max of a list of numbers, or None for an empty list."""
+    if not samples:
+        return None
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples),
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'max': max(samples),
+    }
+
+
+def format_table(rows, columns):
+    """Plain-text table of dicts; floats get two decimals."""
+    def cell(value):
+        if value is None:
+            return '-'
+        return f'{value:.2f}' if isinstance(value, float) else str(value)
+
+    body = [[cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(line[i]) for line in body]) for i, column in enumerate(columns)]
+    lines = [columns] + body
+    return '\n'.join('  '.join(value.ljust(width) for value, width in zip(line, widths)).rstrip() for line in lines)
@@ -1,8 +1,10 @@
 from django.contrib import admin
-from procure.models import PurchaseRequest, RequestItem, Approval, PurchaseOrder, ReceiptValidation
+from procure.models import PurchaseRequest, RequestItem, Approval, PurchaseOrder, ReceiptValidation, MonthlyRequestStats, IdempotencyKey
 
 admin.site.register(PurchaseRequest)
 admin.site.register(RequestItem)
 admin.site.register(Approval)
 admin.site.register(PurchaseOrder)
 admin.site.register(ReceiptValidation)
+admin.site.register(MonthlyRequestStats)
+admin.site.register(IdempotencyKey)
@@ -0,0 +1,221 @@
+"""
+Dashboard statistics for purchase requests.
+
+Month/status counts and totals come from the MonthlyRequestStats rollup, which
+is kept up to date incrementally (see procure.signals). Everything else is
+aggregated in the database, so a dashboard load costs a handful of queries no
+matter how many requests exist.
+"""
+import logging
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Aggregate, Count, DateField, DurationField, ExpressionWrapper, F, FloatField, Func, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from procure.models import PurchaseRequest, Approval, MonthlyRequestStats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_PERCENTILES = (50, 90, 95)
+
+
+def _money(value):
+    return f"{Decimal(value or 0):.2f}"
+
+
+def month_of(value):
+    """First day of the (local) month a datetime falls in."""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def bump_monthly_stats(month, status, count_delta, amount_delta):
+    """Apply a delta to one rollup row, creating it on first use."""
+    rows = MonthlyRequestStats.objects.filter(month=month, status=status)
+    updated = rows.update(
+        request_count=F('request_count') + count_delta,
+        total_amount=F('total_amount') + amount_delta,
+    )
+    if updated:
+        return
+    if count_delta < 0:
+        # Nothing to take the request away from: the rollup has drifted
+        # (rows deleted, or requests loaded without it), so recompute it
+        logger.warning("No %s rollup row for %s to decrement; rebuilding monthly stats", status, month)
+        transaction.on_commit(rebuild_monthly_stats)
+        return
+    try:
+        with transaction.atomic():
+            MonthlyRequestStats.objects.create(
+                month=month, status=status,
+                request_count=count_delta, total_amount=amount_delta,
+            )
+    except IntegrityError:
+        # Another writer created the row concurrently
+        rows.update(
+            request_count=F('request_count') + count_delta,
+            total_amount=F('total_amount') + amount_delta,
+        )
+
+
+def rebuild_monthly_stats():
+    """Recompute the whole rollup from PurchaseRequest (after bulk loads or drift)."""
+    rows = (
+        PurchaseRequest.objects
+        .annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values('month', 'status')
+        .annotate(request_count=Count('id'), total_amount=Sum('amount'))
+        .order_by()
+    )
+    with transaction.atomic():
+        MonthlyRequestStats.objects.all().delete()
+        MonthlyRequestStats.objects.bulk_create([
+            MonthlyRequestStats(
+                month=row['month'],
+                status=row['status'],
+                request_count=row['request_count'],
+                total_amount=row['total_amount'] or Decimal('0'),
+            )
+            for row in rows
+        ])
+    return MonthlyRequestStats.objects.count()
+
+
+def status_summary(months=12):
+    """Counts/totals per status and per month for the last `months` months."""
+    today = timezone.localdate()
+    first_month = today.year * 12 + today.month - 1 - (months - 1)
+    since = date(first_month // 12, first_month % 12 + 1, 1)
+    monthly = list(
+        MonthlyRequestStats.objects
+        .filter(month__gte=since)
+        .values('month', 'status', 'request_count', 'total_amount')
+    )
+    by_status = {
+        row['status']: row
+        for row in MonthlyRequestStats.objects.values('status').annotate(
+            request_count=Sum('request_count'), total_amount=Sum('total_amount'),
+        ).order_by()
+    }
+    totals = [
+        {
+            'status': status,
+            'count': by_status.get(status, {}).get('request_count') or 0,
+            'total_amount': _money(by_status.get(status, {}).get('total_amount')),
+        }
+        for status, _ in PurchaseRequest.STATUS_CHOICES
+    ]
+    decided = sum(t['count'] for t in totals if t['status'] != PurchaseRequest.STATUS_PENDING)
+    rejected = sum(t['count'] for t in totals if t['status'] == PurchaseRequest.STATUS_REJECTED)
+    return {
+        'by_status': totals,
+        'by_month': [
+            {
+                'month': row['month'].strftime('%Y-%m'),
+                'status': row['status'],
+                'count': row['request_count'],
+                'total_amount': _money(row['total_amount']),
+            }
+            for row in monthly
+        ],
+        'rejection_rate': round(rejected / decided, 4) if decided else None,
+    }
+
+
+def spend_per_vendor(limit=10):
+    """Approved spend per vendor, largest first."""
+    rows = (
+        PurchaseRequest.objects
+        .filter(status=PurchaseRequest.STATUS_APPROVED)
+        .values('vendor')
+        .annotate(request_count=Count('id'), total_amount=Sum('amount'))
+        .order_by('-total_amount')[:limit]
+    )
+    return [
+        {'vendor': row['vendor'], 'count': row['request_count'], 'total_amount': _money(row['total_amount'])}
+        for row in rows
+    ]
+
+
+def decisions_per_approver():
+    """Approve/reject counts per approver and level."""
+    rows = (
+        Approval.objects
+        .values('approver__username', 'level')
+        .annotate(
+            approved_count=Count('id', filter=Q(approved=True)),
+            rejected_count=Count('id', filter=Q(approved=False)),
+        )
+        .order_by('level', 'approver__username')
+    )
+    decisions = []
+    for row in rows:
+        decided = row['approved_count'] + row['rejected_count']
+        decisions.append({
+            'approver': row['approver__username'],
+            'level': row['level'],
+            'approved': row['approved_count'],
+            'rejected': row['rejected_count'],
+            'rejection_rate': round(row['rejected_count'] / decided, 4) if decided else None,
+        })
+    return decisions
+
+
+class PercentileCont(Aggregate):
+    """PostgreSQL ordered-set aggregate: percentile_cont(f) WITHIN GROUP (ORDER BY expr)."""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=fraction, **extra)
+
+
+class EpochSeconds(Func):
+    """PostgreSQL: length of an interval in seconds."""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+
+def _latency_percentiles(queryset):
+    """Percentiles (seconds) of the `latency` annotation, computed by the database."""
+    count = queryset.count()
+    result = {'count': count}
+    if not count:
+        result.update({f'p{p}': None for p in LATENCY_PERCENTILES})
+        return result
+
+    if connection.vendor == 'postgresql':
+        aggregates = queryset.aggregate(**{
+            f'p{p}': PercentileCont(EpochSeconds('latency'), p / 100) for p in LATENCY_PERCENTILES
+        })
+        result.update({key: round(value, 1) for key, value in aggregates.items()})
+        return result
+
+    # Portable nearest-rank percentiles: one ordered OFFSET lookup per percentile
+    ordered = queryset.order_by('latency').values_list('latency', flat=True)
+    for p in LATENCY_PERCENTILES:
+        index = max(0, -(-p * count // 100) - 1)
+        result[f'p{p}'] = round(ordered[index].total_seconds(), 1)
+    return result
+
+
+def approval_latency():
+    """Time from request creation to each approval level's decision."""
+    latency = ExpressionWrapper(F('created_at') - F('request__created_at'), output_field=DurationField())
+    return {
+        f'level_{level}': _latency_percentiles(
+            Approval.objects.filter(level=level, approved=True).annotate(latency=latency)
+        )
+        for level in (1, 2)
+    }
+
+
+def dashboard(months=12, vendor_limit=10):
+    data = status_summary(months=months)
+    data['spend_per_vendor'] = spend_per_vendor(limit=vendor_limit)
+    data['approvers'] = decisions_per_approver()
+    data['approval_latency_seconds'] = approval_latency()
+    return data
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class ProcureConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'procure'
+
+    def ready(self):
+        import procure.signals
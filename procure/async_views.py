@@ -0,0 +1,167 @@
+"""
+Async views for the I/O-bound endpoints, served when running under ASGI
+(procure_to_pay.asgi with ASYNC_RECEIPT_VIEWS=1).
+
+DRF 3.14 views are synchronous, so under ASGI every DRF request occupies a
+thread while it waits on Gemini or Cloudinary. These views keep the same URL,
+request and response format as their DRF counterparts in procure.views, but
+await the model call on the event loop and push blocking storage and parsing
+work to worker threads, so one worker process can hold many in-flight
+validations.
+"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.http.multipartparser import MultiPartParserError
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from accounts.models import Role
+from procure.document_cache import cache_uploaded_copy
+from procure.document_processing import avalidate_receipt_against_po_with_text, extract_document
+from procure import idempotency
+from procure.models import PurchaseRequest
+from procure.resilience import ServiceUnavailable
+from procure.storage import store_file
+from procure.uploads import UploadTooLarge, uploaded_file_sha256, uploaded_file_source
+
+# Blocking work that doesn't touch the database (parsing, storage uploads) runs
+# here rather than in asyncio's default executor, which is sized by CPU count
+_offload_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_OFFLOAD_THREADS, thread_name_prefix='procure-offload'
+)
+
+
+def _offload(func):
+    return sync_to_async(func, thread_sensitive=False, executor=_offload_executor)
+
+
+def _detail(message, status):
+    return JsonResponse({"detail": message}, status=status)
+
+
+def _authenticate(request):
+    """(user, role) from the JWT, mirroring the DRF authentication of the sync views."""
+    result = JWTAuthentication().authenticate(Request(request))
+    if result is None:
+        return None, None
+    user = result[0]
+    return user, getattr(getattr(user, "profile", None), "role", None)
+
+
+def _parse_files(request):
+    """Parsing the multipart body spools and hashes the upload (HashingTemporaryFileUploadHandler)."""
+    return request.FILES
+
+
+def _store_receipt(pr, receipt_file, receipt_sha256):
+    """Upload to storage (network I/O, no database access) and set the stored URL."""
+    pr.receipt = store_file(pr.receipt, receipt_file.name, receipt_file)
+    pr.receipt_url = pr.receipt.url
+    pr.receipt_sha256 = receipt_sha256
+
+
+async def submit_receipt(request, pk):
+    """Async counterpart of PurchaseRequestViewSet.submit_receipt."""
+    if request.method != "POST":
+        return _detail(f'Method "{request.method}" not allowed.', 405)
+    try:
+        user, role = await sync_to_async(_authenticate)(request)
+    except AuthenticationFailed as exc:
+        return _detail(str(exc.detail), 401)
+    if user is None:
+        return _detail("Authentication credentials were not provided.", 401)
+    if role != Role.STAFF:
+        return _detail("You do not have permission to perform this action.", 403)
+
+    key = request.headers.get(idempotency.HEADER)
+    if not key:
+        return await _submit_receipt(request, pk, user)
+    # The upload is part of the call's fingerprint
+    try:
+        files = await _offload(_parse_files)(request)
+    except UploadTooLarge as exc:
+        return _detail(str(exc), 413)
+    except MultiPartParserError as exc:
+        return _detail(f"Multipart form parse error - {exc}", 400)
+    data = request.POST.copy()
+    data.update(files)
+    call_fingerprint = await _offload(idempotency.fingerprint)(request.method, request.path, data)
+    return await idempotency.arun(user, key, call_fingerprint, lambda: _submit_receipt(request, pk, user))
+
+
+async def _submit_receipt(request, pk, user):
+    pr = await (
+        PurchaseRequest.objects.select_related("receipt_validation")
+        .filter(pk=pk).afirst()
+    )
+    if pr is None:
+        return _detail("Not found.", 404)
+
+    # Only the staff who created the request may submit its receipt
+    if pr.created_by_id != user.pk:
+        return _detail("Only the request owner can submit a receipt.", 403)
+    if pr.status != PurchaseRequest.STATUS_APPROVED:
+        return _detail("Only approved requests can accept receipts.", 400)
+
+    try:
+        files = await _offload(_parse_files)(request)
+    except UploadTooLarge as exc:
+        return _detail(str(exc), 413)
+    except MultiPartParserError as exc:
+        return _detail(f"Multipart form parse error - {exc}", 400)
+    if "receipt" not in files:
+        return _detail("Receipt file is required.", 400)
+    receipt_file = files["receipt"]
+    receipt_sha256 = uploaded_file_sha256(receipt_file)
+
+    # Same file submitted again (e.g. a client retry): reuse the stored validation
+    previous = getattr(pr, "receipt_validation", None)
+    if pr.receipt_sha256 == receipt_sha256 and previous and previous.validation_result:
+        return JsonResponse({
+            "detail": "Receipt already submitted and validated.",
+            "validation": previous.validation_result,
+        })
+
+    # CPU-bound parsing and the storage upload run in worker threads, not on the event loop
+    try:
+        receipt_document = await _offload(extract_document)(
+            uploaded_file_source(receipt_file)
+        )
+        receipt_file.seek(0)
+    except Exception as e:
+        return _detail(f"Failed to process receipt: {str(e)}", 400)
+
+    try:
+        await _offload(_store_receipt)(pr, receipt_file, receipt_sha256)
+    except ServiceUnavailable as exc:
+        response = _detail(f"{exc}. Please try again later.", 503)
+        response["Retry-After"] = str(math.ceil(exc.retry_after or 0) or 1)
+        return response
+    await pr.asave(update_fields=["receipt", "receipt_url", "receipt_sha256", "updated_at"])
+    await _offload(cache_uploaded_copy)(pr.receipt, receipt_file)
+
+    try:
+        validation_result = await avalidate_receipt_against_po_with_text(
+            pr, receipt_document["text"], receipt_fields=receipt_document["fields"]
+        )
+    except Exception as e:
+        return _detail(f"Validation failed: {str(e)}", 500)
+
+    if validation_result.get("pending_retry"):
+        return JsonResponse({
+            "detail": "Receipt submitted; validation is pending and will be retried.",
+            "validation": validation_result,
+        }, status=202)
+    return JsonResponse({
+        "detail": "Receipt submitted and validated successfully.",
+        "validation": validation_result,
+    })
+
+
+# Authenticated with JWT bearer tokens, like the DRF views (which are csrf-exempt too)
+submit_receipt.csrf_exempt = True
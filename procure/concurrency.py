@@ -0,0 +1,101 @@
+"""
+Optimistic concurrency for purchase requests.
+
+Edits, approvals and rejections change a request with one conditional
+UPDATE that also bumps its `version`:
+
+    UPDATE procure_purchaserequest SET ..., version = version + 1
+    WHERE id = %s [AND version = %s] [AND status = 'PENDING' ...]
+
+No row lock is held between reading the request and writing it (approve
+used to keep one while it rendered the PO), and of two writers only the one
+whose conditions still hold succeeds. Edits always check the version they
+read; approvals and rejections check the status (and the version only when
+the client sends one). Clients get the version as the request's ETag and
+can send it back in If-Match on PUT/PATCH, approve and reject: a stale
+one gets 412, an edit that lost a race without one gets 409.
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from procure.models import PurchaseRequest
+from procure.signals import ROLLUP_FIELDS, remember_rollup_state
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The request has changed since the version in If-Match; reload it and try again.'
+    default_code = 'precondition_failed'
+
+
+class EditConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The request was changed by someone else meanwhile; reload it and try again.'
+    default_code = 'edit_conflict'
+
+
+def etag(version):
+    return f'"{version}"'
+
+
+def if_match_version(request):
+    """The version in the request's If-Match header, None without one (or with `*`)."""
+    header = request.headers.get('If-Match', '').strip()
+    if not header or header == '*':
+        return None
+    tag = header.split(',')[0].strip().removeprefix('W/').strip('"')
+    try:
+        return int(tag)
+    except ValueError:
+        # No version ever has this tag
+        raise PreconditionFailed() from None
+
+
+def conditional_update(pr, *conditions, version=None, **changes):
+    """
+    Apply `changes` to `pr` and bump its version, in one UPDATE that only
+    matches while `conditions` (Q objects or boolean expressions) hold and,
+    if given, the version is still `version`. Returns whether it matched;
+    `pr` is only updated (reloaded) when it did.
+    """
+    now = timezone.now()
+    rows = PurchaseRequest.objects.filter(Q(pk=pr.pk), *conditions)
+    if version is not None:
+        rows = rows.filter(version=version)
+    with transaction.atomic(using=rows.db):
+        if not rows.update(version=F('version') + 1, updated_at=now, **changes):
+            return False
+
+        # Reloaded whole (the UPDATE keeps the row locked until the commit):
+        # without a version check, other fields may have been changed since
+        # `pr` was read, e.g. the amount by an edit before an approval
+        before = {field: getattr(pr, field) for field in ROLLUP_FIELDS if field in changes}
+        pr.refresh_from_db()
+        # The monthly rollup (procure.signals) follows status and amount
+        # changes, from the row as it was just before the UPDATE: as reloaded,
+        # with the fields changed here as in `pr` (the conditions held)
+        after = {field: getattr(pr, field) for field in before}
+        pr.__dict__.update(before)
+        remember_rollup_state(PurchaseRequest, pr)
+        pr.__dict__.update(after)
+        post_save.send(
+            sender=PurchaseRequest, instance=pr, created=False, raw=False, using=rows.db,
+            update_fields=frozenset(changes) | {'version', 'updated_at'},
+        )
+    return True
+
+
+def conflict(pr, expected_version=None):
+    """
+    Why a conditional_update of `pr` didn't match: PreconditionFailed if
+    `expected_version` (from If-Match) is stale, else EditConflict. Reloads
+    the status and version of `pr`, for callers with conditions of their own.
+    """
+    pr.refresh_from_db(fields=['status', 'version'])
+    if expected_version is not None and expected_version != pr.version:
+        return PreconditionFailed()
+    return EditConflict()
@@ -0,0 +1,111 @@
+"""
+Storage-agnostic access to stored documents (proformas, receipts).
+
+Text extraction needs a local file, but proformas and receipts live on
+Cloudinary, where `FieldFile.path` is not available. `local_document()` yields
+a filesystem path for any storage: local storages hand out their own path,
+remote blobs are streamed once through `storage.open()` into an on-disk cache
+(DOCUMENT_CACHE_DIR) and reused on later calls. Files uploaded through this
+process can be put in the cache right away with `cache_uploaded_copy()`, so
+they are never downloaded back.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _cache_dir():
+    path = Path(settings.DOCUMENT_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _cache_path(name):
+    """Stored names are unique per upload, so they make stable cache keys."""
+    digest = hashlib.sha256(name.encode('utf-8')).hexdigest()
+    return _cache_dir() / f"{digest}{Path(name).suffix.lower()}"
+
+
+def _local_storage_path(field_file):
+    try:
+        path = field_file.storage.path(field_file.name)
+    except NotImplementedError:
+        return None
+    return path if os.path.exists(path) else None
+
+
+def _write_atomically(target, source):
+    """Copy a binary stream to `target` through a temp file in the same directory."""
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            shutil.copyfileobj(source, tmp, COPY_CHUNK_SIZE)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    prune_document_cache()
+
+
+@contextmanager
+def local_document(field_file):
+    """Yield a local filesystem path holding the contents of `field_file`."""
+    path = _local_storage_path(field_file)
+    if path:
+        yield path
+        return
+
+    cached = _cache_path(field_file.name)
+    if cached.exists():
+        os.utime(cached)  # keep recently used entries at the back of the eviction queue
+    else:
+        logger.info("Fetching %s from storage into the document cache", field_file.name)
+        with field_file.storage.open(field_file.name, 'rb') as remote:
+            _write_atomically(cached, remote)
+    yield str(cached)
+
+
+def cache_uploaded_copy(field_file, uploaded):
+    """Seed the cache with the local copy of a file that was just uploaded to storage."""
+    if not field_file or _local_storage_path(field_file):
+        return
+    try:
+        uploaded.seek(0)
+        _write_atomically(_cache_path(field_file.name), uploaded)
+        uploaded.seek(0)
+    except OSError:
+        logger.warning("Could not cache local copy of %s", field_file.name, exc_info=True)
+
+
+def prune_document_cache(max_bytes=None):
+    """Evict least recently used cache entries until the cache fits in DOCUMENT_CACHE_MAX_BYTES."""
+    if max_bytes is None:
+        max_bytes = settings.DOCUMENT_CACHE_MAX_BYTES
+    if not max_bytes:
+        return
+    entries = []
+    total = 0
+    for entry in os.scandir(_cache_dir()):
+        if entry.is_file() and not entry.name.endswith('.part'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except FileNotFoundError:
+            pass
@@ -1,69 +1,135 @@
-import pdfplumber
-import pytesseract
-from PIL import Image
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
 from io import BytesIO
+from django.db import connections
 from django.utils import timezone
 import json
 from django.conf import settings
-from google import genai
-from google.genai import types
+from django.utils.module_loading import import_string
+import logging
+
+from procure.document_cache import local_document
+from procure.invoice_fields import parse_invoice_fields
+from procure.ocr import OCR_ERRORS
+from procure.prompting import build_receipt_prompt
+from procure.receipt_matching import compare_locally
+from procure.resilience import ServiceUnavailable, breaker
+from procure.storage import store_file
+
+logger = logging.getLogger(__name__)
+
+# PDF engines (procure.pdf_engines), PIL, reportlab and google.genai are
+# imported inside the functions that use them: this module is loaded with the
+# URLconf, and those libraries would otherwise add most of a worker's boot time
+# and memory even for workers that only serve lists. tests.ImportTimeTests
+# keeps them out of the boot path.
 
 def get_gemini_client():
     """Lazy-load Gemini client to avoid initialization errors"""
-    return genai.Client(api_key=settings.GEMINI_API_KEY)
+    return import_string(settings.GEMINI_CLIENT)(api_key=settings.GEMINI_API_KEY)
+
+def ocr_image(image, dpi=None):
+    """
+    Run the configured OCR backend (OCR_BACKEND, see procure.ocr) on a PIL
+    image, cleaned up first unless OCR_PREPROCESS is off. `dpi` is the
+    resolution of rendered pages; photos don't have a meaningful one.
+    """
+    if settings.OCR_PREPROCESS:
+        from procure.image_preprocessing import prepare_for_ocr
 
-def extract_text_from_pdf(fileobj):
-    text = ''
+        image = prepare_for_ocr(image, target_dpi=settings.OCR_TARGET_DPI, dpi=dpi)
+    return import_string(settings.OCR_BACKEND)(image)
+
+class DocumentTooLarge(ValueError):
+    """The document has more pages than DOCUMENT_MAX_PAGES allows."""
+
+
+def iter_document_pages(fileobj, max_pages=None, with_fields=False):
+    """
+    Yield one result per page of a PDF (OCR for pages without a text layer)
+    or a single result for an image. `fileobj` may be a path or a binary file.
+
+    Each result is a dict: {'number', 'text', 'ocr', 'tables', 'heading', 'engine'}.
+    Pages are read by the PDF_TEXT_ENGINE (see procure.pdf_engines), one at a
+    time with their caches released before moving to the next page, and the
+    document is closed as soon as the caller stops iterating, so memory stays
+    bounded on long scanned documents.
+    """
+    if max_pages is None:
+        max_pages = settings.DOCUMENT_MAX_PAGES
+
+    engine = import_string(settings.PDF_TEXT_ENGINE)
     try:
-        with pdfplumber.open(fileobj) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += '\n' + page_text
-                else:
-                    # OCR fallback per page
-                    try:
-                        img = page.to_image(resolution=300)
-                        pil_img = Image.open(BytesIO(img.original))
-                        text += "\n" + pytesseract.image_to_string(pil_img)
-                    except:
-                        pass
-    except:
+        document = engine(fileobj)
+    except Exception:
         # Not a PDF, maybe an image file
+        from PIL import Image
+
         try:
+            if hasattr(fileobj, 'seek'):
+                fileobj.seek(0)
             pil = Image.open(fileobj)
-            text = pytesseract.image_to_string(pil)
-        except:
+            text = ocr_image(pil)
+        except (OSError, Image.UnidentifiedImageError, *OCR_ERRORS):
+            logger.warning("OCR of image document failed", exc_info=True)
             text = ''
-    return text
+        yield {'number': 1, 'text': text, 'ocr': True, 'tables': [], 'heading': None, 'engine': 'ocr'}
+        return
+
+    with document:
+        if max_pages and len(document) > max_pages:
+            raise DocumentTooLarge(
+                f"Document has {len(document)} pages; at most {max_pages} are accepted."
+            )
+        for index in range(len(document)):
+            yield document.page(index, with_fields=with_fields)
+
+
+def extract_document(fileobj, max_pages=None, with_fields=True, max_chars=None):
+    """
+    Text (and structured invoice fields) of a PDF or an image, in one pass.
+
+    Returns {'text': str, 'fields': dict or None}. With `with_fields` the same
+    pass also collects pdfplumber tables and first-page heading words and
+    turns them into structured fields (see procure.invoice_fields).
+    `max_chars` stops reading pages once that much text has been collected.
+    """
+    parts = []
+    collected = 0
+    tables = []
+    heading = None
+    for page in iter_document_pages(fileobj, max_pages=max_pages, with_fields=with_fields):
+        if page['text']:
+            parts.append(page['text'])
+            collected += len(page['text']) + 1
+        tables.extend(page['tables'])
+        heading = heading or page['heading']
+        if max_chars and collected >= max_chars:
+            break
+
+    text = '\n'.join(parts)
+    if max_chars:
+        text = text[:max_chars]
+    fields = parse_invoice_fields(text, tables=tables, heading=heading) if with_fields else None
+    return {'text': text, 'fields': fields}
+
 
-from procure.models import PurchaseOrder, ReceiptValidation
+def extract_text_from_pdf(fileobj, max_pages=None, max_chars=None):
+    """Text only (no table/field extraction) from a PDF or an image."""
+    return extract_document(fileobj, max_pages=max_pages, with_fields=False, max_chars=max_chars)['text']
+
+from procure.models import PurchaseOrder, PurchaseRequest, ReceiptValidation
 
 
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 from django.core.files.base import ContentFile
 
-def generate_po_for_request(pr, generated_by=None):
-    vendor = pr.vendor or 'Unknown vendor'
-    extracted = {}
-    if pr.proforma:
-        try:
-            txt = extract_text_from_pdf(pr.proforma.path)
-            extracted['raw_text'] = txt[:4000]
-        except Exception:
-            extracted['raw_text'] = ''
-    
-    content = {
-        'vendor': vendor,
-        'items': [
-            {'name': it.name, 'qty': it.qty, 'unit_price': str(it.unit_price)} for it in pr.items.all()
-        ],
-        'total': str(pr.amount),
-        'extracted': extracted,
-    }
+def render_po_pdf(pr, vendor):
+    """The purchase order PDF for a request, as bytes."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
 
-    # Generate PDF
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=letter)
     width, height = letter
@@ -105,21 +171,74 @@ def generate_po_for_request(pr, generated_by=None):
 
     pdf_content = buffer.getvalue()
     buffer.close()
+    return pdf_content
+
+
+# Proforma text kept on the PO; only the vendor is read from it, so the
+# pages after this much text aren't extracted at all
+PROFORMA_TEXT_CHARS = 4000
+
+
+def generate_po_for_request(pr, generated_by=None):
+    extracted = {}
+    if pr.proforma:
+        try:
+            with local_document(pr.proforma) as proforma_path:
+                document = extract_document(proforma_path, max_chars=PROFORMA_TEXT_CHARS)
+            extracted['raw_text'] = document['text']
+            extracted['fields'] = document['fields']
+        except Exception:
+            logger.exception("Proforma text extraction failed for PR#%s", pr.id)
+            extracted['raw_text'] = ''
+            extracted['fields'] = None
+    vendor = pr.vendor or (extracted.get('fields') or {}).get('vendor') or 'Unknown vendor'
+    
+    content = {
+        'vendor': vendor,
+        'items': [
+            {'name': it.name, 'qty': it.qty, 'unit_price': str(it.unit_price)} for it in pr.items.all()
+        ],
+        'total': str(pr.amount),
+        'extracted': extracted,
+    }
 
     # Create PO object
-    po = PurchaseOrder.objects.create(
+    po = PurchaseOrder(
         request=pr, 
         generated_by=generated_by, 
         content=content
     )
-    
-    # Save PDF file (this uploads to Cloudinary)
-    filename = f"PO_{pr.id}_{timezone.now().strftime('%Y%m%d%H%M%S')}.pdf"
-    po.file.save(filename, ContentFile(pdf_content))
+    store_po_file(po, render_po_pdf(pr, vendor))
+    po.save()
     
     return po
 
-async def get_gemini_response(
+
+def store_po_file(po, pdf_content):
+    """
+    Upload the PO PDF (Cloudinary) and set its resolved URL, for the caller
+    to save. When storage is unavailable the PO is marked pending retry.
+    """
+    filename = f"PO_{po.request_id}_{timezone.now().strftime('%Y%m%d%H%M%S')}.pdf"
+    try:
+        po.file = store_file(po.file, filename, ContentFile(pdf_content))
+    except ServiceUnavailable as exc:
+        logger.warning("PO file for PR#%s not stored, pending retry: %s", po.request_id, exc)
+        po.pending_retry = True
+        return False
+    po.file_url = po.file.url
+    po.pending_retry = False
+    return True
+
+
+def retry_po_file(po):
+    """Store the PDF of a PO left pending retry; True once it is stored."""
+    if store_po_file(po, render_po_pdf(po.request, po.content.get('vendor'))):
+        po.save(update_fields=['file', 'file_url', 'pending_retry'])
+        return True
+    return False
+
+async def stream_gemini_response(
     user_message: str,
     file_content: str = None,
     file_name: str = None,
@@ -127,111 +246,115 @@ async def get_gemini_response(
 ) -> "AsyncGenerator[str, None]":
     """
     Streams response from Gemini without external search tools.
+    Errors are raised; get_gemini_response reports them in the text instead.
     """
-    try:
-        # Thinking config only, no search
-        config = types.GenerateContentConfig(
-            thinking_config=types.ThinkingConfig(include_thoughts=include_thoughts)
-            if include_thoughts
-            else None,
-        )
+    from google.genai import types
 
-        contents = []
-        if file_content and file_name:
-            file_part = types.Part.from_text(
-                text=f"File: {file_name}\n\n{file_content}"
-            )
-            contents.append(file_part)
-            contents.append(f"Based on the file above, {user_message}")
-        else:
-            contents.append(user_message)
-
-        # Hard-coded model
-        client = get_gemini_client()
-        response_stream = client.models.generate_content_stream(
-            model="gemini-2.5-flash",
-            contents=contents,
-            config=config,
+    # Thinking config only, no search
+    config = types.GenerateContentConfig(
+        thinking_config=types.ThinkingConfig(include_thoughts=include_thoughts)
+        if include_thoughts
+        else None,
+    )
+
+    contents = []
+    if file_content and file_name:
+        file_part = types.Part.from_text(
+            text=f"File: {file_name}\n\n{file_content}"
         )
+        contents.append(file_part)
+        contents.append(f"Based on the file above, {user_message}")
+    else:
+        contents.append(user_message)
 
-        for chunk in response_stream:
-            for part in chunk.candidates[0].content.parts:
-                if getattr(part, "thought", False):
-                    continue
-                if part.text:
-                    yield part.text
+    # Hard-coded model; the aio client awaits the HTTP stream instead of blocking the event loop
+    client = get_gemini_client()
+    response_stream = await client.aio.models.generate_content_stream(
+        model="gemini-2.5-flash",
+        contents=contents,
+        config=config,
+    )
 
+    async for chunk in response_stream:
+        for part in chunk.candidates[0].content.parts:
+            if getattr(part, "thought", False):
+                continue
+            if part.text:
+                yield part.text
+
+
+async def get_gemini_response(
+    user_message: str,
+    file_content: str = None,
+    file_name: str = None,
+    include_thoughts: bool = True,  # thinking enabled
+) -> "AsyncGenerator[str, None]":
+    """
+    Streams response from Gemini without external search tools.
+    """
+    try:
+        async for text in stream_gemini_response(user_message, file_content, file_name, include_thoughts):
+            yield text
     except Exception as e:
         import traceback
         yield f"\n[ERROR: {e}]\n{traceback.format_exc()}\n"
 
-async def compare_receipt_with_gemini(po_data, receipt_text):
+
+async def _gemini_text(prompt):
+    return ''.join([chunk async for chunk in stream_gemini_response(prompt, include_thoughts=False)])
+
+async def compare_receipt_with_gemini(po_data, receipt_text, receipt_fields=None):
     """
     Compares a PO with a receipt using Gemini.
     Uses detailed instructions, thinking enabled, no external search.
+    `receipt_fields` are the structured fields from extract_document, if available.
+    The prompt is kept within GEMINI_PROMPT_TOKEN_BUDGET (see procure.prompting);
+    its size is logged and returned under 'prompt'.
+    The call goes through the 'gemini' circuit breaker: failures, timeouts
+    and an open circuit raise procure.resilience.ServiceUnavailable.
     """
-    prompt = f"""
-You are a receipt validation assistant. Compare the following Purchase Order (PO) details with the text extracted from a receipt.
-
-Purchase Order Details:
-Vendor: {po_data['vendor']}
-Total Amount: {po_data['total']}
-Items:
-{json.dumps(po_data['items'], indent=2)}
-
-Receipt Text:
-{receipt_text}
-
-Task:
-1. Check if the vendor name matches (fuzzy match allowed).
-2. Check if the total amount matches.
-3. Check if the items match (names, quantities, prices).
-
-Return a JSON object with the following structure:
-{{
-    "is_valid": boolean,
-    "discrepancies": [list of strings describing any mismatches]
-}}
-If everything matches, "is_valid" should be true and "discrepancies" should be empty.
-
-IMPORTANT: Return ONLY the JSON object, no other text.
-"""
-
-    full_response = ""
+    prompt, prompt_size = build_receipt_prompt(
+        po_data, receipt_text, receipt_fields, budget=settings.GEMINI_PROMPT_TOKEN_BUDGET
+    )
+    logger.info("Receipt comparison prompt: %s", prompt_size)
+
     # Include receipt_text directly in the prompt, don't pass as file_content
-    async for chunk in get_gemini_response(prompt, include_thoughts=False):
-        full_response += chunk
+    full_response = await breaker('gemini').acall(_gemini_text, prompt)
 
     try:
         cleaned_response = full_response.replace('```json', '').replace('```', '').strip()
         result = json.loads(cleaned_response)
-        return result
     except Exception as e:
-        return {
+        result = {
             "is_valid": False,
             "discrepancies": [f"Failed to parse JSON: {str(e)}", f"Raw response: {full_response}"]
         }
+    result['prompt'] = prompt_size
+    return result
 
 
-def validate_receipt_against_po(pr):
+def validate_receipt_against_po(pr, deadline=None):
     """
     Comprehensive validation of receipt against Purchase Order using Gemini.
+    `deadline` as for validate_receipt_against_po_with_text.
     """
     po = getattr(pr, 'po_obj', None)
     if not po:
         return {'ok': False, 'reason': 'No PO available'}
     
-    # Extract text from receipt
-    receipt_text = ''
+    # Extract text and fields from receipt
     try:
-        # Open the file from storage (works with both local and cloud storage)
-        with pr.receipt.open('rb') as receipt_file:
-            receipt_text = extract_text_from_pdf(receipt_file)
+        # Local path for the stored file (works with both local and cloud storage)
+        with local_document(pr.receipt) as receipt_path:
+            document = extract_document(receipt_path)
     except Exception as e:
         return {'ok': False, 'reason': f'Failed to extract text from receipt: {str(e)}'}
     
-    # Construct PO data for AI
-    po_data = {
+    return validate_receipt_against_po_with_text(pr, document['text'], receipt_fields=document['fields'], deadline=deadline)
+
+def receipt_po_data(pr):
+    """PO details the receipt is compared against."""
+    return {
         'vendor': pr.vendor or 'Unknown',
         'total': str(pr.amount),
         'items': [
@@ -244,11 +367,15 @@ def validate_receipt_against_po(pr):
             for item in pr.items.all()
         ]
     }
-    
-    
-    from asgiref.sync import async_to_sync
-    ai_result = async_to_sync(compare_receipt_with_gemini)(po_data, receipt_text)
-    
+
+
+def save_receipt_validation(pr, ai_result, receipt_fields=None, provisional=False, pending_retry=False):
+    """
+    Store a comparison on the request's ReceiptValidation and return the API
+    result. `provisional` marks the local matcher's verdict standing in for
+    the model's; `pending_retry` that the model still has to be asked
+    (`manage.py retry_pending`).
+    """
     is_valid = ai_result.get('is_valid', False)
     discrepancies = ai_result.get('discrepancies', [])
     
@@ -257,66 +384,161 @@ def validate_receipt_against_po(pr):
         'ok': is_valid,
         'discrepancies': discrepancies
     }
+    if provisional:
+        result['provisional'] = True
+    if pending_retry:
+        result['pending_retry'] = True
     
-    # Save validation results using update_or_create to avoid IntegrityError
+    # Save validation results
     ReceiptValidation.objects.update_or_create(
         request=pr,
         defaults={
             'validated_at': timezone.now(),
             'validation_result': result,
             'discrepancies': discrepancies,
-            'is_valid': is_valid
+            'is_valid': is_valid,
+            'extracted_fields': receipt_fields,
+            'prompt_size': ai_result.get('prompt'),
+            'provisional': provisional,
+            'pending_retry': pending_retry,
         }
     )
     
     return result
 
-def validate_receipt_against_po_with_text(pr, receipt_text):
+
+def save_provisional_validation(pr, local_result, receipt_fields=None):
+    """
+    Save the local verdict while the model's is still on its way. The row
+    stays pending_retry until that arrives, so `retry_pending` asks the model
+    again if this process dies first; the API result isn't a pending one.
+    """
+    result = save_receipt_validation(pr, local_result, receipt_fields, provisional=True, pending_retry=True)
+    del result['pending_retry']
+    return result
+
+
+def finish_validation(pr, outcome, local_result, receipt_fields=None):
+    """
+    Save the model's verdict, or when the model was unavailable (`outcome` is
+    a ServiceUnavailable) the local one, provisional and pending retry.
+    """
+    if isinstance(outcome, ServiceUnavailable):
+        logger.warning("Receipt validation for PR#%s deferred: %s", pr.id, outcome)
+        return save_receipt_validation(pr, local_result, receipt_fields, provisional=True, pending_retry=True)
+    return save_receipt_validation(pr, outcome, receipt_fields)
+
+
+def _finish_late_validation(pr, receipt_sha256, outcome, local_result, receipt_fields):
+    """The model answered after the provisional verdict was returned: replace it."""
+    if not PurchaseRequest.objects.filter(pk=pr.pk, receipt_sha256=receipt_sha256).exists():
+        return  # another receipt has been submitted since
+    finish_validation(pr, outcome, local_result, receipt_fields)
+
+
+def _model_outcome(po_data, receipt_text, receipt_fields):
+    from asgiref.sync import async_to_sync
+
+    try:
+        return async_to_sync(compare_receipt_with_gemini)(po_data, receipt_text, receipt_fields)
+    except ServiceUnavailable as exc:
+        return exc
+
+
+# Model comparisons racing the RECEIPT_VALIDATION_DEADLINE; those that lose keep
+# their thread until they answer (at most the 'gemini' breaker's timeout)
+_validation_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='procure-validation')
+
+
+def validate_receipt_against_po_with_text(pr, receipt_text, receipt_fields=None, deadline=None):
     """
-    Validation using pre-extracted receipt text (more efficient for Celery tasks).
-    This is called from the Celery task with the text already extracted.
+    Validation using pre-extracted receipt text and structured fields
+    (see extract_document), so the receipt is only parsed once.
+
+    The deterministic comparison (procure.receipt_matching) runs next to the
+    model. If the model hasn't answered within `deadline` seconds
+    (RECEIPT_VALIDATION_DEADLINE by default, 0 to wait for it), the local
+    verdict is saved and returned marked provisional, and the model's verdict
+    replaces it when it arrives.
     """
     po = getattr(pr, 'po_obj', None)
     if not po:
         return {'ok': False, 'reason': 'No PO available'}
-    
-    # Construct PO data for AI
-    po_data = {
-        'vendor': pr.vendor or 'Unknown',
-        'total': str(pr.amount),
-        'items': [
-            {
-                'name': item.name, 
-                'qty': item.qty, 
-                'unit_price': str(item.unit_price), 
-                'total': str(item.total_price)
-            } 
-            for item in pr.items.all()
-        ]
-    }
-    
-    # Perform AI comparison
-    from asgiref.sync import async_to_sync
-    ai_result = async_to_sync(compare_receipt_with_gemini)(po_data, receipt_text)
-    
-    is_valid = ai_result.get('is_valid', False)
-    discrepancies = ai_result.get('discrepancies', [])
-    
-    # Prepare result dict
-    result = {
-        'ok': is_valid,
-        'discrepancies': discrepancies
-    }
-    
-    # Save validation results
-    ReceiptValidation.objects.update_or_create(
-        request=pr,
-        defaults={
-            'validated_at': timezone.now(),
-            'validation_result': result,
-            'discrepancies': discrepancies,
-            'is_valid': is_valid
-        }
-    )
-    
+
+    po_data = receipt_po_data(pr)
+    local_result = compare_locally(po_data, receipt_text, receipt_fields)
+    if deadline is None:
+        deadline = settings.RECEIPT_VALIDATION_DEADLINE
+    if not deadline:
+        return finish_validation(pr, _model_outcome(po_data, receipt_text, receipt_fields), local_result, receipt_fields)
+
+    # Whichever of the model and the deadline comes second hands over to the other
+    race = {'state': 'racing'}
+    lock = threading.Lock()
+    receipt_sha256 = pr.receipt_sha256
+
+    def ask_model():
+        outcome = _model_outcome(po_data, receipt_text, receipt_fields)
+        with lock:
+            if race['state'] == 'racing':
+                race['state'] = 'answered'
+                return outcome
+        try:
+            _finish_late_validation(pr, receipt_sha256, outcome, local_result, receipt_fields)
+        except Exception:
+            logger.exception("Saving the late receipt validation for PR#%s failed", pr.id)
+        finally:
+            connections.close_all()
+
+    future = _validation_executor.submit(ask_model)
+    try:
+        outcome = future.result(timeout=deadline)
+    except FutureTimeout:
+        with lock:
+            if race['state'] == 'racing':
+                race['state'] = 'provisional'
+                return save_provisional_validation(pr, local_result, receipt_fields)
+        outcome = future.result()
+    return finish_validation(pr, outcome, local_result, receipt_fields)
+
+
+# Late model comparisons of the async views, referenced until they finish
+_late_validations = set()
+
+
+async def _amodel_outcome(po_data, receipt_text, receipt_fields):
+    try:
+        return await compare_receipt_with_gemini(po_data, receipt_text, receipt_fields)
+    except ServiceUnavailable as exc:
+        return exc
+
+
+async def avalidate_receipt_against_po_with_text(pr, receipt_text, receipt_fields=None):
+    """
+    Async variant for ASGI views: the Gemini call is awaited on the event loop,
+    only the short database steps run in the sync thread. Same deadline and
+    provisional verdict as the sync version; the model call keeps running on
+    the loop after the response when it misses the deadline.
+    """
+    from asgiref.sync import sync_to_async
+
+    if not await PurchaseOrder.objects.filter(request=pr).aexists():
+        return {'ok': False, 'reason': 'No PO available'}
+
+    po_data = await sync_to_async(receipt_po_data)(pr)
+    local_result = compare_locally(po_data, receipt_text, receipt_fields)
+    model = asyncio.ensure_future(_amodel_outcome(po_data, receipt_text, receipt_fields))
+    done, _ = await asyncio.wait({model}, timeout=settings.RECEIPT_VALIDATION_DEADLINE or None)
+    if done:
+        return await sync_to_async(finish_validation)(pr, model.result(), local_result, receipt_fields)
+
+    result = await sync_to_async(save_provisional_validation)(pr, local_result, receipt_fields)
+
+    async def finish_late(receipt_sha256=pr.receipt_sha256):
+        outcome = await model
+        await sync_to_async(_finish_late_validation)(pr, receipt_sha256, outcome, local_result, receipt_fields)
+
+    task = asyncio.ensure_future(finish_late())
+    _late_validations.add(task)
+    task.add_done_callback(_late_validations.discard)
     return result
@@ -0,0 +1,124 @@
+"""
+Streaming exports of purchase requests (CSV / NDJSON).
+
+Rows are produced from a server-side cursor (`QuerySet.iterator(chunk_size=...)`)
+and encoded one line at a time, so memory stays flat regardless of how many
+requests are exported (behind pgbouncer, POSTGRES_PGBOUNCER=1 turns server-side
+cursors off and the driver fetches the whole result first). Shared by the
+`export` API action and the `export_requests` management command.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from procure.models import PurchaseRequest, Approval
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 500
+
+CSV_COLUMNS = [
+    'request_id', 'title', 'vendor', 'status', 'amount', 'created_by', 'created_at',
+    'l1_approver', 'l1_approved', 'l1_approved_at', 'l1_comment',
+    'l2_approver', 'l2_approved', 'l2_approved_at', 'l2_comment',
+    'item_name', 'item_qty', 'item_unit_price', 'item_total',
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_queryset(status=PurchaseRequest.STATUS_APPROVED, queryset=None):
+    """
+    Requests to export (of `queryset`, e.g. a role's inbox; all of them by
+    default), with items and approvals prefetched per chunk.
+    """
+    if queryset is None:
+        queryset = PurchaseRequest.objects.all()
+    if status:
+        queryset = queryset.filter(status=status)
+    return (
+        queryset
+        .select_related('created_by')
+        .prefetch_related(
+            'items',
+            Prefetch(
+                'approvals',
+                queryset=Approval.objects.select_related('approver').order_by('level', 'created_at'),
+            ),
+        )
+        .order_by('pk')
+    )
+
+
+def _approval_info(pr):
+    """Latest decision per approval level, flattened to l1_*/l2_* keys."""
+    info = {}
+    for approval in pr.approvals.all():
+        prefix = f'l{approval.level}'
+        info[f'{prefix}_approver'] = approval.approver.username
+        info[f'{prefix}_approved'] = approval.approved
+        info[f'{prefix}_approved_at'] = approval.created_at.isoformat()
+        info[f'{prefix}_comment'] = approval.comment
+    return info
+
+
+def iter_export_records(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one plain dict per purchase request."""
+    for pr in queryset.iterator(chunk_size=chunk_size):
+        record = {
+            'request_id': pr.id,
+            'title': pr.title,
+            'vendor': pr.vendor,
+            'status': pr.status,
+            'amount': str(pr.amount),
+            'created_by': pr.created_by.username,
+            'created_at': pr.created_at.isoformat(),
+            'items': [
+                {
+                    'name': item.name,
+                    'qty': item.qty,
+                    'unit_price': str(item.unit_price),
+                    'total': str(item.total_price),
+                }
+                for item in pr.items.all()
+            ],
+        }
+        record.update(_approval_info(pr))
+        yield record
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield CSV lines, one per request item (requests without items get one row)."""
+    writer = csv.DictWriter(_Echo(), fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    yield writer.writeheader()
+    for record in iter_export_records(queryset, chunk_size=chunk_size):
+        items = record.pop('items') or [{}]
+        for item in items:
+            row = dict(record)
+            row['item_name'] = item.get('name', '')
+            row['item_qty'] = item.get('qty', '')
+            row['item_unit_price'] = item.get('unit_price', '')
+            row['item_total'] = item.get('total', '')
+            yield writer.writerow(row)
+
+
+def iter_ndjson(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one JSON document per line, items nested."""
+    for record in iter_export_records(queryset, chunk_size=chunk_size):
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def iter_export(export_format, queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    if export_format == 'ndjson':
+        return iter_ndjson(queryset, chunk_size=chunk_size)
+    return iter_csv(queryset, chunk_size=chunk_size)
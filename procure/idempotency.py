@@ -0,0 +1,179 @@
+"""
+Idempotency-Key support for the calls clients retry on timeouts: create,
+approve and submit-receipt.
+
+Without it each retry of `create` makes another purchase request, and each
+retry of `submit-receipt` runs OCR and the Gemini comparison again. A call
+that sends an Idempotency-Key header (any string up to 255 characters,
+unique per call, e.g. a UUID):
+
+- claims the key for its user by inserting an IdempotencyKey row; the
+  unique constraint makes that the lock for calls running in parallel;
+- stores its response in the row when done, so retries get it back at
+  once, with an Idempotent-Replayed header, for IDEMPOTENCY_KEY_TTL seconds;
+- frees the key again when it fails (an exception or a 5xx), so a retry
+  does the work.
+
+A retry arriving while the first call still runs gets 409 with Retry-After.
+If the first call's process died, the key is taken over once
+IDEMPOTENCY_LOCK_TIMEOUT has passed. Reusing a key for a different call
+(another method, path or body; uploads are compared by SHA-256) gets 422.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse, QueryDict
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from procure.models import IdempotencyKey
+from procure.uploads import uploaded_file_sha256
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Response headers replayed along with the body
+STORED_HEADERS = ('ETag', 'Location')
+
+
+class InvalidKey(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'
+    default_code = 'invalid_idempotency_key'
+
+
+class KeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = f'A call with this {HEADER} is still in progress; retry shortly.'
+    default_code = 'idempotency_key_in_use'
+    # DRF's exception handler turns it into Retry-After
+    wait = 1
+
+
+class KeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = f'This {HEADER} was already used for a different call.'
+    default_code = 'idempotency_key_reused'
+
+
+def _json_default(value):
+    if isinstance(value, UploadedFile):
+        return uploaded_file_sha256(value)
+    return str(value)
+
+
+def fingerprint(method, path, data):
+    """SHA-256 identifying a call: its method, path and form or JSON data, uploads by content."""
+    if isinstance(data, QueryDict):
+        data = {key: data.getlist(key) for key in data}
+    canonical = json.dumps([method, path, data], sort_keys=True, default=_json_default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def claim(user, key, call_fingerprint):
+    """
+    (record, True) when the call should run under `key`, (record, False)
+    when its stored response should be replayed. Raises InvalidKey,
+    KeyInUse or KeyReused.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise InvalidKey()
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+    keys = IdempotencyKey.objects.filter(user=user, key=key)
+    # An expired key is free again
+    keys.filter(created_at__lt=now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)).delete()
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint=call_fingerprint, locked_until=locked_until,
+            )
+        return record, True
+    except IntegrityError:
+        record = keys.first()
+    if record is None:
+        # Freed by its call failing in the meantime
+        return claim(user, key, call_fingerprint)
+
+    if record.fingerprint != call_fingerprint:
+        raise KeyReused()
+    if record.status_code is not None:
+        return record, False
+    # Still running, unless the process running it died: then take over
+    if keys.filter(status_code__isnull=True, locked_until__lt=now).update(locked_until=locked_until):
+        return record, True
+    raise KeyInUse()
+
+
+def release(record):
+    """Free the key of a call that failed, for a retry to run it again."""
+    record.delete()
+
+
+def complete(record, response):
+    """Store `response` (DRF Response or JsonResponse) for replay; returns it."""
+    if response.status_code >= 500:
+        release(record)
+        return response
+    body = response.data if hasattr(response, 'data') else json.loads(response.content)
+    record.status_code = response.status_code
+    record.response_body = body
+    record.response_headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+    record.save(update_fields=['status_code', 'response_body', 'response_headers'])
+    return response
+
+
+def replay(record):
+    response = JsonResponse(record.response_body, status=record.status_code, safe=False)
+    for name, value in record.response_headers.items():
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Idempotency-Key support for a DRF view method (apply below @action)."""
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+
+        record, run = claim(request.user, key, fingerprint(request.method, request.path, request.data))
+        if not run:
+            return replay(record)
+        try:
+            response = view(self, request, *args, **kwargs)
+        except BaseException:
+            release(record)
+            raise
+        return complete(record, response)
+
+    return wrapper
+
+
+async def arun(user, key, call_fingerprint, handler):
+    """await handler() under Idempotency-Key `key`, for the async views."""
+    try:
+        record, run = await sync_to_async(claim)(user, key, call_fingerprint)
+    except APIException as exc:
+        response = JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = str(exc.wait)
+        return response
+    if not run:
+        return replay(record)
+    try:
+        response = await handler()
+    except BaseException:
+        await sync_to_async(release)(record)
+        raise
+    return await sync_to_async(complete)(record, response)
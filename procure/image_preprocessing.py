@@ -0,0 +1,224 @@
+"""
+Image clean-up before OCR (see document_processing.ocr_image).
+
+Phone photos of receipts arrive as multi-megapixel colour images, often
+rotated through EXIF, slightly skewed, unevenly lit and surrounded by table
+or background. Tesseract's time grows with the pixel count and its accuracy
+drops on all of the above, so `prepare_for_ocr` runs, in order:
+
+    orient      apply the EXIF orientation tag
+    grayscale
+    isolate     crop a photo to the page in it (not for PDF renders)
+    downscale   to OCR_TARGET_DPI (PDF renders pass their DPI; photos are
+                assumed to show at most a letter-size page); large JPEGs
+                are decoded at reduced size to begin with
+    binarize    local-mean threshold, which copes with shadows and gradients
+    deskew      projection-profile search within +/- MAX_SKEW_DEGREES
+    crop        to the ink, plus a margin
+
+Only PIL is used.
+"""
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageOps
+
+# Long side of a letter-size page, in inches
+PAGE_LONG_SIDE_INCHES = 11
+MAX_SKEW_DEGREES = 5
+SKEW_STEP_DEGREES = 0.5
+# Width of the copies the page outline and the skew are measured on
+PAGE_SAMPLE_WIDTH = 160
+SKEW_SAMPLE_WIDTH = 800
+# Share of the image border that must be background for a photo to be cropped to its page
+BACKGROUND_BORDER_SHARE = 0.5
+# Background grown into the page (sample pixels, odd) to cover the shaded page edge
+PAGE_EDGE_PIXELS = 5
+# A pixel is ink when it is this much darker than its neighbourhood
+INK_CONTRAST = 12
+INK_GAIN = 2
+CROP_MARGIN = 20
+
+
+def orient(image):
+    return ImageOps.exif_transpose(image)
+
+
+def grayscale(image):
+    return image if image.mode == 'L' else image.convert('L')
+
+
+def _scale(image, target_dpi, dpi=None):
+    if dpi:
+        return target_dpi / dpi
+    return target_dpi * PAGE_LONG_SIDE_INCHES / max(image.size)
+
+
+def downscale(image, target_dpi, dpi=None):
+    scale = _scale(image, target_dpi, dpi)
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    # reducing_gap: box-reduce first, then a bilinear pass over the last factor of 2
+    return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+
+def _otsu_threshold(image):
+    histogram = image.histogram()
+    total = sum(histogram)
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+    best, best_variance = 0, -1
+    below = weighted_below = 0
+    for value, count in enumerate(histogram):
+        below += count
+        weighted_below += value * count
+        above = total - below
+        if not below or not above:
+            continue
+        mean_below, mean_above = weighted_below / below, (weighted_total - weighted_below) / above
+        variance = below * above * (mean_below - mean_above) ** 2
+        if variance > best_variance:
+            best, best_variance = value, variance
+    return best
+
+
+def _paper_tone(sample, background):
+    """`sample` with the background replaced by the brightness of the nearby paper."""
+    page = ImageOps.invert(background)
+    radius = max(2, sample.width // 8)
+    # Normalised box blur: average of the page pixels only, around each pixel
+    totals = ImageChops.multiply(sample, page).filter(ImageFilter.BoxBlur(radius)).getdata()
+    weights = page.filter(ImageFilter.BoxBlur(radius)).getdata()
+    paper = _otsu_threshold(sample)
+    tone = Image.new('L', sample.size)
+    tone.putdata([
+        min(255, total * 255 // weight) if weight else paper
+        for total, weight in zip(totals, weights)
+    ])
+    return Image.composite(tone, sample, background)
+
+
+def find_page(image):
+    """
+    The photographed page in `image`, when it lies on a darker background:
+    (box, tone, mask), where `box` is the page's bounding box and `mask`
+    marks the background left inside it (the corners of a skewed page),
+    which `tone` gives the brightness of the paper next to it. None for
+    images that are all page (scans, renders).
+    """
+    scale = min(1, PAGE_SAMPLE_WIDTH / image.width)
+    sample = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BOX)
+    threshold = _otsu_threshold(sample)
+    dark = sample.point(lambda v: 0 if v <= threshold else 255)
+
+    width, height = dark.size
+    border = [(x, y) for x in range(width) for y in (0, height - 1)]
+    border += [(x, y) for y in range(height) for x in (0, width - 1)]
+    if sum(1 for xy in border if dark.getpixel(xy) == 0) < len(border) * BACKGROUND_BORDER_SHARE:
+        return None
+    # Background is the dark area reaching the image border; dark text inside the page is not
+    for xy in border:
+        if dark.getpixel(xy) == 0:
+            ImageDraw.floodfill(dark, xy, 128)
+    background = dark.point(lambda v: 255 if v == 128 else 0).filter(ImageFilter.MaxFilter(PAGE_EDGE_PIXELS))
+    box = ImageOps.invert(background).getbbox()
+    if not box:
+        return None
+    tone = _paper_tone(sample, background).crop(box)
+    return tuple(round(edge / scale) for edge in box), tone, background.crop(box)
+
+
+def fill_background(image, tone, mask):
+    """Paint the background marked by `mask` (any size) with `tone`, so neither it nor the page edge reads as ink."""
+    # Bilinear upscaling of the mask blends the seam
+    return Image.composite(tone.resize(image.size, Image.BILINEAR), image, mask.resize(image.size, Image.BILINEAR))
+
+
+def isolate_page(image):
+    """Crop a photographed page out of a darker background (see find_page)."""
+    page = find_page(image)
+    if page is None:
+        return image
+    box, tone, mask = page
+    return fill_background(image.crop(box), tone, mask)
+
+
+def _ink(image, radius):
+    """White ink on black: pixels darker than their local mean by more than INK_CONTRAST."""
+    background = image.filter(ImageFilter.BoxBlur(radius))
+    return ImageChops.subtract(background, image).point(lambda v: 255 if v > INK_CONTRAST else 0)
+
+
+def _profile_score(ink, angle):
+    """Text lines at the right angle give sharp peaks in the per-row ink totals."""
+    rows = ink.rotate(angle, resample=Image.NEAREST).resize((1, ink.height), Image.BOX)
+    values = list(rows.getdata())
+    return sum((a - b) ** 2 for a, b in zip(values, values[1:]))
+
+
+def skew_angle(image):
+    """Rotation (degrees, counter-clockwise) that levels the text lines."""
+    scale = min(1, SKEW_SAMPLE_WIDTH / image.width)
+    sample = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BOX)
+    ink = _ink(sample, radius=max(2, sample.width // 40))
+
+    def best(angles):
+        return max(angles, key=lambda angle: (_profile_score(ink, angle), -abs(angle)))
+
+    # Whole degrees first, then the half degrees either side of the best one
+    angle = best(range(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 1))
+    return best([angle - SKEW_STEP_DEGREES, angle, angle + SKEW_STEP_DEGREES])
+
+
+def rotate(image, angle, resample=Image.BILINEAR):
+    return image.rotate(angle, resample=resample, expand=True, fillcolor=255) if angle else image
+
+
+def binarize(image):
+    """
+    Paper to white and ink to dark, whatever the lighting: each pixel's
+    darkness against its local mean, beyond INK_CONTRAST, times INK_GAIN.
+    Stroke edges keep their grey levels, which Tesseract (it thresholds
+    again itself) reads better than a hard 0/255 cut.
+    """
+    # Neighbourhood of about a text line's height at 300 DPI
+    background = image.filter(ImageFilter.BoxBlur(max(8, min(image.size) // 60)))
+    return ImageChops.subtract(background, image).point(
+        lambda v: max(0, 255 - max(0, v - INK_CONTRAST) * INK_GAIN)
+    )
+
+
+def crop(image):
+    box = ImageOps.invert(image).getbbox()
+    if not box:
+        return image
+    left, top, right, bottom = box
+    return image.crop((
+        max(0, left - CROP_MARGIN), max(0, top - CROP_MARGIN),
+        min(image.width, right + CROP_MARGIN), min(image.height, bottom + CROP_MARGIN),
+    ))
+
+
+def deskew(image):
+    return rotate(image, skew_angle(image))
+
+
+def prepare_for_ocr(image, target_dpi=300, dpi=None):
+    """The OCR-ready (black on white, upright, cropped) version of `image`; `dpi` if known."""
+    scale = _scale(image, target_dpi, dpi)
+    long_side = max(image.size)
+    if scale < 1:
+        # JPEG only: decode straight to a smaller grayscale image
+        image.draft('L', (round(image.width * scale), round(image.height * scale)))
+    image = grayscale(orient(image))
+    page = None
+    if dpi:
+        dpi = dpi * max(image.size) / long_side
+    else:
+        page = find_page(image)
+    if page:
+        # What is left once the background is gone is the page
+        box, tone, mask = page
+        image = fill_background(downscale(image.crop(box), target_dpi), tone, mask)
+    else:
+        image = downscale(image, target_dpi, dpi=dpi)
+    # Binarized first: the corners rotation fills in are then plain paper.
+    # Cropping before deskewing too leaves far fewer pixels to rotate.
+    return crop(deskew(crop(binarize(image))))
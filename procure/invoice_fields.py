@@ -0,0 +1,232 @@
+"""
+Structured field extraction for invoices, proformas and receipts.
+
+`parse_invoice_fields` turns what the PDF/OCR pass collected (text lines,
+pdfplumber tables and the largest heading words of the first page) into plain
+JSON-serialisable fields:
+
+    {
+        "vendor": "ACME Ltd",
+        "invoice_number": "INV-0042",
+        "dates": ["2025-11-23"],
+        "currency": "USD",
+        "subtotal": "100.00",
+        "tax": "18.00",
+        "total": "118.00",
+        "line_items": [{"name": "Paper", "qty": 2, "unit_price": "25.00", "total": "50.00"}],
+    }
+
+Amounts are normalised decimal strings, like the rest of the API. Fields that
+cannot be found are None (or empty lists).
+"""
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+AMOUNT_RE = re.compile(r'(?<![\w.])[-(]?[$€£]?\s?(\d{1,3}(?:[,\s]\d{3})+|\d+)(?:\.(\d{1,2}))?\)?(?![\w.])')
+MONEY_RE = re.compile(r'[$€£]?\s?(\d{1,3}(?:,\d{3})+|\d+)\.(\d{2})\b')
+
+VENDOR_LABEL_RE = re.compile(r'^\s*(?:vendor|supplier|seller|from|sold by|billed by)\s*[:\-]\s*(.+)$', re.I)
+INVOICE_NUMBER_RE = re.compile(
+    r'\b(?:invoice|receipt|proforma|inv|bill)\s*(?:no\.?|number|num|#)\s*[:#]?\s*([A-Z0-9][A-Z0-9\-/]*)', re.I
+)
+TOTAL_RE = re.compile(r'\b(?:grand\s+total|amount\s+due|total\s+due|balance\s+due|total\s+amount|total)\b', re.I)
+SUBTOTAL_RE = re.compile(r'\bsub[\s-]?total\b', re.I)
+TAX_RE = re.compile(r'\b(?:vat|tax|gst)\b', re.I)
+CURRENCY_MARKERS = (
+    ('USD', re.compile(r'\$|\bUSD\b')),
+    ('EUR', re.compile(r'€|\bEUR\b')),
+    ('GBP', re.compile(r'£|\bGBP\b')),
+    ('RWF', re.compile(r'\bRWF\b|\bFRW\b')),
+    ('KES', re.compile(r'\bKES\b|\bKSH\b', re.I)),
+)
+DATE_PATTERNS = (
+    (re.compile(r'\b(\d{4}-\d{2}-\d{2})\b'), ('%Y-%m-%d',)),
+    (re.compile(r'\b(\d{1,2}/\d{1,2}/\d{4})\b'), ('%d/%m/%Y', '%m/%d/%Y')),
+    (re.compile(r'\b(\d{1,2}\.\d{1,2}\.\d{4})\b'), ('%d.%m.%Y',)),
+    (re.compile(r'\b(\d{1,2}\s+[A-Za-z]{3,9}\.?\s+\d{4})\b'), ('%d %B %Y', '%d %b %Y')),
+    (re.compile(r'\b([A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4})\b'), ('%B %d %Y', '%b %d %Y')),
+)
+HEADING_NOISE_RE = re.compile(
+    r'^(?:tax\s+)?(?:invoice|receipt|proforma(?:\s+invoice)?|quotation|quote|bill|purchase order)\b', re.I
+)
+
+ITEM_COLUMNS = {
+    'name': ('description', 'item', 'product', 'name', 'details', 'particulars'),
+    'qty': ('qty', 'quantity', 'units', 'qté'),
+    'unit_price': ('unit price', 'price', 'rate', 'unit cost', 'u.p'),
+    'total': ('total', 'amount', 'line total', 'subtotal'),
+}
+# Line item written as text: "<name> <qty> <unit price> <total>"
+ITEM_LINE_RE = re.compile(
+    r'^(?P<name>[A-Za-z][^\d$€£]*?)\s+(?P<qty>\d+)\s*(?:x\s*)?'
+    r'[$€£]?\s?(?P<unit_price>[\d,]+\.\d{2})\s+[$€£]?\s?(?P<total>[\d,]+\.\d{2})\s*$'
+)
+
+
+def to_amount(value):
+    """Parse a money string like '$1,234.50' into a normalised decimal string."""
+    if value is None:
+        return None
+    match = AMOUNT_RE.search(str(value))
+    if not match:
+        return None
+    whole = re.sub(r'[,\s]', '', match.group(1))
+    cents = match.group(2) or '0'
+    try:
+        return str(Decimal(f'{whole}.{cents}').quantize(Decimal('0.01')))
+    except InvalidOperation:
+        return None
+
+
+def _to_qty(value):
+    try:
+        return int(Decimal(str(value).strip().replace(',', '')))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _parse_date(raw, formats):
+    cleaned = raw if re.fullmatch(r'[\d./-]+', raw) else re.sub(r'[.,]', ' ', raw)
+    cleaned = ' '.join(cleaned.split())
+    for fmt in formats:
+        try:
+            return datetime.strptime(cleaned, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def find_dates(text):
+    found = []
+    for pattern, formats in DATE_PATTERNS:
+        for raw in pattern.findall(text):
+            parsed = _parse_date(raw, formats)
+            if parsed and parsed not in found:
+                found.append(parsed)
+    return found
+
+
+def find_currency(text):
+    for code, pattern in CURRENCY_MARKERS:
+        if pattern.search(text):
+            return code
+    return None
+
+
+def find_vendor(lines, heading=None):
+    """Labelled vendor ("Vendor: X") first, then the first-page heading, then the first plain line."""
+    for line in lines:
+        match = VENDOR_LABEL_RE.match(line)
+        if match:
+            return match.group(1).strip()
+    candidates = ([heading] if heading else []) + list(lines[:5])
+    for candidate in candidates:
+        candidate = (candidate or '').strip()
+        if len(candidate) < 2 or HEADING_NOISE_RE.match(candidate):
+            continue
+        if MONEY_RE.search(candidate) or find_dates(candidate):
+            continue
+        return candidate
+    return None
+
+
+def find_totals(lines):
+    """Last labelled amount per kind; 'subtotal' lines never count as the total."""
+    totals = {'subtotal': None, 'tax': None, 'total': None}
+    for line in lines:
+        amounts = MONEY_RE.findall(line)
+        if not amounts:
+            continue
+        whole, cents = amounts[-1]
+        amount = to_amount(f'{whole}.{cents}')
+        if SUBTOTAL_RE.search(line):
+            totals['subtotal'] = amount
+        elif TOTAL_RE.search(line):
+            totals['total'] = amount
+        elif TAX_RE.search(line):
+            totals['tax'] = amount
+    return totals
+
+
+def _match_columns(header):
+    columns = {}
+    for index, cell in enumerate(header):
+        label = (cell or '').strip().lower()
+        if not label:
+            continue
+        for key, names in ITEM_COLUMNS.items():
+            if key not in columns and any(label == n or label.startswith(n) for n in names):
+                columns[key] = index
+                break
+    return columns
+
+
+def _label_re(names):
+    return re.compile(r'(?<!\w)(?:' + '|'.join(re.escape(name) for name in names) + r')(?!\w)', re.I)
+
+
+ITEM_NAME_LABEL_RE = _label_re(ITEM_COLUMNS['name'])
+ITEM_AMOUNT_LABEL_RE = _label_re(ITEM_COLUMNS['unit_price'] + ITEM_COLUMNS['total'])
+
+
+def has_item_table_header(lines):
+    """Whether a text line reads like the header row of a line-item table (see items_from_tables)."""
+    return any(ITEM_NAME_LABEL_RE.search(line) and ITEM_AMOUNT_LABEL_RE.search(line) for line in lines)
+
+
+def items_from_tables(tables):
+    """Line items from pdfplumber tables whose header names a description and an amount column."""
+    items = []
+    for table in tables:
+        if not table:
+            continue
+        columns = _match_columns(table[0])
+        if 'name' not in columns or not ({'total', 'unit_price'} & columns.keys()):
+            continue
+        for row in table[1:]:
+            cells = {
+                key: row[index] if index < len(row) else None
+                for key, index in columns.items()
+            }
+            name = (cells.get('name') or '').strip()
+            if not name or TOTAL_RE.search(name) or SUBTOTAL_RE.search(name):
+                continue
+            items.append({
+                'name': ' '.join(name.split()),
+                'qty': _to_qty(cells['qty']) if cells.get('qty') else 1,
+                'unit_price': to_amount(cells.get('unit_price')),
+                'total': to_amount(cells.get('total')),
+            })
+    return items
+
+
+def items_from_lines(lines):
+    items = []
+    for line in lines:
+        match = ITEM_LINE_RE.match(line.strip())
+        if match and not TOTAL_RE.search(match.group('name')):
+            items.append({
+                'name': match.group('name').strip(),
+                'qty': int(match.group('qty')),
+                'unit_price': to_amount(match.group('unit_price')),
+                'total': to_amount(match.group('total')),
+            })
+    return items
+
+
+def parse_invoice_fields(text, tables=(), heading=None):
+    """Structured fields from extracted text, pdfplumber tables and a first-page heading."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    fields = {
+        'vendor': find_vendor(lines, heading=heading),
+        'invoice_number': None,
+        'dates': find_dates(text),
+        'currency': find_currency(text),
+    }
+    match = INVOICE_NUMBER_RE.search(text)
+    if match:
+        fields['invoice_number'] = match.group(1)
+    fields.update(find_totals(lines))
+    fields['line_items'] = items_from_tables(tables) or items_from_lines(lines)
+    return fields
@@ -0,0 +1,72 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from accounts.models import Role
+from procure.models import PurchaseRequest
+from procure_to_pay.utils import RequestPagination
+
+User = get_user_model()
+
+# Full-table scans in EXPLAIN output: PostgreSQL "Seq Scan on t", SQLite "SCAN t" (without an index)
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING)'),
+}
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on each role's inbox (list page) query and flag sequential scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='PostgreSQL only: EXPLAIN ANALYZE (executes the queries)'
+        )
+        parser.add_argument(
+            '--no-seqscan', action='store_true',
+            help='PostgreSQL only: SET enable_seqscan = off, to check that an index is usable '
+                 'even on small development tables where the planner prefers scanning'
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Exit with an error if any inbox query does a sequential scan'
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        pattern = SEQ_SCAN_PATTERNS.get(vendor)
+        if pattern is None:
+            raise CommandError(f'Unsupported database backend: {vendor}')
+
+        explain_options = {}
+        if vendor == 'postgresql' and options['analyze']:
+            explain_options['analyze'] = True
+
+        flagged = []
+        with transaction.atomic():
+            if vendor == 'postgresql' and options['no_seqscan']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for role, label in Role.choices:
+                user = User.objects.filter(profile__role=role).first() or User(pk=0)
+                queryset = PurchaseRequest.objects.for_role(role, user)[:RequestPagination.page_size]
+                plan = queryset.explain(**explain_options)
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f'== {label} ({role})'))
+                self.stdout.write(plan)
+
+                scanned = sorted(set(pattern.findall(plan)))
+                if scanned:
+                    flagged.append(role)
+                    self.stdout.write(self.style.WARNING(f'Sequential scan on: {", ".join(scanned)}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS('No sequential scans.'))
+                self.stdout.write('')
+
+        if flagged and options['strict']:
+            raise CommandError(f'Sequential scans in inbox queries for: {", ".join(flagged)}')
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS('All inbox queries use indexes.'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from procure.models import PurchaseRequest
+from procure.exports import EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, export_queryset, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream purchase requests (with items and approvals) as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', dest='export_format')
+        parser.add_argument(
+            '--status', default=PurchaseRequest.STATUS_APPROVED,
+            help="Status to export (default: APPROVED). Use 'all' to export every request."
+        )
+        parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        status = options['status'].upper()
+        valid_statuses = {choice for choice, _ in PurchaseRequest.STATUS_CHOICES}
+        if status != 'ALL' and status not in valid_statuses:
+            raise CommandError(f"Unknown status '{options['status']}'")
+
+        queryset = export_queryset(None if status == 'ALL' else status)
+        lines = iter_export(options['export_format'], queryset, chunk_size=options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                out.writelines(lines)
+            self.stderr.write(self.style.SUCCESS(f"Export written to {options['output']}"))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
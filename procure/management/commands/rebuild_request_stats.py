@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from procure.analytics import rebuild_monthly_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the monthly purchase request rollup used by the analytics endpoint'
+
+    def handle(self, *args, **options):
+        rows = rebuild_monthly_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} monthly stats row(s).'))
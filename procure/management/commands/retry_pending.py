@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from procure.models import PurchaseOrder, ReceiptValidation
+from procure.document_processing import retry_po_file, validate_receipt_against_po
+
+
+class Command(BaseCommand):
+    help = 'Retry PO uploads and receipt validations left pending while storage or Gemini was unavailable'
+
+    def handle(self, *args, **options):
+        remaining = 0
+
+        for po in PurchaseOrder.objects.filter(pending_retry=True).select_related('request'):
+            if retry_po_file(po):
+                self.stdout.write(self.style.SUCCESS(f'Stored PO file for Request #{po.request_id}'))
+            else:
+                remaining += 1
+                self.stdout.write(self.style.WARNING(f'PO file for Request #{po.request_id} still pending'))
+
+        pending = ReceiptValidation.objects.filter(pending_retry=True).select_related('request')
+        for validation in pending:
+            pr = validation.request
+            # Wait for the model: a provisional verdict would settle nothing
+            result = validate_receipt_against_po(pr, deadline=0)
+            if result.get('pending_retry') or result.get('provisional'):
+                remaining += 1
+                self.stdout.write(self.style.WARNING(f'Receipt validation for Request #{pr.id} still pending'))
+            elif 'reason' in result:
+                self.stdout.write(self.style.ERROR(f'Receipt validation for Request #{pr.id} failed: {result["reason"]}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Validated receipt for Request #{pr.id}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Completed, {remaining} still pending.'))
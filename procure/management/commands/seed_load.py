@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts.models import Profile, Role
+from procure.analytics import rebuild_monthly_stats
+from procure.models import Approval, PurchaseOrder, PurchaseRequest, ReceiptValidation, RequestItem
+from procure.seeding import bulk_insert, copy_insert, seed_requests, seed_users
+
+
+class Command(BaseCommand):
+    MODELS = (PurchaseRequest, RequestItem, Approval, PurchaseOrder, ReceiptValidation)
+
+    help = (
+        'Generate a high-volume synthetic data set: users with profiles, purchase requests with items, '
+        'and the approvals, purchase orders and receipt validations of each workflow stage'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to create (0 reuses existing users)')
+        parser.add_argument('--requests', type=int, default=100000, help='Purchase requests to create')
+        parser.add_argument('--days', type=int, default=365, help='Spread request dates over this many days')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Requests written per transaction')
+        parser.add_argument('--prefix', default='load', help='Username prefix of the generated users')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='PostgreSQL only: load rows with COPY instead of bulk INSERTs'
+        )
+
+    def handle(self, *args, **options):
+        writer = bulk_insert
+        if options['copy']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('--copy requires PostgreSQL.')
+            writer = copy_insert
+
+        started = time.monotonic()
+        if options['users']:
+            seed_users(options['users'], prefix=options['prefix'], seed=options['seed'], writer=writer)
+            self.stdout.write(f"Created {options['users']} user(s).")
+
+        by_role = {}
+        for user_id, role in Profile.objects.values_list('user_id', 'role').iterator():
+            by_role.setdefault(role, []).append(user_id)
+        missing = [r for r in (Role.STAFF, Role.APPROVER_L1, Role.APPROVER_L2) if not by_role.get(r)]
+        if missing:
+            raise CommandError(f'No users with role(s) {", ".join(missing)}; create some with --users.')
+
+        counts_before = self._counts()
+        seed_requests(
+            by_role[Role.STAFF], options['requests'],
+            approver_ids={1: by_role[Role.APPROVER_L1], 2: by_role[Role.APPROVER_L2]},
+            days=options['days'], batch_size=options['batch_size'], seed=options['seed'],
+            progress=self._progress if options['verbosity'] > 0 else None, writer=writer,
+        )
+        if options['verbosity'] > 0:
+            self.stderr.write('')
+
+        rows = rebuild_monthly_stats()
+        if connection.vendor == 'postgresql':
+            # Fresh planner statistics, so EXPLAIN reflects the new volume right away
+            with connection.cursor() as cursor:
+                for model in self.MODELS:
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        for model, before in zip(self.MODELS, counts_before):
+            self.stdout.write(f'{model._meta.verbose_name_plural}: +{model.objects.count() - before}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.monotonic() - started:.1f}s; rebuilt {rows} monthly stats row(s).'
+        ))
+
+    def _counts(self):
+        return [model.objects.count() for model in self.MODELS]
+
+    def _progress(self, done, total):
+        self.stderr.write(f'\r{done}/{total} requests', ending='')
+        self.stderr.flush()
@@ -1,26 +1,52 @@
 from django.core.management.base import BaseCommand
-from procure.models import PurchaseOrder
+from procure.models import PurchaseOrder, PurchaseRequest
 
 
 class Command(BaseCommand):
-    help = 'Update existing PurchaseOrders to ensure they have proper Cloudinary URLs'
+    help = 'Backfill the stored Cloudinary URLs of Purchase Order files and receipts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of rows written per bulk UPDATE (default: 500)'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Recompute URLs for rows that already have one stored'
+        )
 
     def handle(self, *args, **options):
-        pos = PurchaseOrder.objects.filter(file__isnull=False).exclude(file='')
-        
-        updated_count = 0
-        for po in pos:
-            # This forces Django to regenerate the URL property
-            # The URL is automatically available via po.file.url
-            if po.file:
-                self.stdout.write(
-                    f'PO #{po.id} - File: {po.file.name} - URL: {po.file.url}'
-                )
-                updated_count += 1
-        
+        batch_size = options['batch_size']
+        force = options['force']
+
+        pos = PurchaseOrder.objects.exclude(file__isnull=True).exclude(file='')
+        receipts = PurchaseRequest.objects.exclude(receipt__isnull=True).exclude(receipt='')
+        if not force:
+            pos = pos.filter(file_url='')
+            receipts = receipts.filter(receipt_url='')
+
+        po_count = self.backfill(pos.only('id', 'file'), 'file', 'file_url', batch_size)
+        receipt_count = self.backfill(receipts.only('id', 'receipt'), 'receipt', 'receipt_url', batch_size)
+
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully processed {updated_count} Purchase Orders. '
-                f'URLs are now accessible via the API.'
+                f'Stored URLs for {po_count} Purchase Order(s) and {receipt_count} receipt(s).'
             )
         )
+
+    def backfill(self, queryset, file_field, url_field, batch_size):
+        model = queryset.model
+        batch = []
+        count = 0
+        for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            field_file = getattr(obj, file_field)
+            setattr(obj, url_field, field_file.url)
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                model.objects.bulk_update(batch, [url_field])
+                count += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, [url_field])
+            count += len(batch)
+        return count
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0005_receiptvalidation_is_valid_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='file_url',
+            field=models.URLField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='purchaserequest',
+            name='receipt_url',
+            field=models.URLField(blank=True, default='', max_length=500),
+        ),
+    ]
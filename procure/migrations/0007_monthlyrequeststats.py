@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-19 04:21
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_monthly_stats(apps, schema_editor):
+    """Same as procure.analytics.rebuild_monthly_stats, on the historical models."""
+    PurchaseRequest = apps.get_model('procure', 'PurchaseRequest')
+    MonthlyRequestStats = apps.get_model('procure', 'MonthlyRequestStats')
+    rows = (
+        PurchaseRequest.objects
+        .annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values('month', 'status')
+        .annotate(request_count=Count('id'), total_amount=Sum('amount'))
+        .order_by()
+    )
+    MonthlyRequestStats.objects.bulk_create([
+        MonthlyRequestStats(
+            month=row['month'],
+            status=row['status'],
+            request_count=row['request_count'],
+            total_amount=row['total_amount'] or Decimal('0'),
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0006_stored_file_urls'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRequestStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected')], max_length=20)),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'ordering': ['month', 'status'],
+                'unique_together': {('month', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_monthly_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-19 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0007_monthlyrequeststats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(fields=['request', 'level', 'approved'], name='approval_req_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(condition=models.Q(('approved', True)), fields=['level', 'request'], name='approval_granted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserequest',
+            index=models.Index(fields=['-created_at'], name='pr_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserequest',
+            index=models.Index(fields=['status', '-created_at'], name='pr_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserequest',
+            index=models.Index(fields=['created_by', '-created_at'], name='pr_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-created_at'], name='pr_pending_created_idx'),
+        ),
+    ]
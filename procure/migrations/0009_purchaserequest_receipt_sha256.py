@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0008_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaserequest',
+            name='receipt_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
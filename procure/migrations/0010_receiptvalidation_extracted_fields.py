@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0009_purchaserequest_receipt_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receiptvalidation',
+            name='extracted_fields',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-19 04:31
+
+from django.db import migrations, models
+import procure.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0010_receiptvalidation_extracted_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchaseorder',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=procure.storage.raw_document_storage, upload_to='generated_pos/'),
+        ),
+        migrations.AlterField(
+            model_name='purchaserequest',
+            name='receipt',
+            field=models.FileField(blank=True, null=True, storage=procure.storage.raw_document_storage, upload_to='receipts/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0011_raw_document_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receiptvalidation',
+            name='prompt_size',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0012_receiptvalidation_prompt_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='pending_retry',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='receiptvalidation',
+            name='pending_retry',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0013_pending_retry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receiptvalidation',
+            name='provisional',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procure', '0014_receiptvalidation_provisional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaserequest',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -1,11 +1,39 @@
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from cloudinary_storage.storage import RawMediaCloudinaryStorage
+from procure.storage import raw_document_storage
 
 User = get_user_model()
 
+class PurchaseRequestQuerySet(models.QuerySet):
+    def for_role(self, role, user=None):
+        """Requests visible in a role's inbox, newest first."""
+        if role == "staff":
+            # Staff see only their own requests
+            return self.filter(created_by=user).order_by('-created_at')
+        
+        elif role == "approver_l1":
+            # Approver 1 sees all requests
+            return self.all().order_by('-created_at')
+        
+        elif role == "approver_l2":
+            # Approver 2 only sees requests approved by Approver 1
+            return self.filter(approvals__level=1, approvals__approved=True).order_by('-created_at')
+        
+        elif role == "finance":
+            # Finance only sees requests approved by Approver 2 (status is APPROVED)
+            return self.filter(status="APPROVED").order_by('-created_at')
+        
+        elif role == "admin":
+            # Admin sees all requests
+            return self.all().order_by('-created_at')
+
+        # Everything else: nothing
+        return self.none()
+
+
 class PurchaseRequest(models.Model):
     STATUS_PENDING = 'PENDING'
     STATUS_APPROVED = 'APPROVED'
@@ -26,9 +54,31 @@ class PurchaseRequest(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     proforma = models.FileField(upload_to='proformas/', null=True, blank=True)
     purchase_order = models.FileField(upload_to='pos/', null=True, blank=True)
-    receipt = models.FileField(upload_to='receipts/', null=True, blank=True, storage=RawMediaCloudinaryStorage())
+    receipt = models.FileField(upload_to='receipts/', null=True, blank=True, storage=raw_document_storage)
+    # Resolved storage URL, persisted on upload so list pages don't rebuild it per row
+    receipt_url = models.URLField(max_length=500, blank=True, default='')
+    receipt_sha256 = models.CharField(max_length=64, blank=True, default='')
 
     last_approved_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    # Bumped by every edit and decision (see procure.concurrency); served as the ETag
+    version = models.PositiveIntegerField(default=1)
+
+    objects = PurchaseRequestQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Approver L1 / admin inbox: everything, newest first
+            models.Index(fields=['-created_at'], name='pr_created_idx'),
+            # Finance inbox and status filters (also backs generate_missing_pos)
+            models.Index(fields=['status', '-created_at'], name='pr_status_created_idx'),
+            # Staff inbox: own requests, newest first
+            models.Index(fields=['created_by', '-created_at'], name='pr_owner_created_idx'),
+            # Work queue of requests still awaiting a decision
+            models.Index(
+                fields=['-created_at'], name='pr_pending_created_idx',
+                condition=models.Q(status='PENDING'),
+            ),
+        ]
 
     def __str__(self):
         return f"PR#{self.id} {self.title} [{self.status}]"
@@ -53,13 +103,25 @@ class Approval(models.Model):
 
     class Meta:
         unique_together = (('request', 'approver', 'level'),)
+        indexes = [
+            # approve(): "has this request got a level-N approval?"
+            models.Index(fields=['request', 'level', 'approved'], name='approval_req_level_idx'),
+            # Approver L2 inbox: requests with a granted level-1 approval
+            models.Index(
+                fields=['level', 'request'], name='approval_granted_idx',
+                condition=models.Q(approved=True),
+            ),
+        ]
 
 class PurchaseOrder(models.Model):
     request = models.OneToOneField(PurchaseRequest, on_delete=models.CASCADE, related_name='po_obj')
     generated_at = models.DateTimeField(auto_now_add=True)
     generated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     content = models.JSONField()
-    file = models.FileField(upload_to='generated_pos/', null=True, blank=True, storage=RawMediaCloudinaryStorage())
+    file = models.FileField(upload_to='generated_pos/', null=True, blank=True, storage=raw_document_storage)
+    file_url = models.URLField(max_length=500, blank=True, default='')
+    # The PDF could not be stored (storage down); `manage.py retry_pending` uploads it
+    pending_retry = models.BooleanField(default=False)
 
 class ReceiptValidation(models.Model):
     request = models.OneToOneField(PurchaseRequest, on_delete=models.CASCADE, related_name='receipt_validation')
@@ -67,3 +129,52 @@ class ReceiptValidation(models.Model):
     validation_result = models.JSONField(null=True, blank=True)
     discrepancies = models.JSONField(null=True, blank=True)
     is_valid = models.BooleanField(default=False)
+    # Structured receipt fields (vendor, dates, totals, line items) from extract_document
+    extracted_fields = models.JSONField(null=True, blank=True)
+    # Size of the comparison prompt sent to Gemini (see procure.prompting.build_receipt_prompt)
+    prompt_size = models.JSONField(null=True, blank=True)
+    # The local matcher's verdict, standing in until the model's arrives
+    provisional = models.BooleanField(default=False)
+    # Gemini was unavailable; `manage.py retry_pending` runs the comparison
+    pending_retry = models.BooleanField(default=False)
+
+class MonthlyRequestStats(models.Model):
+    """
+    Month-level rollup of purchase requests per status, maintained incrementally
+    by procure.signals (rebuild with `manage.py rebuild_request_stats`).
+    """
+    month = models.DateField()  # first day of the month the request was created in
+    status = models.CharField(max_length=20, choices=PurchaseRequest.STATUS_CHOICES)
+    request_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = (('month', 'status'),)
+        ordering = ['month', 'status']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.status}: {self.request_count}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client's Idempotency-Key for one call, and the response it got, replayed
+    to retries of the call (see procure.idempotency).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    # SHA-256 of the method, path and body the key was first used with
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)  # None while the call runs
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    response_headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # A running call holds the key until then; after that a retry takes over
+    locked_until = models.DateTimeField()
+
+    class Meta:
+        unique_together = (('user', 'key'),)
+        indexes = [
+            # purge_idempotency_keys
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
@@ -0,0 +1,129 @@
+"""
+OCR backends for OCR_BACKEND (any callable taking a PIL image and returning
+its text works; these are the built-in ones).
+
+`image_to_string`, the default, runs Tesseract in-process through tesserocr's
+C-API binding. A small pool of engines (OCR_ENGINES per process) keeps the
+language model loaded between pages, so a page costs the recognition time
+only. Without tesserocr, or when its engine can't start, it falls back to
+pytesseract. pytesseract starts a `tesseract` process per page, reloads the
+model and passes the image through temporary files.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EngineUnavailable(RuntimeError):
+    """The in-process OCR engine can't be used (not installed, no language data)."""
+
+
+# What the built-in backends raise when an image can't be recognised:
+# tesserocr and pytesseract's TesseractError are RuntimeErrors, a missing
+# `tesseract` command is an OSError
+OCR_ERRORS = (RuntimeError, OSError)
+
+
+class EnginePool:
+    """
+    Up to `size` long-lived engines from `factory`, created on first use and
+    shared by all threads; a thread waits when every engine is busy.
+    """
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = size
+        self.created = 0
+        self.idle = []  # LIFO: the most recently used engine is reused first
+        self.available = threading.Condition()
+
+    def _acquire(self):
+        with self.available:
+            # Woken up by an engine coming back, or by a slot freed when
+            # creating an engine failed
+            while not self.idle and self.created >= self.size:
+                self.available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+        try:
+            return self.factory()
+        except BaseException:
+            with self.available:
+                self.created -= 1
+                self.available.notify()
+            raise
+
+    def _release(self, engine):
+        with self.available:
+            self.idle.append(engine)
+            self.available.notify()
+
+    @contextmanager
+    def engine(self):
+        engine = self._acquire()
+        try:
+            yield engine
+        finally:
+            self._release(engine)
+
+
+def _tesserocr_engine():
+    try:
+        import tesserocr
+    except ImportError as exc:
+        raise EngineUnavailable('tesserocr is not installed') from exc
+    kwargs = {'lang': settings.OCR_LANGUAGE}
+    if settings.OCR_TESSDATA_PATH:
+        kwargs['path'] = settings.OCR_TESSDATA_PATH
+    try:
+        return tesserocr.PyTessBaseAPI(**kwargs)
+    except RuntimeError as exc:
+        raise EngineUnavailable(f'Tesseract could not load "{settings.OCR_LANGUAGE}": {exc}') from exc
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_unavailable = None
+
+
+def engine_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EnginePool(_tesserocr_engine, settings.OCR_ENGINES)
+        return _pool
+
+
+def tesserocr_image_to_string(image):
+    """OCR with a pooled tesserocr engine (the GIL is released while it recognises)."""
+    with engine_pool().engine() as api:
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+
+
+def pytesseract_image_to_string(image):
+    """OCR through the `tesseract` command, one process per call."""
+    import pytesseract
+
+    config = f'--tessdata-dir {settings.OCR_TESSDATA_PATH}' if settings.OCR_TESSDATA_PATH else ''
+    return pytesseract.image_to_string(image, lang=settings.OCR_LANGUAGE, config=config)
+
+
+def image_to_string(image):
+    """In-process OCR, falling back to pytesseract where tesserocr can't run."""
+    global _unavailable
+    if _unavailable is None:
+        try:
+            return tesserocr_image_to_string(image)
+        except EngineUnavailable as exc:
+            logger.warning("In-process OCR unavailable, using pytesseract: %s", exc)
+            _unavailable = exc
+    return pytesseract_image_to_string(image)
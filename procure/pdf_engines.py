@@ -0,0 +1,232 @@
+"""
+PDF text engines behind `iter_document_pages` (selected with PDF_TEXT_ENGINE).
+
+- PdfiumEngine (default): pypdfium2's native text layer, about ten times
+  faster than pdfminer on generated invoices. Each page is routed by
+  `route_page`: clean text is used as is, garbled text goes through
+  pdfminer's layout analysis and pages with (almost) no text are OCRed.
+  When fields are wanted, pages with an item table header also get
+  pdfplumber's table extraction.
+- PdfminerEngine: pdfplumber (pdfminer layout analysis) for every page.
+
+An engine is opened on a path or binary file (raising for anything that is
+not a PDF), is a context manager, has a length in pages and returns one
+result per page from `page(index, with_fields)`:
+{'number', 'text', 'ocr', 'tables', 'heading', 'engine'}, where 'engine'
+says how the page was read: pdfium, pdfium+tables, pdfminer or ocr.
+
+PDFium is not thread-safe, and async views and threaded workers parse
+documents concurrently, so every pypdfium2 call (pdfplumber renders with it
+too) holds PDFIUM_LOCK. OCR runs outside the lock.
+"""
+import logging
+import threading
+import unicodedata
+
+import pdfplumber
+import pypdfium2
+
+from procure.document_processing import ocr_image
+from procure.invoice_fields import has_item_table_header
+
+logger = logging.getLogger(__name__)
+
+PDFIUM_LOCK = threading.RLock()
+
+OCR_RESOLUTION = 300
+# A text layer with fewer visible characters than this is a scan (maybe with a page number)
+MIN_TEXT_CHARS = 16
+# Share of visible characters that may be unmapped glyphs or control characters
+MAX_GARBLED_RATIO = 0.05
+# Invoices are mostly letters and digits; much less points at a broken font encoding
+MIN_ALNUM_RATIO = 0.5
+
+# pdfium marks soft hyphens at line ends with these
+_PDFIUM_HYPHENS = {'\x02': '-', '\ufffe': '-'}
+
+
+def clean_text(text):
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    for marker, replacement in _PDFIUM_HYPHENS.items():
+        text = text.replace(marker, replacement)
+    return text
+
+
+def route_page(text):
+    """'text' when the text layer can be used as is, 'layout' when it looks garbled, 'ocr' when there is none."""
+    visible = [char for char in text if not char.isspace()]
+    if len(visible) < MIN_TEXT_CHARS:
+        return 'ocr'
+    garbled = sum(
+        1 for char in visible
+        if char == '\ufffd' or unicodedata.category(char) in ('Cc', 'Co', 'Cs', 'Cn')
+    )
+    if garbled / len(visible) > MAX_GARBLED_RATIO:
+        return 'layout'
+    if sum(char.isalnum() for char in visible) / len(visible) < MIN_ALNUM_RATIO:
+        return 'layout'
+    return 'text'
+
+
+def _heading_text(page):
+    """Text set noticeably larger than the body near the top of the page (usually the vendor)."""
+    words = page.extract_words(extra_attrs=['size'])
+    if not words:
+        return None
+    sizes = sorted(word['size'] for word in words)
+    largest, median = sizes[-1], sizes[len(sizes) // 2]
+    if largest < median * 1.15:
+        return None
+    top_limit = page.height / 4
+    heading = [w['text'] for w in words if w['size'] >= largest * 0.95 and w['top'] <= top_limit]
+    return ' '.join(heading) or None
+
+
+def _pdfium_words(textpage, page_height):
+    """Words as (text, font size, distance of their top from the top of the page)."""
+    words, current = [], None
+    for index in range(textpage.count_chars()):
+        char = chr(pypdfium2.raw.FPDFText_GetUnicode(textpage, index))
+        if char.isspace() or not char.isprintable():
+            current = None
+            continue
+        size = round(pypdfium2.raw.FPDFText_GetFontSize(textpage, index), 1)
+        if current is None or current[1] != size:
+            top = page_height - textpage.get_charbox(index)[3]
+            current = [char, size, top]
+            words.append(current)
+        else:
+            current[0] += char
+    return words
+
+
+def _pdfium_heading(textpage, page_height):
+    """Same rule as _heading_text, on pdfium's characters."""
+    words = _pdfium_words(textpage, page_height)
+    if not words:
+        return None
+    sizes = sorted(size for _, size, _ in words)
+    largest, median = sizes[-1], sizes[len(sizes) // 2]
+    if largest < median * 1.15:
+        return None
+    heading = [text for text, size, top in words if size >= largest * 0.95 and top <= page_height / 4]
+    return ' '.join(heading) or None
+
+
+class _Engine:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PdfminerEngine(_Engine):
+    """pdfplumber for every page; OCR for pages without a text layer."""
+
+    def __init__(self, fileobj):
+        self.pdf = pdfplumber.open(fileobj)
+
+    def __len__(self):
+        return len(self.pdf.pages)
+
+    def close(self):
+        self.pdf.close()
+
+    def _ocr(self, page):
+        try:
+            with PDFIUM_LOCK:
+                image = page.to_image(resolution=OCR_RESOLUTION).original
+            return ocr_image(image, dpi=OCR_RESOLUTION)
+        except Exception:
+            logger.warning("OCR failed on page %s", page.page_number, exc_info=True)
+            return ''
+
+    def tables(self, index):
+        page = self.pdf.pages[index]
+        try:
+            return page.extract_tables()
+        finally:
+            page.close()
+
+    def page(self, index, with_fields=False):
+        page = self.pdf.pages[index]
+        try:
+            page_text = page.extract_text()
+            result = {'number': index + 1, 'text': page_text, 'ocr': False, 'tables': [], 'heading': None,
+                      'engine': 'pdfminer'}
+            if not page_text:
+                result.update(text=self._ocr(page), ocr=True, engine='ocr')
+            elif with_fields:
+                result['tables'] = page.extract_tables()
+                if index == 0:
+                    result['heading'] = _heading_text(page)
+            return result
+        finally:
+            page.close()
+
+
+class PdfiumEngine(_Engine):
+    """pypdfium2 text layer, falling back per page to pdfminer layout analysis or OCR."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self._pdfminer = None
+        with PDFIUM_LOCK:
+            self.pdf = pypdfium2.PdfDocument(fileobj)
+
+    def __len__(self):
+        return len(self.pdf)
+
+    def close(self):
+        if self._pdfminer is not None:
+            self._pdfminer.close()
+        with PDFIUM_LOCK:
+            self.pdf.close()
+
+    def pdfminer(self):
+        """The same document opened with pdfplumber, for pages that need layout analysis."""
+        if self._pdfminer is None:
+            if hasattr(self.fileobj, 'seek'):
+                self.fileobj.seek(0)
+            self._pdfminer = PdfminerEngine(self.fileobj)
+        return self._pdfminer
+
+    def page(self, index, with_fields=False):
+        image = None
+        with PDFIUM_LOCK:
+            page = self.pdf[index]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    text = clean_text(textpage.get_text_range())
+                    route = route_page(text)
+                    heading = None
+                    if route == 'text' and with_fields and index == 0:
+                        heading = _pdfium_heading(textpage, page.get_height())
+                finally:
+                    textpage.close()
+                if route == 'ocr':
+                    image = page.render(scale=OCR_RESOLUTION / 72).to_pil()
+            finally:
+                page.close()
+
+        if route == 'ocr':
+            try:
+                ocr_text = ocr_image(image, dpi=OCR_RESOLUTION)
+            except Exception:
+                logger.warning("OCR failed on page %s", index + 1, exc_info=True)
+                ocr_text = ''
+            # A scan's OCR can come back empty; keep the little text layer there was
+            return {'number': index + 1, 'text': ocr_text or text.strip(), 'ocr': True, 'tables': [],
+                    'heading': None, 'engine': 'ocr'}
+        if route == 'layout':
+            return self.pdfminer().page(index, with_fields)
+
+        result = {'number': index + 1, 'text': text, 'ocr': False, 'tables': [], 'heading': heading,
+                  'engine': 'pdfium'}
+        if with_fields and has_item_table_header(text.splitlines()):
+            # Line items are read from table cells; plain text loses the columns
+            result['tables'] = self.pdfminer().tables(index)
+            result['engine'] = 'pdfium+tables'
+        return result
@@ -0,0 +1,186 @@
+"""
+Prompt construction for the Gemini receipt comparison
+(document_processing.compare_receipt_with_gemini).
+
+Receipts, OCRed ones especially, are mostly noise as far as the comparison
+is concerned: card terminal lines, return policies, separators, repeated
+headers. `build_receipt_prompt` sends the model only what it needs:
+
+- PO items and structured receipt fields in a compact encoding (one
+  `name | qty | unit price | total` row per item, fields as compact JSON)
+  instead of indented JSON.
+- Receipt text with whitespace normalised, boilerplate and repeated lines
+  (other than items and amounts) dropped, and only the lines relevant to the vendor, totals and items kept.
+  Lines are taken by relevance (totals, then vendor, then items, then other
+  amounts and references) until GEMINI_PROMPT_TOKEN_BUDGET is reached, and
+  sent in their original order.
+
+Tokens are estimated at CHARS_PER_TOKEN characters each, roughly what
+Gemini's tokenizer gives on English receipts; counting them exactly would
+cost an API call per prompt.
+"""
+import json
+import math
+import re
+
+from procure.invoice_fields import (
+    INVOICE_NUMBER_RE, ITEM_LINE_RE, MONEY_RE, SUBTOTAL_RE, TAX_RE, TOTAL_RE, find_dates,
+)
+
+CHARS_PER_TOKEN = 4
+# Lines of the receipt's header that may name the vendor
+HEADER_LINES = 3
+
+BOILERPLATE_RE = re.compile(
+    r'thank\s*(?:you|s)|visit\s+us|come\s+again|www\.|https?://|follow\s+us|'
+    r'customer\s+copy|merchant\s+copy|cashier|terminal|\b(?:tid|mid|aid)\b|'
+    r'auth(?:orization)?\s+code|approval\s+code|card\s*(?:no|number|holder)|[*x]{4,}\d{2,4}|'
+    r'return(?:s)?\s+policy|no\s+refunds?|exchange\s+within|signature|powered\s+by|'
+    r'keep\s+this\s+receipt|retain\s+for',
+    re.I,
+)
+# Rules and separators: nothing but punctuation
+SEPARATOR_RE = re.compile(r'^[\W_]+$')
+WORD_RE = re.compile(r'[a-z0-9]{3,}')
+
+# Relevance of a receipt line, highest first
+TOTALS, VENDOR, ITEMS, OTHER = range(4)
+
+INSTRUCTIONS = """You are a receipt validation assistant. Compare the Purchase Order (PO) with the receipt.
+
+Purchase Order:
+Vendor: {vendor}
+Total Amount: {total}
+Items (name | qty | unit price | total):
+{items}
+{structured}
+Receipt text (relevant lines only):
+{receipt}
+
+Task:
+1. Check if the vendor name matches (fuzzy match allowed).
+2. Check if the total amount matches.
+3. Check if the items match (names, quantities, prices).
+
+Return ONLY a JSON object, no other text:
+{{"is_valid": boolean, "discrepancies": [list of strings describing any mismatches]}}
+If everything matches, "is_valid" is true and "discrepancies" is empty.
+"""
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def normalize_lines(text):
+    """
+    Non-empty lines with whitespace collapsed, without boilerplate, separators
+    or repeats. Item lines and amounts are kept however often they occur: the
+    same item bought twice is two lines of the receipt's total.
+    """
+    lines, seen = [], set()
+    for line in (text or '').splitlines():
+        line = ' '.join(line.split())
+        key = line.lower()
+        if not line or SEPARATOR_RE.match(line) or BOILERPLATE_RE.search(line):
+            continue
+        if not (MONEY_RE.search(line) or ITEM_LINE_RE.match(line)):
+            if key in seen:
+                continue
+            seen.add(key)
+        lines.append(line)
+    return lines
+
+
+def encode_items(items):
+    """One `name | qty | unit price | total` row per item."""
+    rows = []
+    for item in items or []:
+        rows.append(' | '.join(
+            '' if item.get(key) is None else str(item[key]) for key in ('name', 'qty', 'unit_price', 'total')
+        ))
+    return '\n'.join(rows) or '(none)'
+
+
+def encode_fields(fields):
+    """Structured receipt fields: scalars as compact JSON, line items as rows."""
+    if not fields:
+        return ''
+    scalars = {key: value for key, value in fields.items() if key != 'line_items' and value not in (None, [])}
+    encoded = (
+        '\nStructured fields already extracted from the receipt (prefer these over re-reading the text):\n'
+        + json.dumps(scalars, separators=(',', ':'))
+    )
+    if fields.get('line_items'):
+        encoded += '\nExtracted line items (name | qty | unit price | total):\n' + encode_items(fields['line_items'])
+    return encoded + '\n'
+
+
+def _words(text):
+    return set(WORD_RE.findall(text.lower()))
+
+
+def line_relevance(index, line, vendor_words, item_words):
+    """TOTALS, VENDOR, ITEMS or OTHER for lines worth sending, None for the rest."""
+    has_money = bool(MONEY_RE.search(line))
+    if has_money and (TOTAL_RE.search(line) or SUBTOTAL_RE.search(line) or TAX_RE.search(line)):
+        return TOTALS
+    words = _words(line)
+    if index < HEADER_LINES or words & vendor_words:
+        return VENDOR
+    if ITEM_LINE_RE.match(line) or words & item_words:
+        return ITEMS
+    if has_money or INVOICE_NUMBER_RE.search(line) or find_dates(line):
+        return OTHER
+    return None
+
+
+def select_lines(lines, po_data, budget):
+    """The most relevant `lines` that fit in `budget` tokens, in their original order."""
+    vendor_words = _words(po_data.get('vendor') or '')
+    item_words = set()
+    for item in po_data.get('items') or []:
+        item_words |= _words(str(item.get('name') or ''))
+
+    ranked = []
+    for index, line in enumerate(lines):
+        relevance = line_relevance(index, line, vendor_words, item_words)
+        if relevance is not None:
+            ranked.append((relevance, index))
+    kept, used = [], 0
+    for relevance, index in sorted(ranked):
+        cost = estimate_tokens(lines[index]) + 1
+        if used + cost > budget:
+            continue
+        kept.append(index)
+        used += cost
+    return [lines[index] for index in sorted(kept)]
+
+
+def build_receipt_prompt(po_data, receipt_text, receipt_fields=None, budget=2000):
+    """
+    The comparison prompt and its size:
+    {'chars', 'tokens', 'budget', 'receipt_lines', 'receipt_lines_sent', 'receipt_chars', 'over_budget'}.
+    The PO and the structured fields are always sent; receipt lines fill the
+    rest of `budget` (estimated tokens).
+    """
+    parts = {
+        'vendor': po_data.get('vendor'),
+        'total': po_data.get('total'),
+        'items': encode_items(po_data.get('items')),
+        'structured': encode_fields(receipt_fields),
+    }
+    fixed = estimate_tokens(INSTRUCTIONS.format(receipt='', **parts))
+    lines = normalize_lines(receipt_text)
+    selected = select_lines(lines, po_data, max(0, budget - fixed))
+    prompt = INSTRUCTIONS.format(receipt='\n'.join(selected) or '(no text)', **parts)
+    tokens = estimate_tokens(prompt)
+    return prompt, {
+        'chars': len(prompt),
+        'tokens': tokens,
+        'budget': budget,
+        'receipt_lines': len(lines),
+        'receipt_lines_sent': len(selected),
+        'receipt_chars': len(receipt_text or ''),
+        'over_budget': tokens > budget,
+    }
@@ -0,0 +1,89 @@
+"""
+Deterministic receipt/PO comparison, the local counterpart of
+document_processing.compare_receipt_with_gemini.
+
+It checks the same three things as the model prompt (vendor, total, line
+items) on the structured fields from procure.invoice_fields, with fuzzy
+name matching. It is far less forgiving of OCR noise and unusual layouts
+than the model, so its verdict is only used as a provisional answer when
+the model is slow or unavailable (see validate_receipt_against_po_with_text).
+"""
+import re
+from decimal import Decimal, InvalidOperation
+from difflib import SequenceMatcher
+
+from procure.invoice_fields import parse_invoice_fields
+
+# Minimum similarity of normalised names to count as the same vendor or item
+VENDOR_MATCH_RATIO = 0.8
+ITEM_MATCH_RATIO = 0.75
+
+COMPANY_SUFFIX_RE = re.compile(r'\b(?:ltd|limited|inc|llc|plc|co|company|corp|sarl|s\.?a)\b\.?', re.I)
+
+
+def normalize_name(name):
+    name = COMPANY_SUFFIX_RE.sub(' ', (name or '').lower())
+    return ' '.join(re.findall(r'[a-z0-9]+', name))
+
+
+def similarity(a, b):
+    a, b = normalize_name(a), normalize_name(b)
+    if not a or not b:
+        return 0.0
+    if a in b or b in a:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _mentioned(name, lines, ratio):
+    return any(similarity(name, line) >= ratio for line in lines)
+
+
+def compare_locally(po_data, receipt_text, receipt_fields=None):
+    """{'is_valid', 'discrepancies'}, in the format of the model's answer."""
+    fields = receipt_fields or parse_invoice_fields(receipt_text or '')
+    lines = [line for line in (receipt_text or '').splitlines() if line.strip()]
+    discrepancies = []
+
+    vendor = po_data.get('vendor')
+    if vendor and vendor != 'Unknown':
+        if fields.get('vendor'):
+            if similarity(vendor, fields['vendor']) < VENDOR_MATCH_RATIO:
+                discrepancies.append(f"Vendor differs: PO '{vendor}', receipt '{fields['vendor']}'")
+        elif not _mentioned(vendor, lines, VENDOR_MATCH_RATIO):
+            discrepancies.append(f"Vendor '{vendor}' not found on the receipt")
+
+    po_total, receipt_total = _decimal(po_data.get('total')), _decimal(fields.get('total'))
+    if receipt_total is None:
+        discrepancies.append('Total not found on the receipt')
+    elif po_total != receipt_total:
+        discrepancies.append(f"Total differs: PO {po_data.get('total')}, receipt {fields['total']}")
+
+    receipt_items = list(fields.get('line_items') or [])
+    for item in po_data.get('items') or []:
+        name = item.get('name')
+        best = max(receipt_items, key=lambda candidate: similarity(name, candidate.get('name')), default=None)
+        if best is None or similarity(name, best.get('name')) < ITEM_MATCH_RATIO:
+            # Not parsed as a line item; its line can still be on the receipt
+            if not _mentioned(name, lines, ITEM_MATCH_RATIO):
+                discrepancies.append(f"Item '{name}' not found on the receipt")
+            continue
+        receipt_items.remove(best)
+        if best.get('qty') is not None and best['qty'] != item.get('qty'):
+            discrepancies.append(f"Quantity of '{name}' differs: PO {item.get('qty')}, receipt {best['qty']}")
+        price = _decimal(best.get('unit_price'))
+        if price is not None and price != _decimal(item.get('unit_price')):
+            discrepancies.append(
+                f"Unit price of '{name}' differs: PO {item.get('unit_price')}, receipt {best['unit_price']}"
+            )
+    for extra in receipt_items:
+        discrepancies.append(f"Receipt item '{extra.get('name')}' is not on the PO")
+
+    return {'is_valid': not discrepancies, 'discrepancies': discrepancies}
@@ -0,0 +1,173 @@
+"""
+Circuit breakers around the external services (Gemini, Cloudinary storage).
+
+Without them a slow dependency holds every request that calls it until
+gunicorn's worker timeout, and the whole worker pool goes with it. Each
+breaker (configured in CIRCUIT_BREAKERS) wraps calls to one service:
+
+- every call is bounded by `timeout` seconds (sync calls run in a small
+  thread pool so the caller can stop waiting; async calls use wait_for);
+- after `failure_threshold` consecutive failures or timeouts the circuit
+  opens and calls fail immediately for `reset_timeout` seconds;
+- then a single trial call is let through (half-open): success closes the
+  circuit, failure opens it again.
+
+Every failure is raised as ServiceUnavailable, so callers handle a slow, a
+failing and an open dependency the same way: the views record the PO or
+the receipt validation as pending retry (`manage.py retry_pending`) or
+answer 503 with Retry-After. `breaker_metrics()` reports the state and
+counters of every breaker (GET /api/metrics/breakers/).
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+# Timed-out calls keep their thread until the service answers; once all are
+# stuck, new calls queue, time out too and open the circuit
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='procure-breaker')
+
+
+class ServiceUnavailable(Exception):
+    """A service failed, timed out or has its circuit open; the work can be retried later."""
+
+    def __init__(self, service, reason, retry_after=None):
+        super().__init__(f'{service} unavailable: {reason}')
+        self.service = service
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CallTimeout(ServiceUnavailable):
+    pass
+
+
+class CircuitOpen(ServiceUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name, timeout, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.name = name
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.counters = dict.fromkeys(('calls', 'successes', 'failures', 'timeouts', 'rejected', 'opened'), 0)
+
+    def retry_after(self):
+        if self.state == CLOSED:
+            return 0
+        return max(0, self.opened_at + self.reset_timeout - self.clock())
+
+    def _admit(self):
+        with self.lock:
+            self.counters['calls'] += 1
+            if self.state == OPEN and self.retry_after() <= 0:
+                self.state, self.trial_running = HALF_OPEN, False
+            if self.state == OPEN or (self.state == HALF_OPEN and self.trial_running):
+                self.counters['rejected'] += 1
+                retry_after = self.retry_after() or self.timeout
+                raise CircuitOpen(self.name, f'circuit open, retry in {retry_after:.0f}s', retry_after)
+            if self.state == HALF_OPEN:
+                self.trial_running = True
+
+    def _succeeded(self):
+        with self.lock:
+            self.counters['successes'] += 1
+            self.state, self.consecutive_failures, self.trial_running = CLOSED, 0, False
+
+    def _failed(self, timed_out=False):
+        with self.lock:
+            self.counters['timeouts' if timed_out else 'failures'] += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.counters['opened'] += 1
+                self.state, self.opened_at, self.trial_running = OPEN, self.clock(), False
+
+    def _timeout(self):
+        self._failed(timed_out=True)
+        return CallTimeout(self.name, f'no answer within {self.timeout:g}s', self.reset_timeout)
+
+    def _failure(self, exc):
+        self._failed()
+        return ServiceUnavailable(self.name, str(exc) or type(exc).__name__, self.reset_timeout)
+
+    def call(self, func, *args, **kwargs):
+        """func(*args, **kwargs) through the breaker, from sync code."""
+        self._admit()
+        future = _executor.submit(func, *args, **kwargs)
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise self._timeout() from None
+        except Exception as exc:
+            raise self._failure(exc) from exc
+        except BaseException:
+            # Interrupted (KeyboardInterrupt, SystemExit): count it, so a
+            # half-open circuit isn't left with a trial that never finishes
+            self._failed()
+            raise
+        self._succeeded()
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """await func(*args, **kwargs) through the breaker, from async code."""
+        self._admit()
+        try:
+            result = await asyncio.wait_for(func(*args, **kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timeout() from None
+        except Exception as exc:
+            raise self._failure(exc) from exc
+        except BaseException:
+            # Cancelled: same as the sync call being interrupted
+            self._failed()
+            raise
+        self._succeeded()
+        return result
+
+    def metrics(self):
+        with self.lock:
+            # An open circuit whose reset timeout has passed admits the next call
+            state = HALF_OPEN if self.state == OPEN and self.retry_after() <= 0 else self.state
+            return {
+                'name': self.name,
+                'state': state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_after': round(self.retry_after(), 1),
+                **self.counters,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name):
+    """The process-wide breaker for `name`, configured by CIRCUIT_BREAKERS[name]."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **settings.CIRCUIT_BREAKERS[name])
+        return _breakers[name]
+
+
+def breaker_metrics():
+    return [breaker(name).metrics() for name in settings.CIRCUIT_BREAKERS]
+
+
+def reset_breakers():
+    """Forget every breaker's state (tests, or after changing CIRCUIT_BREAKERS)."""
+    with _breakers_lock:
+        _breakers.clear()
@@ -0,0 +1,280 @@
+"""
+Synthetic data for load tests and benchmarks (`manage.py seed_load`).
+
+Users with profiles, purchase requests with items, and the approvals, purchase
+orders and receipt validations that match each request's status. Rows are
+written in batches, either with `bulk_create` or, on PostgreSQL, with `COPY`
+(`copy_insert`). Neither fires per-row signals, so profiles are created here
+and the analytics rollup has to be rebuilt afterwards. Generation is seeded,
+so the same arguments produce the same data set.
+"""
+import csv
+import json
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from accounts.models import Profile, Role
+from procure.models import Approval, PurchaseOrder, PurchaseRequest, ReceiptValidation, RequestItem
+
+SEED_PASSWORD = 'password123'
+
+# Share of users per role in a typical organisation
+ROLE_WEIGHTS = (
+    (Role.STAFF, 80),
+    (Role.APPROVER_L1, 8),
+    (Role.APPROVER_L2, 6),
+    (Role.FINANCE, 4),
+    (Role.ADMIN, 2),
+)
+# Where requests are in the workflow: (status, approval stages reached, weight)
+WORKFLOW_WEIGHTS = (
+    ((PurchaseRequest.STATUS_PENDING, ()), 18),
+    ((PurchaseRequest.STATUS_PENDING, (True,)), 12),  # approved at L1, waiting for L2
+    ((PurchaseRequest.STATUS_APPROVED, (True, True)), 55),
+    ((PurchaseRequest.STATUS_REJECTED, (False,)), 9),
+    ((PurchaseRequest.STATUS_REJECTED, (True, False)), 6),
+)
+# Share of approved requests whose receipt has been submitted, and of those that matched the PO
+RECEIPT_SUBMITTED_RATE = 0.6
+RECEIPT_VALID_RATE = 0.85
+VENDORS = (
+    'Kigali Office Supplies', 'Rwanda Tech Hub', 'Akagera Logistics', 'Nyamirambo Printers',
+    'Virunga Furniture', 'Lake Kivu Catering', 'Inyange Industries', 'MTN Business',
+    'Simba Stationery', 'Bourbon Coffee Corporate',
+)
+ITEM_CATALOGUE = (
+    ('A4 Paper (ream)', Decimal('6.50')), ('Toner cartridge', Decimal('79.00')),
+    ('Laptop', Decimal('899.00')), ('Monitor 24"', Decimal('189.00')),
+    ('Office chair', Decimal('145.00')), ('Desk', Decimal('260.00')),
+    ('Projector', Decimal('540.00')), ('USB headset', Decimal('35.00')),
+    ('Printer', Decimal('310.00')), ('Whiteboard markers (box)', Decimal('12.00')),
+    ('Catering (per person)', Decimal('14.50')), ('Courier delivery', Decimal('22.00')),
+)
+TITLES = (
+    'Office supplies', 'New hire equipment', 'Team offsite', 'Printer replacement',
+    'Conference room upgrade', 'Quarterly stationery', 'Client workshop catering',
+)
+
+
+def _weighted(rng, weights):
+    values, value_weights = zip(*weights)
+    return rng.choices(values, weights=value_weights)[0]
+
+
+def _batches(total, batch_size):
+    for start in range(0, total, batch_size):
+        yield start, min(batch_size, total - start)
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """Let bulk_create keep preset values of auto_now/auto_now_add fields."""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seeded_username(role, index, prefix='load'):
+    """Seeded users are numbered per role: load_staff_0, load_approver_l1_0, ..."""
+    return f'{prefix}_{role}_{index}'
+
+
+def bulk_insert(model, objs):
+    """Default writer: bulk_create, which sets primary keys on PostgreSQL and SQLite."""
+    return model.objects.bulk_create(objs)
+
+
+def _allocate_ids(model, count):
+    pk_column = model._meta.pk.column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [model._meta.db_table, pk_column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _copy_value(field, obj):
+    value = getattr(obj, field.attname)
+    if value is None:
+        return r'\N'
+    if isinstance(field, models.JSONField):
+        return json.dumps(value, cls=field.encoder)
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def copy_insert(model, objs):
+    """
+    PostgreSQL writer: primary keys are drawn from the table's sequence up
+    front, then the rows are streamed with COPY ... FROM STDIN, which is several
+    times faster than multi-row INSERTs for large loads.
+    """
+    if not objs:
+        return objs
+    for obj, pk in zip(objs, _allocate_ids(model, len(objs))):
+        obj.pk = pk
+    fields = model._meta.concrete_fields
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for obj in objs:
+        writer.writerow([_copy_value(field, obj) for field in fields])
+    buffer.seek(0)
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+    return objs
+
+
+def seed_users(count, prefix='load', batch_size=1000, seed=0, writer=bulk_insert):
+    """
+    Create `count` users (see seeded_username; password SEED_PASSWORD) with
+    profiles, roles drawn from ROLE_WEIGHTS. Numbering continues after users
+    seeded earlier with the same prefix. Returns {role: [user ids]}.
+    """
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD)  # hash once, share between seeded users
+    # The first user of every role always exists, so load tests have someone to log in as
+    roles = [role for role, _ in ROLE_WEIGHTS][:count]
+    roles += [_weighted(rng, ROLE_WEIGHTS) for _ in range(count - len(roles))]
+    numbered = {
+        role: User.objects.filter(username__startswith=seeded_username(role, '', prefix)).count() - 1
+        for role, _ in ROLE_WEIGHTS
+    }
+    by_role = {}
+    for start, size in _batches(count, batch_size):
+        batch_roles = roles[start:start + size]
+        users = []
+        for role in batch_roles:
+            index = numbered[role] = numbered[role] + 1
+            username = seeded_username(role, index, prefix)
+            users.append(User(username=username, email=f'{username}@example.com', password=password))
+        with transaction.atomic():
+            users = writer(User, users)
+            writer(Profile, [Profile(user=user, role=role) for user, role in zip(users, batch_roles)])
+        for user, role in zip(users, batch_roles):
+            by_role.setdefault(role, []).append(user.pk)
+    return by_role
+
+
+def _later(rng, moment, now, max_hours):
+    return min(now, moment + timedelta(minutes=rng.randint(10, max_hours * 60)))
+
+
+def _workflow(rng, pr, lines, approver_ids, now):
+    """Approvals, purchase order and receipt validation matching a request's workflow stage."""
+    status, stages = _weighted(rng, WORKFLOW_WEIGHTS)
+    pr.status = status
+    approvals = []
+    decided_at = pr.created_at
+    for level, approved in enumerate(stages, start=1):
+        decided_at = _later(rng, decided_at, now, 72 if level == 1 else 96)
+        approver_id = rng.choice(approver_ids[level])
+        approvals.append(Approval(
+            request=pr, approver_id=approver_id, level=level, approved=approved,
+            comment='' if approved else 'Over budget', created_at=decided_at,
+        ))
+        if approved:
+            pr.last_approved_by_id = approver_id
+    pr.updated_at = decided_at
+
+    po = validation = None
+    if status == PurchaseRequest.STATUS_APPROVED:
+        po = PurchaseOrder(
+            request=pr, generated_by_id=pr.last_approved_by_id, generated_at=decided_at,
+            content={
+                'vendor': pr.vendor,
+                'items': [{'name': name, 'qty': qty, 'unit_price': str(price)} for name, qty, price in lines],
+                'total': str(pr.amount),
+                'extracted': {},
+            },
+        )
+        if rng.random() < RECEIPT_SUBMITTED_RATE:
+            is_valid = rng.random() < RECEIPT_VALID_RATE
+            # Like procure.receipt_matching's: one more of the first item was charged
+            discrepancies = [] if is_valid else [f'Total differs: PO {pr.amount}, receipt {pr.amount + lines[0][2]}']
+            validation = ReceiptValidation(
+                request=pr, validated_at=_later(rng, decided_at, now, 24 * 14), is_valid=is_valid,
+                discrepancies=discrepancies,
+                validation_result={'ok': is_valid, 'discrepancies': discrepancies},
+            )
+    return approvals, po, validation
+
+
+def seed_requests(owner_ids, count, approver_ids, days=365, batch_size=2000, seed=0, progress=None,
+                  writer=bulk_insert):
+    """
+    Create `count` purchase requests with 1-8 items each, spread over the
+    last `days` days and owned by `owner_ids`, together with the approvals
+    (by `approver_ids[1]` / `approver_ids[2]`), purchase orders and receipt
+    validations of their workflow stage. Returns the number created.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    created = 0
+    with explicit_timestamps(PurchaseRequest, 'created_at', 'updated_at'), \
+            explicit_timestamps(Approval, 'created_at'), \
+            explicit_timestamps(PurchaseOrder, 'generated_at'):
+        for start, size in _batches(count, batch_size):
+            requests, request_lines = [], []
+            for _ in range(size):
+                lines = [
+                    (name, rng.choice((1, 1, 1, 2, 2, 3, 5, 10, 20)), price)
+                    for name, price in rng.sample(ITEM_CATALOGUE, rng.choice((1, 1, 2, 2, 3, 4, 6, 8)))
+                ]
+                requests.append(PurchaseRequest(
+                    title=rng.choice(TITLES),
+                    description='Generated for load testing',
+                    vendor=rng.choice(VENDORS),
+                    amount=sum(qty * price for _, qty, price in lines),
+                    created_by_id=rng.choice(owner_ids),
+                    created_at=now - timedelta(seconds=rng.randint(0, days * 86400)),
+                ))
+                request_lines.append(lines)
+
+            approvals, orders, validations = [], [], []
+            for pr, lines in zip(requests, request_lines):
+                pr_approvals, po, validation = _workflow(rng, pr, lines, approver_ids, now)
+                approvals += pr_approvals
+                orders += [po] if po else []
+                validations += [validation] if validation else []
+
+            with transaction.atomic():
+                writer(PurchaseRequest, requests)
+                writer(RequestItem, [
+                    RequestItem(request=pr, name=name, qty=qty, unit_price=price)
+                    for pr, lines in zip(requests, request_lines)
+                    for name, qty, price in lines
+                ])
+                # Related objects were built before the requests had primary keys
+                for obj in approvals + orders + validations:
+                    obj.request_id = obj.request.pk
+                writer(Approval, approvals)
+                writer(PurchaseOrder, orders)
+                writer(ReceiptValidation, validations)
+            created += size
+            if progress:
+                progress(created, count)
+    return created
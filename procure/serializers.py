@@ -1,8 +1,20 @@
+from django.db import transaction
 from django.http import QueryDict
 from rest_framework import serializers
+from procure.concurrency import conditional_update, conflict
 from procure.models import PurchaseRequest, RequestItem, Approval, PurchaseOrder, ReceiptValidation
+from functools import lru_cache
 import json
 
+
+@lru_cache(maxsize=4096)
+def storage_url(storage, name):
+    """
+    Memoized URL lookup for files saved before their URL was persisted
+    (run `manage.py update_po_urls` to backfill those rows).
+    """
+    return storage.url(name)
+
 class RequestItemSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
@@ -11,7 +23,7 @@ class RequestItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'qty', 'unit_price', 'total_price']
         read_only_fields = ['id', 'total_price']
 
-    def get_total_price(self, obj):
+    def get_total_price(self, obj) -> str:
         return str(obj.total_price)
 
 
@@ -77,23 +89,23 @@ class PurchaseRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = PurchaseRequest
         fields = ['id', 'title', 'description', 'vendor', 'amount', 'status', 'created_by', 'last_approved_by',
-                  'created_at', 'purchase_order', 'receipt', 'receipt_validation', 'items', 'items_display', 'approvals']
+                  'created_at', 'purchase_order', 'receipt', 'receipt_validation', 'items', 'items_display', 'approvals', 'version']
         # amount is now read-only and auto-calculated from items
-        read_only_fields = ['status', 'created_by', 'created_at', 'last_approved_by', 'amount']
+        read_only_fields = ['status', 'created_by', 'created_at', 'last_approved_by', 'amount', 'version']
 
     
     @extend_schema_field(serializers.URLField(allow_null=True))
     def get_purchase_order(self, obj):
         """Return full Cloudinary URL for the PO file"""
         if hasattr(obj, 'po_obj') and obj.po_obj and obj.po_obj.file:
-            return obj.po_obj.file.url
+            return obj.po_obj.file_url or storage_url(obj.po_obj.file.storage, obj.po_obj.file.name)
         return None
     
     @extend_schema_field(serializers.URLField(allow_null=True))
     def get_receipt(self, obj):
         """Return full Cloudinary URL for the receipt file"""
         if obj.receipt:
-            return obj.receipt.url
+            return obj.receipt_url or storage_url(obj.receipt.storage, obj.receipt.name)
         return None
     
     @extend_schema_field(serializers.DictField(allow_null=True))
@@ -104,7 +116,9 @@ class PurchaseRequestSerializer(serializers.ModelSerializer):
             return {
                 'is_valid': rv.is_valid,
                 'validated_at': rv.validated_at,
-                'discrepancies': rv.discrepancies or []
+                'discrepancies': rv.discrepancies or [],
+                'provisional': rv.provisional,
+                'pending_retry': rv.pending_retry,
             }
         return None
     
@@ -198,19 +212,23 @@ class PurchaseRequestSerializer(serializers.ModelSerializer):
             # Overwrite amount with calculated total
             validated_data['amount'] = total_amount
         
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if items_data is not None:
-            instance.items.all().delete()
-            for item_data in items_data:
-                RequestItem.objects.create(
-                    request=instance,
-                    name=item_data['name'],
-                    qty=item_data['qty'],
-                    unit_price=item_data['unit_price']
-                )
+        # Only applies if nobody changed or approved the request since it was
+        # read (or since the version the client sent in If-Match)
+        expected_version = self.context.get('expected_version')
+        version = instance.version if expected_version is None else expected_version
+        with transaction.atomic():
+            if not conditional_update(instance, version=version, **validated_data):
+                raise conflict(instance, expected_version)
+
+            if items_data is not None:
+                instance.items.all().delete()
+                for item_data in items_data:
+                    RequestItem.objects.create(
+                        request=instance,
+                        name=item_data['name'],
+                        qty=item_data['qty'],
+                        unit_price=item_data['unit_price']
+                    )
         
         instance.refresh_from_db()
         return instance
@@ -219,7 +237,7 @@ class PurchaseRequestSerializer(serializers.ModelSerializer):
 class PurchaseOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = PurchaseOrder
-        fields = ['id', 'request', 'generated_at', 'generated_by', 'content', 'file']
+        fields = ['id', 'request', 'generated_at', 'generated_by', 'content', 'file', 'pending_retry']
     def create(self, validated_data):
         user = self.context['request'].user
         po = PurchaseOrder.objects.create(generated_by=user, **validated_data)
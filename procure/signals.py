@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from procure.analytics import month_of, bump_monthly_stats
+from procure.models import PurchaseRequest
+
+
+# The fields besides created_at that place a request in the rollup
+ROLLUP_FIELDS = ('status', 'amount')
+
+
+def _rollup_key(instance):
+    """(month, status, amount) as last loaded/saved, or None if unknown."""
+    values = instance.__dict__  # never trigger a query for deferred fields
+    if instance.pk is None or not all(values.get(f) is not None for f in ('created_at', *ROLLUP_FIELDS)):
+        return None
+    return (month_of(values['created_at']), values['status'], Decimal(values['amount']))
+
+
+@receiver(post_init, sender=PurchaseRequest)
+def remember_rollup_state(sender, instance, **kwargs):
+    instance._rollup_state = _rollup_key(instance)
+
+
+@receiver(post_save, sender=PurchaseRequest)
+def update_monthly_stats(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not set(ROLLUP_FIELDS) & set(update_fields):
+        return
+
+    previous = None if created else instance._rollup_state
+    current = _rollup_key(instance)
+    if previous == current or current is None:
+        return
+    if previous is None and not created:
+        # Loaded with deferred fields; the rollup can be resynced with rebuild_request_stats
+        instance._rollup_state = current
+        return
+
+    if previous is not None:
+        bump_monthly_stats(previous[0], previous[1], -1, -previous[2])
+    bump_monthly_stats(current[0], current[1], 1, current[2])
+    instance._rollup_state = current
+
+
+@receiver(post_delete, sender=PurchaseRequest)
+def remove_from_monthly_stats(sender, instance, **kwargs):
+    state = instance._rollup_state
+    if state is not None:
+        bump_monthly_stats(state[0], state[1], -1, -state[2])
@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.utils.module_loading import import_string
+
+from procure.resilience import CircuitOpen, breaker
+
+
+def raw_document_storage():
+    """
+    Storage for receipts and generated PO files: Cloudinary raw uploads in
+    production, swappable through RAW_DOCUMENT_STORAGE (e.g. local files in tests).
+    """
+    return import_string(settings.RAW_DOCUMENT_STORAGE)()
+
+
+def _copy(content):
+    """A file of the upload thread's own with `content`'s bytes (spooled to disk when large)."""
+    copy = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    for chunk in content.chunks():
+        copy.write(chunk)
+    copy.seek(0)
+    return copy
+
+
+def _save_copy(storage, name, copy, max_length):
+    with copy:
+        return storage.save(name, File(copy, name=os.path.basename(name)), max_length=max_length)
+
+
+def store_file(field_file, filename, content):
+    """
+    Upload `content` like FieldFile.save(save=False) and return the stored
+    name, through the 'storage' circuit breaker (see procure.resilience).
+    The upload runs in another thread, so a call that times out can't touch
+    the model instance later; the caller assigns the name. That thread
+    uploads a copy of `content`, which it closes: the request's upload is
+    deleted when the request ends, possibly while a timed-out upload still
+    reads it.
+    """
+    name = field_file.field.generate_filename(field_file.instance, filename)
+    copy = _copy(content)
+    try:
+        return breaker('storage').call(
+            _save_copy, field_file.storage, name, copy, max_length=field_file.field.max_length
+        )
+    except CircuitOpen:
+        copy.close()  # never handed to the thread
+        raise
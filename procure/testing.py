@@ -0,0 +1,211 @@
+"""
+Offline stand-ins and fixtures for the test suite (and local benchmarking).
+
+- LocalDocumentStorage / inject_storage_faults: file-system storage in place of
+  Cloudinary, with injectable latency and failures.
+- FakeGenaiClient / use_fake_gemini: scripted replacement for `genai.Client`.
+- stub_ocr / set_stub_ocr_text: OCR backend that returns canned text.
+- make_user, make_request, make_invoice_pdf: data for the approval flow.
+"""
+import json
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+
+from accounts.models import Role
+
+
+_storage_faults = {'delay': 0, 'error': None}
+
+
+class LocalDocumentStorage(FileSystemStorage):
+    """
+    Stands in for (Raw)MediaCloudinaryStorage: files under MEDIA_ROOT,
+    absolute-looking URLs. Uploads can be slowed down or failed with
+    inject_storage_faults().
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('location', settings.MEDIA_ROOT)
+        kwargs.setdefault('base_url', 'http://testserver/media/')
+        super().__init__(**kwargs)
+
+    def _save(self, name, content):
+        if _storage_faults['delay']:
+            time.sleep(_storage_faults['delay'])
+        if _storage_faults['error']:
+            raise _storage_faults['error']
+        return super()._save(name, content)
+
+
+@contextmanager
+def inject_storage_faults(delay=0, error=None):
+    """Make LocalDocumentStorage uploads take `delay` seconds and/or raise `error`."""
+    previous = dict(_storage_faults)
+    _storage_faults.update(delay=delay, error=error)
+    try:
+        yield
+    finally:
+        _storage_faults.update(previous)
+
+
+# --- OCR ---------------------------------------------------------------
+
+_stub_ocr_text = ''
+
+
+def stub_ocr(image):
+    """OCR_BACKEND used by the tests: returns whatever set_stub_ocr_text() configured."""
+    return _stub_ocr_text
+
+
+@contextmanager
+def set_stub_ocr_text(text):
+    global _stub_ocr_text
+    previous, _stub_ocr_text = _stub_ocr_text, text
+    try:
+        yield
+    finally:
+        _stub_ocr_text = previous
+
+
+# --- Gemini ------------------------------------------------------------
+
+def _chunk(text):
+    part = SimpleNamespace(text=text, thought=False)
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self.client = client
+
+    def generate_content_stream(self, model, contents, config=None):
+        self.client.calls.append({'model': model, 'contents': contents})
+        if self.client.delay:
+            time.sleep(self.client.delay)
+        if self.client.error:
+            raise self.client.error
+        for piece in self.client.next_response():
+            yield _chunk(piece)
+
+
+class _FakeAsyncModels(_FakeModels):
+    async def generate_content_stream(self, model, contents, config=None):
+        import asyncio
+
+        self.client.calls.append({'model': model, 'contents': contents})
+        if self.client.delay:
+            await asyncio.sleep(self.client.delay)
+        if self.client.error:
+            raise self.client.error
+
+        async def stream():
+            for piece in self.client.next_response():
+                yield _chunk(piece)
+
+        return stream()
+
+
+class FakeGenaiClient:
+    """
+    Mimics the parts of `google.genai.Client` used by document_processing.
+
+    `responses` are returned in order (the last one repeats); each is a string
+    or a dict (sent as JSON). Every call's contents are recorded in `calls`.
+    """
+
+    def __init__(self, responses=None, delay=0, error=None, chunk_size=40):
+        self.responses = list(responses or [{'is_valid': True, 'discrepancies': []}])
+        self.delay = delay
+        self.error = error
+        self.chunk_size = chunk_size
+        self.calls = []
+        self.models = _FakeModels(self)
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self))
+
+    def next_response(self):
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if not isinstance(response, str):
+            response = json.dumps(response)
+        return [response[i:i + self.chunk_size] for i in range(0, len(response), self.chunk_size)]
+
+    @property
+    def prompts(self):
+        return [' '.join(str(c) for c in call['contents']) for call in self.calls]
+
+
+@contextmanager
+def use_fake_gemini(client=None, **kwargs):
+    """Route get_gemini_client() to a FakeGenaiClient for the duration of the block."""
+    client = client or FakeGenaiClient(**kwargs)
+    with mock.patch('procure.document_processing.get_gemini_client', return_value=client):
+        yield client
+
+
+# --- Fixtures ----------------------------------------------------------
+
+def make_user(username, role=Role.STAFF, password='password123'):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password=password)
+    user.profile.role = role
+    user.profile.save()
+    return user
+
+
+def make_request(owner, items=None, vendor='Kigali Office Supplies', title='Office supplies', **fields):
+    from procure.models import PurchaseRequest, RequestItem
+
+    items = items or [('A4 Paper', 10, Decimal('25.00')), ('Toner', 2, Decimal('80.00'))]
+    amount = sum(qty * price for _, qty, price in items)
+    pr = PurchaseRequest.objects.create(
+        title=title, vendor=vendor, amount=amount, created_by=owner, **fields
+    )
+    RequestItem.objects.bulk_create([
+        RequestItem(request=pr, name=name, qty=qty, unit_price=price) for name, qty, price in items
+    ])
+    return pr
+
+
+def make_invoice_pdf(vendor='Kigali Office Supplies', items=None, invoice_number='INV-7781', date='2025-11-23',
+                     pages=1):
+    """
+    An invoice PDF with a text layer: heading, item table and totals, followed
+    by `pages` - 1 pages of terms and conditions.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Table, TableStyle
+
+    items = items or [('A4 Paper', 10, Decimal('25.00')), ('Toner', 2, Decimal('80.00'))]
+    total = sum(qty * price for _, qty, price in items)
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    pdf.setFont('Helvetica-Bold', 22)
+    pdf.drawString(50, 740, vendor)
+    pdf.setFont('Helvetica', 10)
+    pdf.drawString(50, 720, f'Invoice No: {invoice_number}')
+    pdf.drawString(50, 705, f'Date: {date}')
+
+    rows = [['Description', 'Qty', 'Unit Price', 'Amount']]
+    rows += [[name, str(qty), f'{price:.2f}', f'{qty * price:.2f}'] for name, qty, price in items]
+    table = Table(rows)
+    table.setStyle(TableStyle([('GRID', (0, 0), (-1, -1), 0.5, colors.black)]))
+    _, height = table.wrapOn(pdf, 400, 400)
+    table.drawOn(pdf, 50, 680 - height)
+    pdf.drawString(50, 650 - height, f'Total ${total:.2f}')
+    pdf.showPage()
+    for page in range(2, pages + 1):
+        pdf.setFont('Helvetica', 10)
+        pdf.drawString(50, 740, f'Terms and conditions (page {page} of {pages})')
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
@@ -1,3 +1,1089 @@
-from django.test import TestCase
+import csv
+import json
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from uuid import UUID
+from unittest import mock
 
-# Add tests later — focus on approval flow and concurrency scenarios
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, modify_settings, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import Profile, Role
+from procure import async_views
+from procure.concurrency import EditConflict
+from procure.document_processing import (
+    DocumentTooLarge, extract_document, iter_document_pages, receipt_po_data, save_provisional_validation,
+)
+from procure.idempotency import fingerprint
+from procure.invoice_fields import parse_invoice_fields, to_amount
+from procure.models import (
+    Approval, IdempotencyKey, MonthlyRequestStats, PurchaseOrder, PurchaseRequest, ReceiptValidation,
+)
+from procure.resilience import CircuitBreaker, CircuitOpen, ServiceUnavailable, reset_breakers
+from procure.seeding import seed_requests, seed_users, seeded_username
+from procure.testing import (
+    inject_storage_faults, make_invoice_pdf, make_request, make_user, set_stub_ocr_text, use_fake_gemini,
+)
+from procure_to_pay.schema import clear_schema_cache, committed_schema_is_current
+
+
+class ProcureTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user('staff_user', Role.STAFF)
+        cls.other_staff = make_user('other_staff', Role.STAFF)
+        cls.approver1 = make_user('approver1_user', Role.APPROVER_L1)
+        cls.approver2 = make_user('approver2_user', Role.APPROVER_L2)
+        cls.finance = make_user('finance_user', Role.FINANCE)
+        cls.admin = make_user('admin_user', Role.ADMIN)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class PurchaseRequestFlowTests(ProcureTestCase):
+    """create -> approve L1 -> approve L2 -> PO -> receipt, through the API."""
+
+    def create_request(self):
+        response = self.client_for(self.staff).post('/api/requests/', {
+            'title': 'Office supplies',
+            'vendor': 'Kigali Office Supplies',
+            'items': [
+                {'name': 'A4 Paper', 'qty': 10, 'unit_price': '25.00'},
+                {'name': 'Toner', 'qty': 2, 'unit_price': '80.00'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def approve(self, user, pk):
+        return self.client_for(user).patch(f'/api/requests/{pk}/approve/', {'comment': 'ok'}, format='json')
+
+    def test_full_flow(self):
+        created = self.create_request()
+        pk = created['id']
+        self.assertEqual(created['amount'], '410.00')
+        self.assertEqual(created['status'], PurchaseRequest.STATUS_PENDING)
+
+        response = self.approve(self.approver1, pk)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['detail'], 'Level 1 approval recorded.')
+
+        response = self.approve(self.approver2, pk)
+        self.assertEqual(response.status_code, 200, response.content)
+        po = PurchaseOrder.objects.get(request_id=pk)
+        self.assertEqual(po.content['total'], '410.00')
+        self.assertTrue(po.file_url.endswith('.pdf'))
+        self.assertEqual(PurchaseRequest.objects.get(pk=pk).status, PurchaseRequest.STATUS_APPROVED)
+
+        detail = self.client_for(self.staff).get(f'/api/requests/{pk}/').json()
+        self.assertEqual(detail['purchase_order'], po.file_url)
+
+        receipt = SimpleUploadedFile('receipt.pdf', make_invoice_pdf(), content_type='application/pdf')
+        with use_fake_gemini(responses=[{'is_valid': True, 'discrepancies': []}]) as gemini:
+            response = self.client_for(self.staff).post(
+                f'/api/requests/{pk}/submit-receipt/', {'receipt': receipt}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()['validation']['ok'])
+        self.assertEqual(len(gemini.calls), 1)
+        self.assertIn('"total":"410.00"', gemini.prompts[0])
+
+        validation = ReceiptValidation.objects.get(request_id=pk)
+        self.assertTrue(validation.is_valid)
+        self.assertEqual(validation.extracted_fields['vendor'], 'Kigali Office Supplies')
+        self.assertEqual(len(validation.extracted_fields['line_items']), 2)
+        self.assertLessEqual(validation.prompt_size['tokens'], validation.prompt_size['budget'])
+
+        pr = PurchaseRequest.objects.get(pk=pk)
+        self.assertTrue(pr.receipt_url)
+        self.assertEqual(len(pr.receipt_sha256), 64)
+
+    def test_resubmitting_same_receipt_reuses_validation(self):
+        pr = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+        PurchaseOrder.objects.create(request=pr, content={})
+        content = make_invoice_pdf()
+        with use_fake_gemini() as gemini:
+            for _ in range(2):
+                response = self.client_for(self.staff).post(
+                    f'/api/requests/{pr.pk}/submit-receipt/',
+                    {'receipt': SimpleUploadedFile('receipt.pdf', content)}, format='multipart'
+                )
+                self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(gemini.calls), 1)
+
+    def test_level_two_cannot_approve_before_level_one(self):
+        pk = self.create_request()['id']
+        response = self.approve(self.approver2, pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PurchaseOrder.objects.filter(request_id=pk).exists())
+
+    def test_reject_finalizes_request(self):
+        pk = self.create_request()['id']
+        response = self.client_for(self.approver1).patch(f'/api/requests/{pk}/reject/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PurchaseRequest.objects.get(pk=pk).status, PurchaseRequest.STATUS_REJECTED)
+        self.assertEqual(self.approve(self.approver1, pk).status_code, 400)
+
+    def test_only_owner_can_submit_receipt(self):
+        pr = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+        response = self.client_for(self.other_staff).post(
+            f'/api/requests/{pr.pk}/submit-receipt/',
+            {'receipt': SimpleUploadedFile('receipt.pdf', make_invoice_pdf())}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(DOCUMENT_UPLOAD_MAX_BYTES=1024)
+    def test_oversized_receipt_is_rejected(self):
+        pr = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+        response = self.client_for(self.staff).post(
+            f'/api/requests/{pr.pk}/submit-receipt/',
+            {'receipt': SimpleUploadedFile('receipt.pdf', b'x' * 4096)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('maximum size', response.json()['detail'])
+
+        request = RequestFactory().post(
+            f'/api/requests/{pr.pk}/submit-receipt/',
+            {'receipt': SimpleUploadedFile('receipt.pdf', b'x' * 4096)},
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}',
+        )
+        response = async_to_sync(async_views.submit_receipt)(request, pk=pr.pk)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('maximum size', json.loads(response.content)['detail'])
+
+    def test_po_vendor_comes_from_proforma_prefix(self):
+        from procure import document_processing
+
+        pr = make_request(self.staff, vendor='', proforma=SimpleUploadedFile(
+            'proforma.pdf', make_invoice_pdf(vendor='Acme Corp', pages=3)
+        ))
+        with mock.patch.object(document_processing, 'extract_document', wraps=extract_document) as extract:
+            po = document_processing.generate_po_for_request(pr, generated_by=self.approver2)
+        self.assertEqual(extract.call_args.kwargs['max_chars'], document_processing.PROFORMA_TEXT_CHARS)
+        self.assertEqual(po.content['vendor'], 'Acme Corp')
+
+
+class OptimisticConcurrencyTests(ProcureTestCase):
+    def edit(self, pr, title, if_match=None):
+        headers = {'HTTP_IF_MATCH': if_match} if if_match else {}
+        return self.client_for(self.staff).patch(f'/api/requests/{pr.pk}/', {'title': title}, format='json', **headers)
+
+    def test_if_match_guards_edits(self):
+        pr = make_request(self.staff)
+        response = self.client_for(self.staff).get(f'/api/requests/{pr.pk}/')
+        self.assertEqual(response['ETag'], '"1"')
+
+        response = self.edit(pr, 'First edit', if_match='"1"')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response['ETag'], response.json()['version']), ('"2"', 2))
+
+        # Made from the same read as the first edit
+        self.assertEqual(self.edit(pr, 'Second edit', if_match='"1"').status_code, 412)
+        self.assertEqual(self.edit(pr, 'Second edit', if_match='"one"').status_code, 412)
+        self.assertEqual(PurchaseRequest.objects.get(pk=pr.pk).title, 'First edit')
+
+    def test_edit_from_stale_read_conflicts(self):
+        from procure.serializers import PurchaseRequestSerializer
+
+        pr = make_request(self.staff)
+        first, second = PurchaseRequest.objects.get(pk=pr.pk), PurchaseRequest.objects.get(pk=pr.pk)
+        for instance, title in ((first, 'First edit'), (second, 'Second edit')):
+            serializer = PurchaseRequestSerializer(instance, data={'title': title}, partial=True)
+            serializer.is_valid(raise_exception=True)
+            if instance is first:
+                serializer.save()
+            else:
+                with self.assertRaises(EditConflict):
+                    serializer.save()
+        self.assertEqual(PurchaseRequest.objects.get(pk=pr.pk).title, 'First edit')
+
+    def test_decision_after_concurrent_edit_keeps_rollup_in_sync(self):
+        from django.db.models import Q
+
+        from procure.analytics import rebuild_monthly_stats
+        from procure.concurrency import conditional_update
+        from procure.serializers import PurchaseRequestSerializer
+
+        def rollup():
+            return sorted(MonthlyRequestStats.objects.filter(request_count__gt=0)
+                          .values_list('month', 'status', 'request_count', 'total_amount'))
+
+        pr = make_request(self.staff)
+        read_for_approval = PurchaseRequest.objects.get(pk=pr.pk)
+        serializer = PurchaseRequestSerializer(pr, data={'items': [{'name': 'Toner', 'qty': 1, 'unit_price': '80.00'}]},
+                                               partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.assertTrue(conditional_update(
+            read_for_approval, Q(status=PurchaseRequest.STATUS_PENDING), status=PurchaseRequest.STATUS_APPROVED,
+        ))
+        self.assertEqual(read_for_approval.amount, Decimal('80.00'))
+        incremental = rollup()
+        rebuild_monthly_stats()
+        self.assertEqual(incremental, rollup())
+
+    def test_decisions_are_conditional_updates(self):
+        pr = make_request(self.staff)
+        approve = f'/api/requests/{pr.pk}/approve/'
+        response = self.client_for(self.approver1).patch(approve, {}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual((response.status_code, response['ETag']), (200, '"2"'))
+        self.assertEqual(self.client_for(self.approver1).patch(approve, {}, format='json').status_code, 400)
+
+        # A stale If-Match records nothing
+        response = self.client_for(self.approver2).patch(approve, {}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 412)
+        self.assertFalse(pr.approvals.filter(level=2).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_for(self.approver2).patch(approve, {}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "procure_purchaserequest"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('EXISTS', updates[0])
+        pr.refresh_from_db()
+        self.assertEqual((pr.status, pr.version, pr.last_approved_by), (PurchaseRequest.STATUS_APPROVED, 3, self.approver2))
+        # The monthly rollup followed the status change
+        self.assertEqual(
+            dict(MonthlyRequestStats.objects.filter(request_count__gt=0).values_list('status', 'request_count')),
+            {PurchaseRequest.STATUS_APPROVED: 1},
+        )
+        response = self.client_for(self.approver1).patch(f'/api/requests/{pr.pk}/reject/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class IdempotencyKeyTests(ProcureTestCase):
+    body = {
+        'title': 'Office supplies',
+        'vendor': 'Kigali Office Supplies',
+        'items': [{'name': 'A4 Paper', 'qty': 10, 'unit_price': '25.00'}],
+    }
+
+    def create(self, key, **changes):
+        return self.client_for(self.staff).post(
+            '/api/requests/', {**self.body, **changes}, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retried_create_replays_the_response(self):
+        first = self.create('key-1')
+        self.assertEqual(first.status_code, 201, first.content)
+        retry = self.create('key-1')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(PurchaseRequest.objects.count(), 1)
+
+        self.assertEqual(self.create('key-1', title='Something else').status_code, 422)
+        self.assertEqual(self.create('key-2').status_code, 201)
+        self.assertEqual(PurchaseRequest.objects.count(), 2)
+
+    def test_key_held_while_the_call_runs(self):
+        running = IdempotencyKey.objects.create(
+            user=self.staff, key='key-1', fingerprint=fingerprint('POST', '/api/requests/', self.body),
+            locked_until=timezone.now() + timedelta(minutes=5),
+        )
+        response = self.create('key-1')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+
+        # Its process died: once the lock times out a retry runs the call
+        running.locked_until = timezone.now() - timedelta(seconds=1)
+        running.save()
+        self.assertEqual(self.create('key-1').status_code, 201)
+        self.assertEqual(PurchaseRequest.objects.count(), 1)
+
+    def test_retried_receipt_is_not_processed_again(self):
+        pr = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+        PurchaseOrder.objects.create(request=pr, content={})
+        content = make_invoice_pdf()
+
+        def submit():
+            return self.client_for(self.staff).post(
+                f'/api/requests/{pr.pk}/submit-receipt/',
+                {'receipt': SimpleUploadedFile('receipt.pdf', content)},
+                format='multipart', HTTP_IDEMPOTENCY_KEY='receipt-1',
+            )
+
+        # Failed calls free the key for the retry
+        with inject_storage_faults(error=OSError('storage is down')):
+            self.assertEqual(submit().status_code, 503)
+        with use_fake_gemini(), mock.patch('procure.views.extract_document', wraps=extract_document) as extract:
+            first, retry = submit(), submit()
+        self.assertEqual(first.status_code, 200, first.content)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(extract.call_count, 1)
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+        with override_settings(IDEMPOTENCY_KEY_TTL=0):
+            call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class AsyncReceiptViewTests(ProcureTestCase):
+    def setUp(self):
+        self.pr = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+        PurchaseOrder.objects.create(request=self.pr, content={})
+
+    def post_receipt(self, user=None, content=None, key=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+        if key:
+            headers['HTTP_IDEMPOTENCY_KEY'] = key
+        request = RequestFactory().post(
+            f'/api/requests/{self.pr.pk}/submit-receipt/',
+            {'receipt': SimpleUploadedFile('receipt.pdf', content or make_invoice_pdf())}, **headers
+        )
+        response = async_to_sync(async_views.submit_receipt)(request, pk=self.pr.pk)
+        request.close()  # the handler would close the spooled upload
+        return response.status_code, json.loads(response.content)
+
+    def test_submit_receipt(self):
+        content = make_invoice_pdf()
+        with use_fake_gemini(responses=[{'is_valid': False, 'discrepancies': ['Total differs']}]) as gemini:
+            status, body = self.post_receipt(self.staff, content)
+            self.assertEqual(status, 200, body)
+            self.assertEqual(body['validation'], {'ok': False, 'discrepancies': ['Total differs']})
+
+            status, body = self.post_receipt(self.staff, content)
+            self.assertEqual(body['detail'], 'Receipt already submitted and validated.')
+        self.assertEqual(len(gemini.calls), 1)
+
+        validation = ReceiptValidation.objects.get(request=self.pr)
+        self.assertFalse(validation.is_valid)
+        self.assertEqual(validation.extracted_fields['total'], '410.00')
+        self.pr.refresh_from_db()
+        self.assertTrue(self.pr.receipt_url)
+
+    def test_idempotency_key(self):
+        content = make_invoice_pdf()
+        with use_fake_gemini(), \
+                mock.patch('procure.async_views.extract_document', wraps=extract_document) as extract:
+            first = self.post_receipt(self.staff, content, key='receipt-1')
+            self.assertEqual(first[0], 200, first[1])
+            self.assertEqual(self.post_receipt(self.staff, content, key='receipt-1'), first)
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(self.post_receipt(self.staff, key='receipt-1')[0], 422)
+
+    def test_permissions(self):
+        self.assertEqual(self.post_receipt()[0], 401)
+        self.assertEqual(self.post_receipt(self.approver1)[0], 403)
+        self.assertEqual(self.post_receipt(self.other_staff)[0], 403)
+
+
+FAST_BREAKERS = {
+    name: {'timeout': 0.2, 'failure_threshold': 2, 'reset_timeout': 60} for name in ('gemini', 'storage')
+}
+
+
+@override_settings(CIRCUIT_BREAKERS=FAST_BREAKERS)
+class DegradedModeTests(ProcureTestCase):
+    def setUp(self):
+        reset_breakers()
+        self.addCleanup(reset_breakers)
+
+    def submit_receipt(self, pr):
+        return self.client_for(self.staff).post(
+            f'/api/requests/{pr.pk}/submit-receipt/',
+            {'receipt': SimpleUploadedFile('receipt.pdf', make_invoice_pdf())}, format='multipart'
+        )
+
+    def test_breaker_opens_then_lets_a_trial_call_through(self):
+        now = [0.0]
+        breaker = CircuitBreaker('test', timeout=1, failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        failing = mock.Mock(side_effect=ConnectionError('refused'))
+        for _ in range(2):
+            with self.assertRaises(ServiceUnavailable):
+                breaker.call(failing)
+        with self.assertRaises(CircuitOpen):
+            breaker.call(failing)
+        self.assertEqual(failing.call_count, 2)
+
+        now[0] = 11
+        self.assertEqual(breaker.metrics()['state'], 'half_open')
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.metrics(), {
+            'name': 'test', 'state': 'closed', 'consecutive_failures': 0, 'retry_after': 0,
+            'calls': 4, 'successes': 1, 'failures': 2, 'timeouts': 0, 'rejected': 1, 'opened': 1,
+        })
+
+    def test_cancelled_trial_call_reopens_the_circuit(self):
+        import asyncio
+
+        now = [0.0]
+        breaker = CircuitBreaker('test', timeout=5, failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        with self.assertRaises(ServiceUnavailable):
+            breaker.call(mock.Mock(side_effect=ConnectionError('refused')))
+        now[0] = 11
+
+        async def cancelled_trial():
+            trial = asyncio.ensure_future(breaker.acall(asyncio.sleep, 5))
+            await asyncio.sleep(0)
+            trial.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await trial
+
+        asyncio.run(cancelled_trial())
+        self.assertEqual(breaker.metrics()['state'], 'open')
+        self.assertFalse(breaker.trial_running)
+        now[0] = 22
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+
+    def test_slow_gemini_leaves_validation_pending_retry(self):
+        pr = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+        PurchaseOrder.objects.create(request=pr, content={})
+        with use_fake_gemini(delay=2), self.assertLogs('procure.document_processing', 'WARNING'):
+            response = self.submit_receipt(pr)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertTrue(response.json()['validation']['pending_retry'])
+        validation = ReceiptValidation.objects.get(request=pr)
+        self.assertTrue(validation.pending_retry)
+        self.assertEqual(validation.extracted_fields['total'], '410.00')
+
+        with use_fake_gemini() as gemini:
+            call_command('retry_pending', stdout=StringIO())
+        self.assertEqual(len(gemini.calls), 1)
+        validation.refresh_from_db()
+        self.assertFalse(validation.pending_retry)
+        self.assertTrue(validation.is_valid)
+
+    def test_timed_out_upload_stores_the_whole_file(self):
+        from django.core.files.uploadedfile import TemporaryUploadedFile
+
+        from procure.resilience import CallTimeout
+        from procure.storage import store_file
+
+        pr = make_request(self.staff)
+        data = make_invoice_pdf(pages=20)
+        upload = TemporaryUploadedFile('late.pdf', 'application/pdf', len(data), None)
+        upload.write(data)
+        name = pr.receipt.field.generate_filename(pr, 'late.pdf')
+        with inject_storage_faults(delay=0.5), self.assertRaises(CallTimeout):
+            store_file(pr.receipt, 'late.pdf', upload)
+        # The request ends and Django deletes its upload while the thread still waits
+        upload.close()
+
+        storage = pr.receipt.storage
+        for _ in range(50):
+            if storage.exists(name) and storage.size(name) == len(data):
+                break
+            time.sleep(0.05)
+        with storage.open(name) as stored:
+            self.assertEqual(stored.read(), data)
+        storage.delete(name)
+
+    def test_storage_outage(self):
+        pr = make_request(self.staff)
+        Approval.objects.create(request=pr, approver=self.approver1, approved=True, level=1)
+        with inject_storage_faults(error=OSError('storage is down')), \
+                self.assertLogs('procure.document_processing', 'WARNING'):
+            response = self.client_for(self.approver2).patch(f'/api/requests/{pr.pk}/approve/', {}, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertTrue(response.json()['po']['pending_retry'])
+
+            # Second failure in a row: the circuit opens and the upload isn't even attempted
+            response = self.submit_receipt(pr)
+            self.assertEqual(response.status_code, 503, response.content)
+            self.assertEqual(response['Retry-After'], '60')
+
+        metrics = self.client_for(self.admin).get('/api/metrics/breakers/').json()
+        storage = next(entry for entry in metrics if entry['name'] == 'storage')
+        self.assertEqual((storage['state'], storage['failures'], storage['opened']), ('open', 2, 1))
+        self.assertEqual(self.client_for(self.staff).get('/api/metrics/breakers/').status_code, 403)
+
+        reset_breakers()
+        call_command('retry_pending', stdout=StringIO())
+        po = PurchaseOrder.objects.get(request=pr)
+        self.assertFalse(po.pending_retry)
+        self.assertTrue(po.file_url.endswith('.pdf'))
+
+
+class HedgedValidationTests(TransactionTestCase):
+    """The late model verdict is saved from another thread, so these tests can't run inside a transaction."""
+
+    def setUp(self):
+        reset_breakers()
+        self.addCleanup(reset_breakers)
+        self.staff = make_user('staff_user', Role.STAFF)
+        self.pr = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+        PurchaseOrder.objects.create(request=self.pr, content={})
+
+    def test_local_matcher(self):
+        from io import BytesIO
+
+        from procure.receipt_matching import compare_locally
+
+        document = extract_document(BytesIO(make_invoice_pdf()))
+        po_data = receipt_po_data(self.pr)
+        self.assertEqual(compare_locally(po_data, document['text'], document['fields']),
+                         {'is_valid': True, 'discrepancies': []})
+        po_data.update(total='400.00', vendor='Acme Corp')
+        self.assertEqual(compare_locally(po_data, document['text'])['discrepancies'], [
+            "Vendor differs: PO 'Acme Corp', receipt 'Kigali Office Supplies'",
+            'Total differs: PO 400.00, receipt 410.00',
+        ])
+
+    @override_settings(RECEIPT_VALIDATION_DEADLINE=0.2)
+    def test_slow_model_gets_provisional_local_verdict(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        with use_fake_gemini(delay=1, responses=[{'is_valid': False, 'discrepancies': ['Toner brand differs']}]):
+            started = time.perf_counter()
+            response = client.post(
+                f'/api/requests/{self.pr.pk}/submit-receipt/',
+                {'receipt': SimpleUploadedFile('receipt.pdf', make_invoice_pdf())}, format='multipart'
+            )
+            self.assertLess(time.perf_counter() - started, 1)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(response.json()['validation'], {'ok': True, 'discrepancies': [], 'provisional': True})
+            self.assertTrue(ReceiptValidation.objects.get(request=self.pr).pending_retry)
+
+            # The model's verdict replaces the provisional one when it arrives
+            for _ in range(50):
+                validation = ReceiptValidation.objects.get(request=self.pr)
+                if not validation.provisional:
+                    break
+                time.sleep(0.1)
+        self.assertFalse(validation.provisional)
+        self.assertFalse(validation.pending_retry)
+        self.assertEqual(validation.validation_result, {'ok': False, 'discrepancies': ['Toner brand differs']})
+
+    def test_retry_pending_replaces_orphaned_provisional_verdict(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        with use_fake_gemini():
+            response = client.post(
+                f'/api/requests/{self.pr.pk}/submit-receipt/',
+                {'receipt': SimpleUploadedFile('receipt.pdf', make_invoice_pdf())}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        # The process died between saving the local verdict and the model answering
+        save_provisional_validation(self.pr, {'is_valid': True, 'discrepancies': []})
+
+        with use_fake_gemini(responses=[{'is_valid': False, 'discrepancies': ['Toner brand differs']}]) as gemini:
+            call_command('retry_pending', stdout=StringIO())
+        self.assertEqual(len(gemini.calls), 1)
+        validation = ReceiptValidation.objects.get(request=self.pr)
+        self.assertFalse(validation.provisional)
+        self.assertFalse(validation.pending_retry)
+        self.assertEqual(validation.discrepancies, ['Toner brand differs'])
+
+    @override_settings(RECEIPT_VALIDATION_DEADLINE=0.1)
+    def test_retry_pending_waits_for_a_slow_model(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        with use_fake_gemini():
+            client.post(
+                f'/api/requests/{self.pr.pk}/submit-receipt/',
+                {'receipt': SimpleUploadedFile('receipt.pdf', make_invoice_pdf())}, format='multipart'
+            )
+        save_provisional_validation(self.pr, {'is_valid': True, 'discrepancies': []})
+
+        out = StringIO()
+        with use_fake_gemini(delay=0.5, responses=[{'is_valid': False, 'discrepancies': ['Toner brand differs']}]):
+            call_command('retry_pending', stdout=out)
+        self.assertIn(f'Validated receipt for Request #{self.pr.pk}', out.getvalue())
+        self.assertIn('Completed, 0 still pending.', out.getvalue())
+        validation = ReceiptValidation.objects.get(request=self.pr)
+        self.assertFalse(validation.provisional)
+        self.assertFalse(validation.pending_retry)
+        self.assertEqual(validation.discrepancies, ['Toner brand differs'])
+
+    @override_settings(RECEIPT_VALIDATION_DEADLINE=0.2)
+    def test_async_view_answers_at_the_deadline(self):
+        request = RequestFactory().post(
+            f'/api/requests/{self.pr.pk}/submit-receipt/',
+            {'receipt': SimpleUploadedFile('receipt.pdf', make_invoice_pdf())},
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}',
+        )
+        with use_fake_gemini(delay=1):
+            response = async_to_sync(async_views.submit_receipt)(request, pk=self.pr.pk)
+        request.close()
+        self.assertEqual(json.loads(response.content)['validation'], {'ok': True, 'discrepancies': [], 'provisional': True})
+        validation = ReceiptValidation.objects.get(request=self.pr)
+        self.assertTrue(validation.provisional)
+        self.assertTrue(validation.pending_retry)
+
+
+class RoleVisibilityTests(ProcureTestCase):
+    def setUp(self):
+        self.pending = make_request(self.staff)
+        self.l1_approved = make_request(self.other_staff)
+        Approval.objects.create(request=self.l1_approved, approver=self.approver1, level=1, approved=True)
+        self.approved = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+
+    def listed_ids(self, user):
+        response = self.client_for(user).get('/api/requests/')
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.json()['results']}
+
+    def test_inboxes(self):
+        self.assertEqual(self.listed_ids(self.staff), {self.pending.pk, self.approved.pk})
+        self.assertEqual(self.listed_ids(self.approver1), {self.pending.pk, self.l1_approved.pk, self.approved.pk})
+        self.assertEqual(self.listed_ids(self.approver2), {self.l1_approved.pk})
+        self.assertEqual(self.listed_ids(self.finance), {self.approved.pk})
+
+
+class ExportAndAnalyticsTests(ProcureTestCase):
+    def setUp(self):
+        self.approved = make_request(self.staff, status=PurchaseRequest.STATUS_APPROVED)
+        Approval.objects.create(request=self.approved, approver=self.approver1, level=1, approved=True)
+        self.rejected = make_request(self.staff, vendor='Other Vendor')
+        self.rejected.status = PurchaseRequest.STATUS_REJECTED
+        self.rejected.save()
+
+    def test_csv_export_streams_one_row_per_item(self):
+        response = self.client_for(self.finance).get('/api/requests/export/')
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(len(lines), 3)  # header + two items
+        self.assertIn('approver1_user', lines[1])
+        rows = list(csv.DictReader(lines))
+        self.assertEqual((rows[0]['l1_approved'], rows[0]['l2_approved']), ('True', ''))
+
+    def test_export_requires_finance_or_admin(self):
+        self.assertEqual(self.client_for(self.staff).get('/api/requests/export/').status_code, 403)
+
+    def exported_ids(self, user, status):
+        response = self.client_for(user).get('/api/requests/export/', {'export_format': 'ndjson', 'status': status})
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line)['request_id'] for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_export_is_scoped_to_role(self):
+        self.assertEqual(self.exported_ids(self.finance, 'all'), [self.approved.pk])
+        self.assertEqual(self.exported_ids(self.finance, 'REJECTED'), [])
+        self.assertEqual(self.exported_ids(self.admin, 'all'), [self.approved.pk, self.rejected.pk])
+
+    def test_analytics_uses_rollup(self):
+        data = self.client_for(self.finance).get('/api/analytics/').json()
+        by_status = {row['status']: row for row in data['by_status']}
+        self.assertEqual(by_status['APPROVED']['count'], 1)
+        self.assertEqual(by_status['REJECTED']['count'], 1)
+        self.assertEqual(by_status['PENDING']['count'], 0)
+        self.assertEqual(data['rejection_rate'], 0.5)
+        self.assertEqual(data['spend_per_vendor'][0]['total_amount'], '410.00')
+        self.assertEqual(data['approval_latency_seconds']['level_1']['count'], 1)
+
+    def test_rebuild_matches_incremental_rollup(self):
+        before = list(MonthlyRequestStats.objects.filter(request_count__gt=0).values_list('status', 'request_count', 'total_amount'))
+        call_command('rebuild_request_stats', stdout=StringIO())
+        after = list(MonthlyRequestStats.objects.values_list('status', 'request_count', 'total_amount'))
+        self.assertEqual(sorted(before), sorted(after))
+
+    def rollup(self):
+        return sorted(MonthlyRequestStats.objects.filter(request_count__gt=0).values_list('status', 'request_count'))
+
+    def test_migration_backfills_rollup(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        expected = self.rollup()
+        MonthlyRequestStats.objects.all().delete()
+        import_module('procure.migrations.0007_monthlyrequeststats').backfill_monthly_stats(apps, None)
+        self.assertEqual(self.rollup(), expected)
+
+    def test_decrement_without_row_rebuilds_rollup(self):
+        # Requests that predate the rollup
+        MonthlyRequestStats.objects.all().delete()
+        pending = make_request(self.staff)
+        MonthlyRequestStats.objects.all().delete()
+
+        pending.status = PurchaseRequest.STATUS_APPROVED
+        with self.assertLogs('procure.analytics', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            pending.save()
+        self.assertEqual(self.rollup(), [('APPROVED', 2), ('REJECTED', 1)])
+
+@modify_settings(MIDDLEWARE={'prepend': 'procure_to_pay.middleware.BenchmarkHeadersMiddleware'})
+class BenchmarkHeadersTests(ProcureTestCase):
+    def test_reports_queries_and_connection_churn(self):
+        make_request(self.staff)
+        response = self.client_for(self.staff).get('/api/requests/')
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        # The test connection is already open, so the request reused it
+        self.assertEqual(response['X-DB-Connections-Opened'], '0')
+
+
+class SeedingTests(TestCase):
+    def test_seeded_data_is_consistent(self):
+        users = seed_users(20, prefix='bench')
+        self.assertEqual(sum(len(ids) for ids in users.values()), 20)
+        self.assertTrue(User.objects.filter(username=seeded_username(Role.FINANCE, 0, 'bench')).exists())
+        self.assertEqual(Profile.objects.filter(user__username__startswith='bench_').count(), 20)
+
+        approvers = {1: users[Role.APPROVER_L1], 2: users[Role.APPROVER_L2]}
+        seed_requests(users[Role.STAFF], 200, approvers, batch_size=64)
+        self.assertEqual(PurchaseRequest.objects.count(), 200)
+        self.assertGreater(len({pr.created_at.date() for pr in PurchaseRequest.objects.all()}), 1)
+        for pr in PurchaseRequest.objects.prefetch_related('items', 'approvals'):
+            self.assertEqual(pr.amount, sum(item.total_price for item in pr.items.all()))
+            decisions = sorted((a.level, a.approved) for a in pr.approvals.all())
+            if pr.status == PurchaseRequest.STATUS_APPROVED:
+                self.assertEqual(decisions, [(1, True), (2, True)])
+                self.assertEqual(pr.po_obj.content['total'], str(pr.amount))
+            elif pr.status == PurchaseRequest.STATUS_REJECTED:
+                self.assertIn(decisions, ([(1, False)], [(1, True), (2, False)]))
+            else:
+                self.assertIn(decisions, ([], [(1, True)]))
+        invalid = ReceiptValidation.objects.filter(is_valid=False).select_related('request')
+        self.assertTrue(invalid.exists())
+        for validation in invalid:
+            self.assertRegex(validation.discrepancies[0], rf'^Total differs: PO {validation.request.amount}, receipt ')
+            self.assertEqual(validation.validation_result['discrepancies'], validation.discrepancies)
+
+    def test_seed_load_command(self):
+        out = StringIO()
+        call_command('seed_load', users=10, requests=30, batch_size=7, stdout=out, stderr=StringIO())
+        self.assertEqual(PurchaseRequest.objects.count(), 30)
+        self.assertEqual(
+            MonthlyRequestStats.objects.aggregate(n=Sum('request_count'))['n'], 30
+        )
+        self.assertIn('purchase requests: +30', out.getvalue())
+
+
+class DocumentExtractionTests(SimpleTestCase):
+    def test_structured_fields_from_pdf(self):
+        from io import BytesIO
+
+        document = extract_document(BytesIO(make_invoice_pdf()))
+        fields = document['fields']
+        self.assertEqual(fields['vendor'], 'Kigali Office Supplies')
+        self.assertEqual(fields['invoice_number'], 'INV-7781')
+        self.assertEqual(fields['dates'], ['2025-11-23'])
+        self.assertEqual(fields['total'], '410.00')
+        self.assertEqual(
+            fields['line_items'][0],
+            {'name': 'A4 Paper', 'qty': 10, 'unit_price': '25.00', 'total': '250.00'},
+        )
+
+    def test_page_limit(self):
+        from io import BytesIO
+
+        self.assertEqual(extract_document(BytesIO(make_invoice_pdf()), max_pages=1)['fields']['total'], '410.00')
+        with self.assertRaises(DocumentTooLarge):
+            extract_document(BytesIO(make_invoice_pdf(pages=2)), max_pages=1)
+
+    def test_max_chars_stops_reading_pages(self):
+        from io import BytesIO
+
+        from procure import document_processing
+
+        pages_read = []
+
+        def iter_pages(*args, **kwargs):
+            for page in iter_document_pages(*args, **kwargs):
+                pages_read.append(page['number'])
+                yield page
+
+        with mock.patch.object(document_processing, 'iter_document_pages', iter_pages):
+            document = extract_document(BytesIO(make_invoice_pdf(pages=3)), max_chars=50)
+        self.assertEqual(pages_read, [1])
+        self.assertEqual(len(document['text']), 50)
+        self.assertEqual(document['fields']['vendor'], 'Kigali Office Supplies')
+
+    def test_unreadable_document_is_logged(self):
+        from io import BytesIO
+
+        with self.assertLogs('procure.document_processing', 'WARNING') as logs:
+            document = extract_document(BytesIO(b'neither a PDF nor an image'))
+        self.assertEqual(document['text'], '')
+        self.assertIn('OCR of image document failed', logs.output[0])
+
+    def test_image_goes_through_ocr_backend(self):
+        from io import BytesIO
+        from PIL import Image
+
+        image = BytesIO()
+        Image.new('RGB', (20, 20), 'white').save(image, format='PNG')
+        image.seek(0)
+        with set_stub_ocr_text('Corner Shop\nTotal $12.50'):
+            pages = list(iter_document_pages(image))
+        self.assertTrue(pages[0]['ocr'])
+        self.assertEqual(parse_invoice_fields(pages[0]['text'])['total'], '12.50')
+
+    def test_pdf_engines_agree(self):
+        from io import BytesIO
+
+        invoice = make_invoice_pdf()
+        with override_settings(PDF_TEXT_ENGINE='procure.pdf_engines.PdfminerEngine'):
+            reference = extract_document(BytesIO(invoice))
+        self.assertEqual(extract_document(BytesIO(invoice)), reference)
+        pages = list(iter_document_pages(BytesIO(invoice), with_fields=True))
+        self.assertEqual(pages[0]['engine'], 'pdfium+tables')
+        self.assertEqual(pages[0]['heading'], 'Kigali Office Supplies')
+
+    def test_page_routing(self):
+        from procure.pdf_engines import route_page
+
+        self.assertEqual(route_page('Total $410.00 paid by card'), 'text')
+        self.assertEqual(route_page('  12 \n'), 'ocr')
+        self.assertEqual(route_page('\ufffd\ufffd\ufffd Invoice \ufffd\ufffd total 410'), 'layout')
+        self.assertEqual(route_page('.... ,,,, ---- //// :: 1'), 'layout')
+
+    def test_text_line_items_and_amounts(self):
+        fields = parse_invoice_fields('Vendor: ACME\nPaper 2 25.00 50.00\nSubtotal 50.00\nVAT 9.00\nTotal $59.00')
+        self.assertEqual(fields['vendor'], 'ACME')
+        self.assertEqual((fields['subtotal'], fields['tax'], fields['total']), ('50.00', '9.00', '59.00'))
+        self.assertEqual(fields['line_items'][0]['qty'], 2)
+        self.assertEqual(to_amount('$1,234.5'), '1234.50')
+
+
+class ReceiptPromptTests(SimpleTestCase):
+    po_data = {
+        'vendor': 'Kigali Office Supplies',
+        'total': '410.00',
+        'items': [
+            {'name': 'A4 Paper', 'qty': 10, 'unit_price': '25.00', 'total': '250.00'},
+            {'name': 'Toner', 'qty': 2, 'unit_price': '80.00', 'total': '160.00'},
+        ],
+    }
+    receipt = (
+        'KIGALI   OFFICE SUPPLIES\nReceipt No: R-5512\n********************\n'
+        'Thank you for shopping with us!\nCashier: Jean  Terminal 04\nCard number ************4821\n'
+        'A4 Paper 10 25.00 250.00\nToner 2 80.00 160.00\nLoyalty points earned: 41\n'
+        'Subtotal 347.46\nVAT 62.54\nTotal 410.00\nThank you for shopping with us!\n'
+    )
+
+    def test_keeps_relevant_lines_only(self):
+        from procure.prompting import build_receipt_prompt
+
+        prompt, size = build_receipt_prompt(self.po_data, self.receipt, budget=2000)
+        self.assertIn('KIGALI OFFICE SUPPLIES\nReceipt No: R-5512\nA4 Paper 10 25.00 250.00', prompt)
+        self.assertIn('Toner | 2 | 80.00 | 160.00', prompt)
+        for noise in ('Thank you', 'Cashier', '4821', '****', 'Loyalty'):
+            self.assertNotIn(noise, prompt)
+        self.assertEqual((size['receipt_lines'], size['receipt_lines_sent']), (8, 7))
+        self.assertLess(size['chars'], 1000)
+
+    def test_budget_drops_least_relevant_lines_first(self):
+        from procure.prompting import build_receipt_prompt, estimate_tokens
+
+        fixed = build_receipt_prompt(self.po_data, '', budget=2000)[1]['tokens']
+        totals = 'Subtotal 347.46\nVAT 62.54\nTotal 410.00'
+        prompt, size = build_receipt_prompt(self.po_data, self.receipt, budget=fixed + estimate_tokens(totals) + 3)
+        self.assertIn(totals, prompt)
+        self.assertNotIn('A4 Paper 10', prompt)
+        self.assertEqual(size['receipt_lines_sent'], 3)
+        self.assertFalse(size['over_budget'])
+
+    def test_repeated_item_lines_are_kept(self):
+        from procure.prompting import build_receipt_prompt, normalize_lines
+
+        receipt = 'Kigali Office Supplies\nToner 80.00\nToner 80.00\nTotal 160.00\nKigali Office Supplies\n'
+        self.assertEqual(normalize_lines(receipt), [
+            'Kigali Office Supplies', 'Toner 80.00', 'Toner 80.00', 'Total 160.00',
+        ])
+        prompt = build_receipt_prompt(self.po_data, receipt, budget=2000)[0]
+        self.assertIn('Toner 80.00\nToner 80.00\nTotal 160.00', prompt)
+
+
+class OcrBackendTests(SimpleTestCase):
+    def setUp(self):
+        from procure import ocr
+
+        for name in ('_pool', '_unavailable'):
+            patcher = mock.patch.object(ocr, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_engine_is_loaded_once_and_reused(self):
+        from procure import ocr
+
+        class FakeApi:
+            def SetImage(self, image):
+                self.image = image
+
+            def GetUTF8Text(self):
+                return f'text of {self.image}'
+
+            def Clear(self):
+                self.image = None
+
+        factory = mock.Mock(side_effect=FakeApi)
+        with mock.patch.object(ocr, '_tesserocr_engine', factory):
+            texts = [ocr.image_to_string(f'page-{n}') for n in range(3)]
+        self.assertEqual(texts, ['text of page-0', 'text of page-1', 'text of page-2'])
+        self.assertEqual(factory.call_count, 1)
+
+    def test_waiter_takes_over_when_engine_creation_fails(self):
+        import threading
+        from procure.ocr import EnginePool
+
+        creating, fail = threading.Event(), threading.Event()
+
+        def factory():
+            if factory.calls == 0:
+                factory.calls += 1
+                creating.set()
+                fail.wait(5)
+                raise RuntimeError('no language data')
+            return 'engine'
+        factory.calls = 0
+
+        pool = EnginePool(factory, size=1)
+        errors, engines = [], []
+
+        def first():
+            try:
+                with pool.engine():
+                    pass
+            except RuntimeError as exc:
+                errors.append(exc)
+
+        def waiter():
+            with pool.engine() as engine:
+                engines.append(engine)
+
+        threads = [threading.Thread(target=first, daemon=True)]
+        threads[0].start()
+        creating.wait(5)
+        # The only slot is taken by the engine being created: this one waits
+        threads.append(threading.Thread(target=waiter, daemon=True))
+        threads[1].start()
+        fail.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual((len(errors), engines), (1, ['engine']))
+
+    def test_falls_back_to_pytesseract(self):
+        from procure import ocr
+
+        unavailable = mock.Mock(side_effect=ocr.EngineUnavailable('tesserocr is not installed'))
+        with mock.patch.object(ocr, '_tesserocr_engine', unavailable), \
+                mock.patch.object(ocr, 'pytesseract_image_to_string', return_value='from pytesseract'):
+            with self.assertLogs('procure.ocr', 'WARNING'):
+                self.assertEqual(ocr.image_to_string('page'), 'from pytesseract')
+            self.assertEqual(ocr.image_to_string('page'), 'from pytesseract')
+        self.assertEqual(unavailable.call_count, 1)
+
+
+class ImagePreprocessingTests(SimpleTestCase):
+    @staticmethod
+    def page_photo(skew):
+        """A page of 'text lines' photographed on a dark table, `skew` degrees off."""
+        from PIL import Image, ImageDraw
+
+        page = Image.new('L', (850, 1100), 235)
+        draw = ImageDraw.Draw(page)
+        for top in range(100, 700, 40):
+            draw.rectangle((80, top, 80 + (top * 7) % 500 + 200, top + 14), fill=30)
+        photo = Image.new('L', (1200, 1400), 60)
+        photo.paste(page, (175, 150))
+        return photo.rotate(skew, resample=Image.BILINEAR, fillcolor=60)
+
+    def test_skew_is_measured(self):
+        from procure.image_preprocessing import skew_angle
+
+        for skew in (-3, 2.5):
+            self.assertAlmostEqual(skew_angle(self.page_photo(skew)), -skew, delta=0.5)
+
+    def test_photo_is_oriented_cropped_and_levelled(self):
+        from io import BytesIO
+
+        from PIL import Image
+
+        from procure.image_preprocessing import find_page, prepare_for_ocr, skew_angle
+
+        photo = self.page_photo(3)
+        box = find_page(photo)[0]
+        self.assertLess((box[2] - box[0]) * (box[3] - box[1]), photo.width * photo.height * 0.7)
+
+        # Stored sideways, with the EXIF tag that turns it upright
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        photo.transpose(Image.ROTATE_90).save(buffer, format='JPEG', exif=exif)
+        prepared = prepare_for_ocr(Image.open(buffer))
+        self.assertEqual(prepared.mode, 'L')
+        self.assertLess(prepared.width, 850)
+        self.assertLess(prepared.height, prepared.width * 1.2)
+        self.assertEqual(skew_angle(prepared), 0)
+        # Paper is white after binarizing, whatever the lighting
+        self.assertEqual(prepared.getpixel((5, 5)), 255)
+
+
+class FastJSONTests(SimpleTestCase):
+    data = {
+        'amount': Decimal('410.50'),
+        'created_at': datetime(2025, 11, 23, 9, 30, 15, 120000, tzinfo=dt_timezone.utc),
+        'due': date(2025, 12, 1),
+        'id': UUID('12345678-1234-5678-1234-567812345678'),
+        'title': 'Caf\u00e9 supplies \u2028 line',
+        'items': [{'qty': 2, 'unit_price': '80.00'}],
+        7: None,
+    }
+
+    def test_renders_like_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        from procure_to_pay.renderers import FastJSONRenderer
+
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        # Indented output is left to DRF
+        indented = FastJSONRenderer().render(self.data, 'application/json; indent=2')
+        self.assertEqual(indented, JSONRenderer().render(self.data, 'application/json; indent=2'))
+
+    def test_parses_like_drf(self):
+        from io import BytesIO
+
+        from rest_framework.exceptions import ParseError
+        from rest_framework.parsers import JSONParser
+        from procure_to_pay.renderers import FastJSONParser
+
+        body = '{"title": "Caf\u00e9", "items": [{"qty": 2, "unit_price": "80.00"}]}'.encode()
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"title": NaN}'))
+
+
+class SchemaTests(SimpleTestCase):
+    def setUp(self):
+        clear_schema_cache()
+        self.addCleanup(clear_schema_cache)
+
+    def test_committed_schema_is_current(self):
+        self.assertTrue(committed_schema_is_current(), (
+            'openapi.yaml is stale; regenerate it with '
+            'DJANGO_SETTINGS_MODULE=procure_to_pay.settings_test python manage.py spectacular --file openapi.yaml'
+        ))
+
+    def test_schema_served_from_committed_file_with_etag(self):
+        from django.conf import settings
+
+        client = APIClient()
+        with mock.patch('procure_to_pay.schema.generate_schema') as generate:
+            response = client.get('/api/schema/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, settings.OPENAPI_SCHEMA_FILE.read_bytes())
+            etag = response['ETag']
+
+            response = client.get('/api/schema/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+            response = client.get('/api/schema/?format=json')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertIn('/api/requests/', json.loads(response.content)['paths'])
+        generate.assert_not_called()
+
+
+class ImportTimeTests(SimpleTestCase):
+    def test_document_libraries_stay_out_of_worker_boot(self):
+        from benchmarks.boot import probe
+
+        result = probe('procure_to_pay.settings_test')
+        self.assertEqual(result['lazy_loaded'], [])
@@ -0,0 +1,100 @@
+"""
+Upload handling for receipts and proformas.
+
+HashingTemporaryFileUploadHandler replaces Django's default memory/temp-file
+pair: every uploaded file is spooled to a temporary file on disk chunk by chunk
+while its SHA-256 is computed, so nothing is buffered in memory and oversized
+uploads are cut off as soon as they cross DOCUMENT_UPLOAD_MAX_BYTES. Text
+extraction and the storage upload then both read from that same spooled file.
+
+Oversized uploads get 413 (RequestTooLarge) through LimitedMultiPartParser
+and the async views, not DRF's generic 400 parse error.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from django.template.defaultfilters import filesizeformat
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import MultiPartParser
+
+# Allowance for the multipart envelope and ordinary form fields when rejecting
+# a request up front from its Content-Length
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(MultiPartParserError):
+    """Raised while parsing; LimitedMultiPartParser turns it into RequestTooLarge."""
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+def _limit_message(max_bytes):
+    return f"Uploaded file exceeds the maximum size of {filesizeformat(max_bytes)}."
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Spool uploads to disk while hashing them, enforcing DOCUMENT_UPLOAD_MAX_BYTES."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        max_bytes = settings.DOCUMENT_UPLOAD_MAX_BYTES
+        if max_bytes and content_length and content_length > max_bytes + FORM_OVERHEAD_BYTES:
+            raise UploadTooLarge(_limit_message(max_bytes))
+        return super().handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        max_bytes = settings.DOCUMENT_UPLOAD_MAX_BYTES
+        if max_bytes and self.received > max_bytes:
+            self.file.close()  # removes the partial temp file
+            raise UploadTooLarge(_limit_message(max_bytes))
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+class LimitedMultiPartParser(MultiPartParser):
+    """DRF's MultiPartParser, answering 413 instead of 400 when an upload is over the limit."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return super().parse(stream, media_type, parser_context)
+        except ParseError as exc:
+            # DRF raises ParseError while handling the handler's UploadTooLarge
+            if isinstance(exc.__context__, UploadTooLarge):
+                raise RequestTooLarge(str(exc.__context__)) from exc.__context__
+            raise
+
+
+def uploaded_file_sha256(uploaded):
+    """SHA-256 of an uploaded file, computed while streaming if the handler didn't."""
+    digest = getattr(uploaded, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in uploaded.chunks():
+        hasher.update(chunk)
+    uploaded.seek(0)
+    return hasher.hexdigest()
+
+
+def uploaded_file_source(uploaded):
+    """Path of the spooled temp file when there is one, else the file object itself."""
+    if hasattr(uploaded, 'temporary_file_path'):
+        return uploaded.temporary_file_path()
+    return uploaded
@@ -1,8 +1,20 @@
 from rest_framework.routers import DefaultRouter
-from procure.views import PurchaseRequestViewSet
+from procure.views import PurchaseRequestViewSet, AnalyticsView, BreakerMetricsView
+from procure import async_views
+from django.conf import settings
 from django.urls import path
 
 router = DefaultRouter()
 router.register('requests', PurchaseRequestViewSet, basename='requests')
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('metrics/breakers/', BreakerMetricsView.as_view(), name='breaker-metrics'),
+] + router.urls
+
+
+if settings.ASYNC_RECEIPT_VIEWS:
+    # ASGI deployments: serve receipt submission from the async view (same URL and contract)
+    urlpatterns.insert(0, path(
+        'requests/<int:pk>/submit-receipt/', async_views.submit_receipt, name='requests-submit-receipt-async'
+    ))
@@ -1,32 +1,70 @@
+import math
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.parsers import FormParser
 from rest_framework.permissions import IsAuthenticated
 from asgiref.sync import async_to_sync
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect as django_redirect
 
 from procure.models import PurchaseRequest, Approval
 from procure.serializers import PurchaseRequestSerializer, PurchaseOrderSerializer
-from procure.document_processing import generate_po_for_request, validate_receipt_against_po_with_text, extract_text_from_pdf
-
-from drf_spectacular.utils import extend_schema, OpenApiResponse, inline_serializer
+from procure.document_processing import generate_po_for_request, validate_receipt_against_po_with_text, extract_document
+from procure.analytics import dashboard
+from procure.document_cache import cache_uploaded_copy
+from procure.uploads import LimitedMultiPartParser, uploaded_file_sha256, uploaded_file_source
+from procure.resilience import ServiceUnavailable, breaker_metrics
+from procure.idempotency import idempotent
+from procure.concurrency import conditional_update, conflict, etag, if_match_version, PreconditionFailed
+from procure.storage import store_file
+from procure.exports import EXPORT_FORMATS, CONTENT_TYPES, export_queryset, iter_export
+
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse, inline_serializer
 from rest_framework import serializers as drf_serializers
 from accounts.permissions import IsInRoles, IsFinance
-import cloudinary
 
 
+from procure_to_pay.renderers import FastJSONParser
 from procure_to_pay.utils import RequestPagination
 from rest_framework import viewsets, filters
 from rest_framework.permissions import IsAuthenticated
 from asgiref.sync import async_to_sync
 
+
+def service_unavailable_response(exc):
+    """503 with Retry-After for a dependency that failed, timed out or has its circuit open."""
+    return Response(
+        {"detail": f"{exc}. Please try again later."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(math.ceil(exc.retry_after or 0) or 1)},
+    )
+
+
+IF_MATCH_PARAMETER = OpenApiParameter(
+    "If-Match", str, OpenApiParameter.HEADER, required=False,
+    description="ETag (version) of the request as last read; a stale one gets 412",
+)
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    "Idempotency-Key", str, OpenApiParameter.HEADER, required=False,
+    description="Unique per call; retries with the same key get the first call's response",
+)
+
+
 class PurchaseRequestViewSet(viewsets.ModelViewSet):
-    queryset = PurchaseRequest.objects.all().prefetch_related("items")
+    queryset = (
+        PurchaseRequest.objects.all()
+        .select_related("po_obj", "receipt_validation")
+        .prefetch_related("items")
+    )
     serializer_class = PurchaseRequestSerializer
     pagination_class = RequestPagination
-    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    parser_classes = [LimitedMultiPartParser, FormParser, FastJSONParser]
 
     # Enable search & filters
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -60,6 +98,8 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsInRoles(["staff", "approver_l1", "approver_l2", "finance" ,"admin"])]
         if self.action == "submit_receipt":
             return [IsAuthenticated(), IsInRoles(["staff"])]
+        if self.action == "export":
+            return [IsAuthenticated(), IsInRoles(["finance", "admin"])]
         # default: require authentication
         return [IsAuthenticated()]
 
@@ -68,30 +108,48 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
         if not hasattr(user, "profile"):
             return self.queryset.none()
 
-        role = user.profile.role
+        return self.queryset.for_role(user.profile.role, user)
 
-        if role == "staff":
-            # Staff see only their own requests
-            return self.queryset.filter(created_by=user).order_by('-created_at')
-        
-        elif role == "approver_l1":
-            # Approver 1 sees all requests
-            return self.queryset.all().order_by('-created_at')
-        
-        elif role == "approver_l2":
-            # Approver 2 only sees requests approved by Approver 1
-            return self.queryset.filter(approvals__level=1, approvals__approved=True).order_by('-created_at')
-        
-        elif role == "finance":
-            # Finance only sees requests approved by Approver 2 (status is APPROVED)
-            return self.queryset.filter(status="APPROVED").order_by('-created_at')
-        
-        elif role == "admin":
-            # Admin sees all requests
-            return self.queryset.all().order_by('-created_at')
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ("update", "partial_update"):
+            context["expected_version"] = if_match_version(self.request)
+        return context
 
-        # Everything else: nothing
-        return self.queryset.none()
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response["ETag"] = etag(response.data["version"])
+        return response
+
+    @extend_schema(
+        parameters=[IF_MATCH_PARAMETER],
+        responses={
+            200: PurchaseRequestSerializer,
+            409: OpenApiResponse(description="Changed by someone else meanwhile"),
+            412: OpenApiResponse(description="If-Match is stale"),
+        },
+    )
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response["ETag"] = etag(response.data["version"])
+        return response
+
+    def decision_conflict_response(self, pr, expected_version, level):
+        """Why an approval or rejection's conditional update didn't apply."""
+        error = conflict(pr, expected_version)
+        if isinstance(error, PreconditionFailed):
+            raise error
+        if pr.status != PurchaseRequest.STATUS_PENDING:
+            return Response(
+                {"detail": "Request is already finalized."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if self.action == "approve" and level == 2:
+            return Response(
+                {"detail": "Cannot approve at Level 2 before Level 1 approval."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        raise error
 
     @extend_schema(
         description="""
@@ -109,8 +167,13 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
     @extend_schema(
         request=PurchaseRequestSerializer,
         responses={201: PurchaseRequestSerializer},
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
         description="Create a new purchase request"
     )
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         # only staff can reach here due to get_permissions
         serializer.save()
@@ -136,10 +199,13 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
             ),
             400: OpenApiResponse(description="Bad Request"),
             403: OpenApiResponse(description="Forbidden"),
+            412: OpenApiResponse(description="If-Match is stale"),
         },
+        parameters=[IF_MATCH_PARAMETER, IDEMPOTENCY_KEY_PARAMETER],
         description="Approve a purchase request. L1 approves, L2 finalizes + generates PO."
     )
     @action(detail=True, methods=["patch"], url_path="approve")
+    @idempotent
     def approve(self, request, pk=None):
         user = request.user
         pr = get_object_or_404(PurchaseRequest, pk=pk)
@@ -163,42 +229,47 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
             )
 
         comment = request.data.get("comment", "")
-
-        with transaction.atomic():
-            pr = PurchaseRequest.objects.select_for_update().get(pk=pr.pk)
-
-            if Approval.objects.filter(request=pr, approver=user, level=level).exists():
-                return Response(
-                    {"detail": "You already approved this request."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            Approval.objects.create(
-                request=pr,
-                approver=user,
-                approved=True,
-                level=level,
-                comment=comment,
+        expected_version = if_match_version(request)
+        conditions = [Q(status=PurchaseRequest.STATUS_PENDING)]
+        changes = {"last_approved_by": user}
+        if level == 2:
+            conditions.append(Exists(Approval.objects.filter(request=OuterRef("pk"), level=1, approved=True)))
+            changes["status"] = PurchaseRequest.STATUS_APPROVED
+
+        # One conditional UPDATE instead of a row lock: concurrent decisions
+        # on the request don't wait on each other, at most one of them applies
+        try:
+            with transaction.atomic():
+                updated = conditional_update(pr, *conditions, version=expected_version, **changes)
+                if updated:
+                    Approval.objects.create(
+                        request=pr,
+                        approver=user,
+                        approved=True,
+                        level=level,
+                        comment=comment,
+                    )
+        except IntegrityError:
+            return Response(
+                {"detail": "You already approved this request."},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-            if level == 1:
-                return Response({"detail": "Level 1 approval recorded."})
+        if not updated:
+            return self.decision_conflict_response(pr, expected_version, level)
 
-            if not pr.approvals.filter(level=1, approved=True).exists():
-                return Response(
-                    {"detail": "Cannot approve at Level 2 before Level 1 approval."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        if level == 1:
+            return Response({"detail": "Level 1 approval recorded."}, headers={"ETag": etag(pr.version)})
 
-            pr.status = PurchaseRequest.STATUS_APPROVED
-            pr.save()
-
-            po = generate_po_for_request(pr)
-            po_data = PurchaseOrderSerializer(po).data
+        # Rendered after the commit, with no lock held; if this fails the
+        # request stays approved and `manage.py generate_missing_pos` makes the PO
+        po = generate_po_for_request(pr)
+        po_data = PurchaseOrderSerializer(po).data
 
         return Response(
             {"detail": "Purchase request approved.", "po": po_data},
-            status=status.HTTP_200_OK
+            status=status.HTTP_200_OK,
+            headers={"ETag": etag(pr.version)},
         )
 
     @extend_schema(
@@ -208,6 +279,7 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 "comment": drf_serializers.CharField(required=False, allow_blank=True)
             }
         ),
+        parameters=[IF_MATCH_PARAMETER],
         description="Reject a purchase request"
     )
     @action(detail=True, methods=["patch"], url_path="reject")
@@ -230,22 +302,33 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
             )
 
         comment = request.data.get("comment", "")
+        expected_version = if_match_version(request)
+        level = 1 if role == "approver_l1" else 2
 
-        with transaction.atomic():
-            pr = PurchaseRequest.objects.select_for_update().get(pk=pr.pk)
-
-            Approval.objects.create(
-                request=pr,
-                approver=user,
-                approved=False,
-                level=1 if role == "approver_l1" else 2,
-                comment=comment,
+        try:
+            with transaction.atomic():
+                updated = conditional_update(
+                    pr, Q(status=PurchaseRequest.STATUS_PENDING), version=expected_version,
+                    status=PurchaseRequest.STATUS_REJECTED,
+                )
+                if updated:
+                    Approval.objects.create(
+                        request=pr,
+                        approver=user,
+                        approved=False,
+                        level=level,
+                        comment=comment,
+                    )
+        except IntegrityError:
+            return Response(
+                {"detail": "You already decided on this request."},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-            pr.status = PurchaseRequest.STATUS_REJECTED
-            pr.save()
+        if not updated:
+            return self.decision_conflict_response(pr, expected_version, level)
 
-        return Response({"detail": "Purchase request rejected."})
+        return Response({"detail": "Purchase request rejected."}, headers={"ETag": etag(pr.version)})
 
     @extend_schema(
         request=inline_serializer(
@@ -269,11 +352,16 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                     )
                 }
             ),
-            400: OpenApiResponse(description="Bad request")
+            202: OpenApiResponse(description="Receipt stored; Gemini unavailable, validation pending retry"),
+            400: OpenApiResponse(description="Bad request"),
+            413: OpenApiResponse(description="Receipt larger than DOCUMENT_UPLOAD_MAX_BYTES"),
+            503: OpenApiResponse(description="Document storage unavailable; see Retry-After"),
         },
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
         description="Upload receipt for an approved purchase request"
     )
     @action(detail=True, methods=["post"], url_path="submit-receipt")
+    @idempotent
     def submit_receipt(self, request, pk=None):
         pr = get_object_or_404(PurchaseRequest, pk=pk)
 
@@ -296,12 +384,25 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        # Spooled to a temp file and hashed by HashingTemporaryFileUploadHandler
         receipt_file = request.FILES["receipt"]
+        receipt_sha256 = uploaded_file_sha256(receipt_file)
+
+        # Same file submitted again (e.g. a client retry): reuse the stored validation
+        previous = getattr(pr, "receipt_validation", None)
+        if pr.receipt_sha256 == receipt_sha256 and previous and previous.validation_result:
+            return Response(
+                {
+                    "detail": "Receipt already submitted and validated.",
+                    "validation": previous.validation_result
+                },
+                status=status.HTTP_200_OK
+            )
         
-        # Extract text BEFORE uploading to Cloudinary (in backend memory)
+        # Extract text BEFORE uploading to Cloudinary, reading the spooled file from disk
         try:
-            receipt_text = extract_text_from_pdf(receipt_file)
-            # Reset file pointer after reading so it can be saved
+            receipt_document = extract_document(uploaded_file_source(receipt_file))
+            # Reset file pointer so the same spooled file can be uploaded
             receipt_file.seek(0)
         except Exception as e:
             return Response(
@@ -309,14 +410,27 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Save the file (this uploads to Cloudinary)
-        pr.receipt = receipt_file
+        # Save the file (this uploads to Cloudinary) and keep its URL for the serializers
+        try:
+            pr.receipt = store_file(pr.receipt, receipt_file.name, receipt_file)
+        except ServiceUnavailable as e:
+            return service_unavailable_response(e)
+        pr.receipt_url = pr.receipt.url
+        pr.receipt_sha256 = receipt_sha256
         pr.save()
+        cache_uploaded_copy(pr.receipt, receipt_file)
         
         # Perform synchronous validation
         try:
             # validate_receipt_against_po_with_text is synchronous, so we call it directly
-            validation_result = validate_receipt_against_po_with_text(pr, receipt_text)
+            validation_result = validate_receipt_against_po_with_text(
+                pr, receipt_document["text"], receipt_fields=receipt_document["fields"]
+            )
+            if validation_result.get("pending_retry"):
+                return Response(
+                    {"detail": "Receipt submitted; validation is pending and will be retried.", "validation": validation_result},
+                    status=status.HTTP_202_ACCEPTED
+                )
             
             return Response(
                 {
@@ -330,3 +444,83 @@ class PurchaseRequestViewSet(viewsets.ModelViewSet):
                 {"detail": f"Validation failed: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "export_format", str, enum=EXPORT_FORMATS,
+                description="Output format (default: csv)"
+            ),
+            OpenApiParameter(
+                "status", str,
+                description="Status to export (default: APPROVED). Use 'all' to export every request the role can list."
+            ),
+        ],
+        responses={200: OpenApiResponse(description="Streamed CSV or NDJSON file")},
+        description="Stream the purchase request ledger with flattened items and approval info (finance/admin)"
+    )
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        export_format = request.query_params.get("export_format", "csv").lower()
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"detail": f"Unsupported export format. Choose one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        status_filter = request.query_params.get("status", PurchaseRequest.STATUS_APPROVED).upper()
+        valid_statuses = {choice for choice, _ in PurchaseRequest.STATUS_CHOICES}
+        if status_filter != "ALL" and status_filter not in valid_statuses:
+            return Response(
+                {"detail": "Unknown status."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Only what the role may list: finance exports approved requests, admin any
+        queryset = export_queryset(None if status_filter == "ALL" else status_filter, self.get_queryset())
+        response = StreamingHttpResponse(
+            iter_export(export_format, queryset),
+            content_type=CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="purchase_requests.{export_format}"'
+        return response
+
+
+class AnalyticsView(APIView):
+    """Dashboard statistics: status/month rollups, vendor spend, approver activity and latency."""
+
+    def get_permissions(self):
+        return [IsAuthenticated(), IsInRoles(["approver_l1", "approver_l2", "finance", "admin"])]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("months", int, description="Number of months in the monthly breakdown (default: 12)"),
+            OpenApiParameter("vendors", int, description="Number of vendors in the spend ranking (default: 10)"),
+        ],
+        responses={200: OpenApiResponse(description="Aggregated purchase request statistics")},
+        description="Counts and totals by status and month, spend per vendor, approval latency percentiles and rejection rates"
+    )
+    def get(self, request):
+        try:
+            months = min(max(int(request.query_params.get("months", 12)), 1), 120)
+            vendors = min(max(int(request.query_params.get("vendors", 10)), 1), 100)
+        except ValueError:
+            return Response(
+                {"detail": "months and vendors must be integers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(dashboard(months=months, vendor_limit=vendors))
+
+
+class BreakerMetricsView(APIView):
+    """State and counters of the circuit breakers around Gemini and storage (procure.resilience)."""
+
+    def get_permissions(self):
+        return [IsAuthenticated(), IsInRoles(["admin"])]
+
+    @extend_schema(
+        responses={200: OpenApiResponse(description="One entry per circuit breaker")},
+        description="Circuit breaker state (closed, open, half_open) and call counters for this worker process"
+    )
+    def get(self, request):
+        return Response(breaker_metrics())
@@ -0,0 +1,16 @@
+"""
+ASGI entry point, e.g.
+
+    ASYNC_RECEIPT_VIEWS=1 gunicorn procure_to_pay.asgi:application \
+        -k uvicorn.workers.UvicornWorker -w 2 --timeout 300
+
+With ASYNC_RECEIPT_VIEWS=1 receipt submission is served by an async view that
+awaits Gemini and offloads storage uploads, so slow model calls no longer tie
+up a worker each. The other endpoints are synchronous DRF views and run in
+Django's thread for sync code.
+"""
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'procure_to_pay.settings')
+application = get_asgi_application()
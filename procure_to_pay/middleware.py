@@ -0,0 +1,66 @@
+import os
+import resource
+import threading
+import time
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Connections opened by the current thread; a request that opens one paid for
+# the connection setup instead of reusing a persistent connection (CONN_MAX_AGE)
+_opened = threading.local()
+
+
+def _count_connection(sender, connection, **kwargs):
+    _opened.count = getattr(_opened, 'count', 0) + 1
+
+
+connection_created.connect(_count_connection)
+
+
+def current_rss_kb():
+    """Resident set size of this process in KiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class BenchmarkHeadersMiddleware:
+    """
+    Report per-request server metrics as response headers for the load tester
+    (benchmarks/): X-DB-Queries, X-DB-Connections-Opened (connection churn),
+    X-Server-Time-Ms and X-Process-RSS-KB.
+    Installed only when BENCHMARK_HEADERS is set.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        opened_before = getattr(_opened, 'count', 0)
+        started = time.perf_counter()
+        wrappers = [connection.execute_wrapper(counter) for connection in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+        response['X-DB-Queries'] = str(counter.count)
+        response['X-DB-Connections-Opened'] = str(getattr(_opened, 'count', 0) - opened_before)
+        response['X-Server-Time-Ms'] = f'{(time.perf_counter() - started) * 1000:.1f}'
+        response['X-Process-RSS-KB'] = str(current_rss_kb())
+        return response
@@ -0,0 +1,63 @@
+"""
+orjson-backed JSON renderer and parser for DRF (REST_FRAMEWORK settings).
+
+DRF's JSONRenderer runs every response through stdlib json with a Python
+`default` hook for each Decimal, datetime, UUID and lazy string; on list
+pages that is most of the time spent after the queries. orjson encodes
+dicts, lists, strings, numbers, datetimes and UUIDs in Rust and only calls
+back into Python for the rest (Decimal, lazy strings, querysets...), which
+go through DRF's own encoder, so the output is the same JSON (compact
+separators, non-ASCII left as is, U+2028/U+2029 escaped, UTC as `Z`).
+NaN and infinite floats are rendered as null rather than refused.
+
+Without orjson installed, or when a client asks for indented JSON, both
+classes behave exactly like DRF's.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_drf_encoder = JSONEncoder()
+# Escaped by DRF too, so the output stays a strict JavaScript subset
+_LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def _default(value):
+    return _drf_encoder.default(value)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        rendered = orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        if b'\xe2\x80' in rendered:
+            for raw, escaped in _LINE_SEPARATORS:
+                rendered = rendered.replace(raw, escaped)
+        return rendered
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,107 @@
+"""
+OpenAPI schema served from a cache (/api/schema/, also what /api/docs/ loads).
+
+drf-spectacular's SpectacularAPIView introspects every view, serializer and
+extend_schema on each request, and frontend tooling polls it. CachedSchemaView
+builds the schema once per process instead:
+
+- from OPENAPI_SCHEMA_FILE, the schema committed with the code, or by
+  introspection when the file is missing or DEBUG is on;
+- rendered once per format (YAML or JSON), served as those bytes with an
+  ETag, and answered with 304 on a matching If-None-Match.
+
+The test suite fails while the committed file is stale. Regenerate it with
+the test settings, which need no database or credentials (the integer
+bounds in the schema depend on the database backend):
+
+    DJANGO_SETTINGS_MODULE=procure_to_pay.settings_test \
+        python manage.py spectacular --file openapi.yaml
+
+Requests for another language or API version go to SpectacularAPIView.
+"""
+import hashlib
+import threading
+from pathlib import Path
+
+import yaml
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from drf_spectacular.renderers import OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+_lock = threading.Lock()
+_schema = None
+# (renderer class, media type) -> (content, ETag)
+_rendered = {}
+
+
+def generate_schema():
+    """The schema as introspected from the code, like `manage.py spectacular`."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def render_yaml(schema):
+    return OpenApiYamlRenderer().render(schema, renderer_context={})
+
+
+def committed_schema_is_current():
+    """Whether OPENAPI_SCHEMA_FILE matches what the code generates (run in CI by the tests)."""
+    path = Path(settings.OPENAPI_SCHEMA_FILE)
+    return path.exists() and path.read_bytes() == render_yaml(generate_schema())
+
+
+def cached_schema():
+    global _schema
+    with _lock:
+        if _schema is None:
+            path = Path(settings.OPENAPI_SCHEMA_FILE)
+            if path.exists() and not settings.DEBUG:
+                _schema = yaml.safe_load(path.read_bytes())
+            else:
+                _schema = generate_schema()
+        return _schema
+
+
+def rendered_schema(renderer, media_type):
+    """(content, ETag) of the cached schema in `renderer`'s format."""
+    key = (type(renderer), media_type)
+    if key not in _rendered:
+        content = renderer.render(cached_schema(), media_type, renderer_context={})
+        with _lock:
+            _rendered[key] = (content, quote_etag(hashlib.sha256(content).hexdigest()[:32]))
+    return _rendered[key]
+
+
+def clear_schema_cache():
+    global _schema
+    with _lock:
+        _schema = None
+        _rendered.clear()
+
+
+class CachedSchemaView(SpectacularAPIView):
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if (
+            not self.serve_public or self.urlconf or self.api_version or self.custom_settings
+            or request.version or request.GET.get('version') or request.GET.get('lang')
+        ):
+            return super().get(request, *args, **kwargs)
+
+        renderer = request.accepted_renderer
+        content, etag = rendered_schema(renderer, request.accepted_media_type)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            content_type = renderer.media_type + (f'; charset={renderer.charset}' if renderer.charset else '')
+            response = HttpResponse(content, content_type=content_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        response['ETag'] = etag
+        # Cached by clients, but revalidated (cheaply, with the ETag) on every use
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
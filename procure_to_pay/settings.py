@@ -43,6 +43,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request query count and RSS headers for the load tester in benchmarks/
+if os.getenv('BENCHMARK_HEADERS'):
+    MIDDLEWARE.insert(0, 'procure_to_pay.middleware.BenchmarkHeadersMiddleware')
+
 ROOT_URLCONF = 'procure_to_pay.urls'
 
 TEMPLATES = [
@@ -71,6 +75,17 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'admin123!'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        # Keep connections open across requests (seconds; 0 = one connection per
+        # request, None = unlimited), checked before reuse so a restarted server
+        # or pooler doesn't fail the first request after it. Off by default, as
+        # ASGI workers don't reuse them reliably; the gunicorn service in
+        # docker-compose.yml turns it on
+        'CONN_MAX_AGE': None if os.getenv('POSTGRES_CONN_MAX_AGE') == 'None'
+        else int(os.getenv('POSTGRES_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.getenv('POSTGRES_CONN_HEALTH_CHECKS', '1') == '1',
+        # Behind pgbouncer in transaction pooling mode a cursor can't outlive its
+        # transaction, so .iterator() must not use server-side cursors
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('POSTGRES_PGBOUNCER', '0') == '1',
     }
 }
 AUTH_PASSWORD_VALIDATORS = []
@@ -99,6 +114,17 @@ CLOUDINARY_STORAGE = {
 }
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+# Receipts and generated POs (see procure.storage.raw_document_storage)
+RAW_DOCUMENT_STORAGE = 'cloudinary_storage.storage.RawMediaCloudinaryStorage'
+
+# Uploads (receipts, proformas) are spooled to disk and hashed as they arrive
+FILE_UPLOAD_HANDLERS = ['procure.uploads.HashingTemporaryFileUploadHandler']
+DOCUMENT_UPLOAD_MAX_BYTES = int(os.getenv('DOCUMENT_UPLOAD_MAX_BYTES', str(10 * 1024 * 1024)))
+DOCUMENT_MAX_PAGES = int(os.getenv('DOCUMENT_MAX_PAGES', '50'))
+
+# Local copies of stored documents used for text extraction (see procure.document_cache)
+DOCUMENT_CACHE_DIR = os.getenv('DOCUMENT_CACHE_DIR', str(BASE_DIR / 'document_cache'))
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv('DOCUMENT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -107,6 +133,16 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson when installed, stdlib json otherwise (see procure_to_pay.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'procure_to_pay.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'procure_to_pay.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'procure.uploads.LimitedMultiPartParser',
+    ),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -116,12 +152,71 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
     'COMPONENT_SPLIT_REQUEST': True,
 }
+# Committed OpenAPI schema served by /api/schema/ (see procure_to_pay.schema
+# for how to regenerate it)
+OPENAPI_SCHEMA_FILE = BASE_DIR / 'openapi.yaml'
 
 
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# Client class for Gemini, called with api_key=GEMINI_API_KEY
+GEMINI_CLIENT = 'google.genai.Client'
+# Estimated tokens per receipt comparison prompt; receipt lines beyond it are
+# dropped, least relevant first (see procure.prompting)
+GEMINI_PROMPT_TOKEN_BUDGET = int(os.getenv('GEMINI_PROMPT_TOKEN_BUDGET', '2000'))
+# Seconds submit-receipt waits for Gemini before answering with the local
+# matcher's verdict, marked provisional (procure.receipt_matching); the model's
+# verdict replaces it when it arrives. 0 waits for the model.
+RECEIPT_VALIDATION_DEADLINE = float(os.getenv('RECEIPT_VALIDATION_DEADLINE', '8'))
+
+# Idempotency-Key support on create, approve and submit-receipt (see
+# procure.idempotency): responses are replayed to retries for TTL seconds; a
+# call still running holds its key for at most LOCK_TIMEOUT seconds.
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(24 * 60 * 60)))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '300'))
+
+# Circuit breakers around external services (see procure.resilience): calls give
+# up after `timeout` seconds; `failure_threshold` failures in a row open the
+# circuit and calls fail at once for `reset_timeout` seconds. Meanwhile receipt
+# validations and PO files are recorded as pending retry (manage.py retry_pending).
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))
+CIRCUIT_BREAKERS = {
+    'gemini': {
+        'timeout': float(os.getenv('GEMINI_TIMEOUT', '60')),
+        'failure_threshold': BREAKER_FAILURE_THRESHOLD,
+        'reset_timeout': BREAKER_RESET_TIMEOUT,
+    },
+    'storage': {
+        'timeout': float(os.getenv('STORAGE_TIMEOUT', '20')),
+        'failure_threshold': BREAKER_FAILURE_THRESHOLD,
+        'reset_timeout': BREAKER_RESET_TIMEOUT,
+    },
+}
+
+# Route I/O-bound endpoints to the async views in procure.async_views
+# (for ASGI deployments; see procure_to_pay/asgi.py)
+ASYNC_RECEIPT_VIEWS = os.getenv('ASYNC_RECEIPT_VIEWS', '0') == '1'
+# Threads per process for their blocking storage uploads and document parsing
+ASYNC_OFFLOAD_THREADS = int(os.getenv('ASYNC_OFFLOAD_THREADS', '32'))
+
+# Callable taking a PIL image and returning its text (see procure.ocr): in-process
+# Tesseract with loaded models kept between pages, pytesseract as the fallback
+OCR_BACKEND = os.getenv('OCR_BACKEND', 'procure.ocr.image_to_string')
+OCR_LANGUAGE = os.getenv('OCR_LANGUAGE', 'eng')
+# Tesseract language data directory (default: the one Tesseract was built with, or TESSDATA_PREFIX)
+OCR_TESSDATA_PATH = os.getenv('OCR_TESSDATA_PATH')
+# Loaded OCR engines per process, the most pages recognised at the same time
+OCR_ENGINES = int(os.getenv('OCR_ENGINES', '2'))
+# Orient, grayscale, downscale, binarize, deskew and crop images before OCR
+# (see procure.image_preprocessing), to OCR_TARGET_DPI
+OCR_PREPROCESS = os.getenv('OCR_PREPROCESS', '1') == '1'
+OCR_TARGET_DPI = int(os.getenv('OCR_TARGET_DPI', '300'))
+# PDF text extraction engine (see procure.pdf_engines): pypdfium2 with per-page
+# fallback to pdfminer layout analysis or OCR, or procure.pdf_engines.PdfminerEngine
+PDF_TEXT_ENGINE = os.getenv('PDF_TEXT_ENGINE', 'procure.pdf_engines.PdfiumEngine')
 
 
 
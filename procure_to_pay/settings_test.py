@@ -0,0 +1,30 @@
+"""
+Settings for the test suite (`python manage.py test` selects them automatically).
+
+Runs offline: SQLite by default (TEST_DATABASE=postgres uses the POSTGRES_*
+database from the main settings), local file storage instead of Cloudinary,
+and a stub OCR backend. Gemini is replaced per test with
+procure.testing.FakeGenaiClient.
+"""
+import tempfile
+
+from procure_to_pay.settings import *  # noqa: F401,F403
+
+if os.getenv('TEST_DATABASE', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'test.sqlite3',
+        }
+    }
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='ptp-test-media-')
+DEFAULT_FILE_STORAGE = 'procure.testing.LocalDocumentStorage'
+RAW_DOCUMENT_STORAGE = 'procure.testing.LocalDocumentStorage'
+DOCUMENT_CACHE_DIR = tempfile.mkdtemp(prefix='ptp-test-doc-cache-')
+
+OCR_BACKEND = 'procure.testing.stub_ocr'
+GEMINI_API_KEY = 'test-key'
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+LOGGING = {'version': 1, 'disable_existing_loggers': False}
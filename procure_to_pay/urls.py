@@ -1,11 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
+
+from procure_to_pay.schema import CachedSchemaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('procure.urls')),
     path("api/accounts/", include("accounts.urls")),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', CachedSchemaView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
 ]